@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'django_filters',
+    'core',
     'users',
     'bookings',
     
@@ -63,6 +64,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bookings.audit.AuditMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -99,6 +101,24 @@ DATABASES = {
 }
 
 
+# Cache
+# Defaults to per-process local memory; point CACHE_URL at a shared backend
+# (e.g. redis:// or memcache://) when running several workers.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Seconds a rendered page of the public doctor directory stays cached
+DOCTOR_DIRECTORY_CACHE_TIMEOUT = env.int('DOCTOR_DIRECTORY_CACHE_TIMEOUT', default=300)
+
+# Seconds a page of a patient's booking history stays cached
+PATIENT_HISTORY_CACHE_TIMEOUT = env.int('PATIENT_HISTORY_CACHE_TIMEOUT', default=300)
+
+# Seconds the compact profile in the login response stays cached per user
+LOGIN_PROFILE_CACHE_TIMEOUT = env.int('LOGIN_PROFILE_CACHE_TIMEOUT', default=3600)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,6 +149,49 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Wall-clock zone of doctor timetables (TimetableEntry start/end times)
+CLINIC_TIME_ZONE = env('CLINIC_TIME_ZONE', default=TIME_ZONE)
+
+# Length of a bookable appointment slot
+APPOINTMENT_SLOT_MINUTES = env.int('APPOINTMENT_SLOT_MINUTES', default=30)
+
+# How far ahead the "next available appointment" index looks for a free slot
+NEXT_SLOT_HORIZON_DAYS = env.int('NEXT_SLOT_HORIZON_DAYS', default=60)
+
+# Minutes a claimed slot stays reserved for the patient filling in the form
+SLOT_HOLD_MINUTES = env.int('SLOT_HOLD_MINUTES', default=5)
+
+# Hours a stored Idempotency-Key response can be replayed
+IDEMPOTENCY_KEY_TTL_HOURS = env.int('IDEMPOTENCY_KEY_TTL_HOURS', default=24)
+
+# Background jobs (core.jobs): retries, backoff and the lease after which a
+# job held by a silent worker is handed to another one
+JOB_MAX_ATTEMPTS = env.int('JOB_MAX_ATTEMPTS', default=5)
+JOB_RETRY_BASE_SECONDS = env.int('JOB_RETRY_BASE_SECONDS', default=10)
+JOB_RETRY_MAX_SECONDS = env.int('JOB_RETRY_MAX_SECONDS', default=3600)
+JOB_LEASE_SECONDS = env.int('JOB_LEASE_SECONDS', default=300)
+
+# Outgoing email (appointment reminders)
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='clinic@localhost')
+
+# Hours before an appointment at which reminders go out
+REMINDER_OFFSETS_HOURS = [int(hours) for hours in env.list('REMINDER_OFFSETS_HOURS', default=['24', '2'])]
+
+# Bookings that started more than this many days ago are moved to the
+# archive table by archive_bookings
+BOOKING_ARCHIVE_AFTER_DAYS = env.int('BOOKING_ARCHIVE_AFTER_DAYS', default=365)
+
+# Booking change feed (bookings.events): 'local' keeps events in process
+# memory; 'cache' shares them between processes through CACHE_URL
+BOOKING_EVENTS_BACKEND = env('BOOKING_EVENTS_BACKEND', default='local')
+BOOKING_EVENTS_BUFFER = env.int('BOOKING_EVENTS_BUFFER', default=1000)
+BOOKING_EVENTS_POLL_SECONDS = env.float('BOOKING_EVENTS_POLL_SECONDS', default=1.0)
+BOOKING_EVENTS_HEARTBEAT_SECONDS = env.float('BOOKING_EVENTS_HEARTBEAT_SECONDS', default=15.0)
+# Streams are closed after this long; browsers reconnect with Last-Event-ID
+BOOKING_EVENTS_STREAM_SECONDS = env.float('BOOKING_EVENTS_STREAM_SECONDS', default=300.0)
+BOOKING_EVENTS_RETRY_MS = env.int('BOOKING_EVENTS_RETRY_MS', default=3000)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -0,0 +1,67 @@
+"""
+Hot/cold split of the bookings table.
+
+``archive_bookings()`` moves bookings that started before a cutoff into
+ArchivedBooking in chunks, oldest first (a range scan on the scheduled_at
+index), each chunk in its own short transaction: one SELECT, one bulk
+INSERT, one DELETE of the bookings and their slot keys and reminders.
+
+Archiving is not a cancellation: the revenue rollup keeps counting the
+moved bookings and no change-feed events are sent. The Booking delete
+receivers check ``is_archiving()`` for that.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache as history_cache
+from .models import ArchivedBooking, Booking
+
+DEFAULT_CHUNK_SIZE = 1000
+
+_state = threading.local()
+
+
+def is_archiving():
+    return getattr(_state, 'active', False)
+
+
+@contextmanager
+def archiving():
+    """Mark Booking deletes in this block as moves to the archive."""
+    _state.active = True
+    try:
+        yield
+    finally:
+        _state.active = False
+
+
+def archive_cutoff(days=None):
+    """Bookings starting before this are due for the archive."""
+    return timezone.now() - timedelta(days=settings.BOOKING_ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def archive_bookings(before=None, chunk_size=DEFAULT_CHUNK_SIZE, limit=None):
+    """
+    Move bookings scheduled before ``before`` (default: archive_cutoff())
+    to the archive. Returns the number moved; stops after ``limit`` when
+    given.
+    """
+    before = before or archive_cutoff()
+    moved = 0
+    bookings = Booking.objects.filter(scheduled_at__lt=before).order_by('scheduled_at', 'id')
+    while limit is None or moved < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - moved)
+        with transaction.atomic(), archiving():
+            chunk = list(bookings[:size])
+            if not chunk:
+                break
+            ArchivedBooking.objects.bulk_create([ArchivedBooking.from_booking(booking) for booking in chunk])
+            Booking.objects.filter(pk__in=[booking.pk for booking in chunk]).delete()
+            history_cache.invalidate(*{booking.patient_id for booking in chunk})
+        moved += len(chunk)
+    return moved
@@ -0,0 +1,60 @@
+"""
+Async variants of the public booking reads, for ASGI deployments (see
+core.async_views). They return the same payloads as their synchronous
+counterparts in bookings.views.
+"""
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+
+from core.async_views import AsyncAPIView
+from profiles.models import DoctorProfile
+from . import events
+from .availability import adoctor_availability
+from .serializers import AvailabilityQuerySerializer, BookingEventsQuerySerializer
+from .views import DoctorAvailabilityView
+
+
+class AsyncDoctorAvailabilityView(AsyncAPIView):
+    """
+    GET /api/async/availability/<doctor_id>/?start=YYYY-MM-DD&end=YYYY-MM-DD[&tz=Area/City]
+    """
+
+    async def get(self, request, doctor_id):
+        doctor = await aget_object_or_404(DoctorProfile.objects.only('id'), pk=doctor_id, is_active=True)
+        params = self.validate_query(AvailabilityQuerySerializer)
+        start, end, tz = params['start'], params['end'], params.get('tz')
+        slots = await adoctor_availability(doctor.pk, start, end)
+        return self.render(DoctorAvailabilityView.build_payload(doctor.pk, start, end, tz, slots))
+
+
+class BookingEventStreamView(AsyncAPIView):
+    """
+    GET /api/bookings/events/[?doctor=][&date=YYYY-MM-DD]
+    Server-Sent Events stream of booking changes (``created``, ``updated``,
+    ``deleted``) for the reception dashboard. Idle connections only cost a
+    keep-alive comment every BOOKING_EVENTS_HEARTBEAT_SECONDS; doctors only
+    receive their own bookings. Requires ASGI.
+    """
+    authentication_required = True
+
+    async def get(self, request):
+        params = self.validate_query(BookingEventsQuerySerializer)
+        doctor_id = params.get('doctor')
+        own_profile = await (
+            DoctorProfile.objects.filter(user_id=request.user.pk).values_list('pk', flat=True).afirst()
+        )
+        if own_profile is not None:
+            doctor_id = own_profile
+        log = events.get_log()
+        # Resolved now so events published while the response starts are not skipped
+        after, reset = await events.resume_point(
+            log, request.headers.get('Last-Event-ID') or params.get('last_event_id')
+        )
+        response = StreamingHttpResponse(
+            events.event_stream(log, after, doctor_id, params.get('date'), reset=reset),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies (nginx) from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,202 @@
+"""
+Append-only audit trail of Booking and Patient writes.
+
+Every create, update and delete is diffed over AUDITED_FIELDS against the
+stored row (the pre_save snapshot, one SELECT that the Booking receivers
+already needed) and becomes an AuditEntry tagged with the authenticated
+user. Entries are not inserted as they are recorded:
+
+* each one is handed over when its transaction commits, so rolled back
+  writes leave no trail;
+* AuditMiddleware collects what a request hands over and writes it with a
+  single ``bulk_create`` once the response is ready, so a request that
+  touches a hundred rows pays for one INSERT instead of a hundred.
+
+Outside a request (commands, shell) wrap the work in ``buffered()`` for
+the same batching; otherwise entries are inserted as each commit happens.
+A batch whose INSERT fails is handed to the ``bookings.write_audit_entries``
+job, which retries it with backoff, so a committed change does not lose
+its entry to a transient database error.
+The signals cover single-object saves and deletes; bulk paths that bypass
+them (bulk_create / bulk_update / update()) call ``record()`` themselves.
+"""
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import action
+
+from core.jobs import enqueue
+from .models import AuditEntry, Booking, Patient
+from .pagination import AuditPagination
+from .serializers import AuditEntrySerializer
+
+logger = logging.getLogger(__name__)
+
+AUDITED_FIELDS = {
+    Booking: ['patient', 'doctor', 'scheduled_at', 'duration_minutes', 'notes', 'total'],
+    Patient: ['first_name', 'last_name', 'date_of_birth', 'email'],
+}
+
+# (request or None, entries waiting to be written) of the current buffer.
+# A context variable, so sync views run from the ASGI handler see it too.
+_buffer = ContextVar('audit_buffer', default=None)
+
+
+def snapshot(instance):
+    """Audited field values of ``instance``, by field name."""
+    opts = instance._meta
+    return {name: getattr(instance, opts.get_field(name).attname) for name in AUDITED_FIELDS[type(instance)]}
+
+
+def stored_snapshot(model, pk):
+    """Audited field values of the stored row ``pk`` (one SELECT), or None."""
+    names = AUDITED_FIELDS[model]
+    row = (
+        model.objects.filter(pk=pk)
+        .values_list(*(model._meta.get_field(name).attname for name in names)).first()
+    )
+    return dict(zip(names, row)) if row is not None else None
+
+
+def diff(model, before, after):
+    """``{field: [old, new]}`` for the audited fields present in either snapshot that differ."""
+    before, after = before or {}, after or {}
+    changes = {}
+    for name in AUDITED_FIELDS[model]:
+        if name not in before and name not in after:
+            continue
+        field = model._meta.get_field(name)
+        old, new = field.to_python(before.get(name)), field.to_python(after.get(name))
+        if old != new:
+            changes[name] = [old, new]
+    return changes
+
+
+def current_actor():
+    """Pk of the user the current request is authenticated as, or None."""
+    scope = _buffer.get()
+    user = getattr(scope[0], 'user', None) if scope else None
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def record(action_name, instance, before=None, after=None):
+    """Record ``action_name`` on ``instance``; written once the current transaction commits."""
+    changes = diff(type(instance), before, after)
+    if action_name == AuditEntry.UPDATED and not changes:
+        return
+    entry = AuditEntry(
+        model=instance._meta.model_name,
+        object_id=instance.pk,
+        action=action_name,
+        changes=changes,
+        actor_id=current_actor(),
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: _collect(entry))
+
+
+def _collect(entry):
+    scope = _buffer.get()
+    if scope is None:
+        write([entry])
+    else:
+        scope[1].append(entry)
+
+
+def write(entries):
+    try:
+        with transaction.atomic():
+            AuditEntry.objects.bulk_create(entries)
+    except Exception:
+        # The audited writes are committed already; do not fail the response
+        # but leave the entries to the job queue's retries
+        logger.warning("Writing %s audit entries failed; queued for retry", len(entries), exc_info=True)
+        requeue(entries)
+
+
+def to_payload(entry):
+    """JSON-safe form of an unsaved AuditEntry, for the job queue."""
+    return {
+        'model': entry.model,
+        'object_id': entry.object_id,
+        'action': entry.action,
+        'changes': json.loads(json.dumps(entry.changes, cls=DjangoJSONEncoder)),
+        'actor_id': entry.actor_id,
+        'created_at': entry.created_at.isoformat(),
+    }
+
+
+def from_payload(data):
+    return AuditEntry(**dict(data, created_at=parse_datetime(data['created_at'])))
+
+
+def requeue(entries):
+    try:
+        enqueue('bookings.write_audit_entries', {'entries': [to_payload(entry) for entry in entries]})
+    except Exception:
+        logger.exception("Queueing %s audit entries failed; they are lost", len(entries))
+
+
+@contextmanager
+def buffered(request=None):
+    """Collect the entries committed in this block and write them together at its end."""
+    entries = []
+    token = _buffer.set((request, entries))
+    try:
+        yield
+    finally:
+        _buffer.reset(token)
+        if entries:
+            write(entries)
+
+
+def trail(model, object_id):
+    """The audit entries of one object, newest first (the (model, object_id, created_at) index)."""
+    return AuditEntry.objects.filter(model=model._meta.model_name, object_id=object_id)
+
+
+class AuditMiddleware:
+    """Buffers the audit entries of each request and writes them in one INSERT."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with buffered(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        entries = []
+        token = _buffer.set((request, entries))
+        try:
+            return await self.get_response(request)
+        finally:
+            _buffer.reset(token)
+            if entries:
+                await sync_to_async(write)(entries)
+
+
+class AuditTrailMixin:
+    """Adds ``<detail url>/audit/`` to a viewset: the object's audit trail, newest first."""
+
+    @action(detail=True, methods=['get'])
+    def audit(self, request, pk=None):
+        instance = self.get_object()
+        entries = trail(type(instance), instance.pk).select_related('actor')
+        paginator = AuditPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        return paginator.get_paginated_response(AuditEntrySerializer(page, many=True).data)
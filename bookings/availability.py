@@ -0,0 +1,192 @@
+"""
+Free-slot availability for doctors.
+
+Weekly TimetableEntry rows are expanded into fixed-length slots in the
+clinic's time zone, then existing bookings are subtracted. Bookings are
+merged into a sorted list of disjoint busy intervals, so each slot is
+checked with a single bisect instead of a scan over all bookings.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.jobs import enqueue
+from profiles.models import TimetableEntry
+from .models import Booking, DoctorNextSlot, SlotHold
+
+_deferred = threading.local()
+
+
+def clinic_timezone():
+    return ZoneInfo(settings.CLINIC_TIME_ZONE)
+
+
+def slot_length():
+    return timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+
+
+def expand_timetable(entries, start_date, end_date, tz, length):
+    """
+    Yield ``(start, end)`` slots for every day in ``[start_date, end_date]``.
+    ``entries`` is an iterable of ``(day_of_week, start_time, end_time)``.
+    """
+    by_weekday = {}
+    for day_of_week, start_time, end_time in entries:
+        by_weekday.setdefault(day_of_week, []).append((start_time, end_time))
+    for windows in by_weekday.values():
+        windows.sort()
+
+    day = start_date
+    while day <= end_date:
+        for start_time, end_time in by_weekday.get(day.weekday(), ()):
+            slot_start = datetime.combine(day, start_time, tzinfo=tz)
+            window_end = datetime.combine(day, end_time, tzinfo=tz)
+            while slot_start + length <= window_end:
+                yield slot_start, slot_start + length
+                slot_start += length
+        day += timedelta(days=1)
+
+
+def merge_intervals(intervals):
+    """Merge ``(start, end)`` pairs into sorted, disjoint intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def subtract_busy(slots, busy):
+    """Yield the slots that do not overlap any of the merged ``busy`` intervals."""
+    starts = [start for start, _ in busy]
+    for slot_start, slot_end in slots:
+        # Last busy interval starting before the slot ends is the only candidate
+        index = bisect_left(starts, slot_end) - 1
+        if index >= 0 and busy[index][1] > slot_start:
+            continue
+        yield slot_start, slot_end
+
+
+def _busy_querysets(doctor_id, range_start, range_end):
+    bookings = Booking.objects.filter(
+        doctor_id=doctor_id,
+        scheduled_at__lt=range_end,
+        ends_at__gt=range_start,
+    ).values_list('scheduled_at', 'ends_at')
+    holds = SlotHold.objects.filter(
+        doctor_id=doctor_id,
+        starts_at__lt=range_end,
+        ends_at__gt=range_start,
+        expires_at__gt=timezone.now(),
+    ).values_list('starts_at', 'ends_at')
+    return bookings, holds
+
+
+def busy_intervals(doctor_id, range_start, range_end):
+    """Merged busy intervals (bookings and live holds) for a doctor."""
+    bookings, holds = _busy_querysets(doctor_id, range_start, range_end)
+    return merge_intervals([*bookings, *holds])
+
+
+async def abusy_intervals(doctor_id, range_start, range_end):
+    bookings, holds = _busy_querysets(doctor_id, range_start, range_end)
+    return merge_intervals([interval async for interval in bookings] + [interval async for interval in holds])
+
+
+def _timetable(doctor_id):
+    return TimetableEntry.objects.filter(
+        doctor_id=doctor_id, is_active=True
+    ).values_list('day_of_week', 'start_time', 'end_time')
+
+
+def _future_slots(entries, start_date, end_date, tz, now):
+    slots = expand_timetable(entries, start_date, end_date, tz or clinic_timezone(), slot_length())
+    return sorted(set(slot for slot in slots if slot[0] >= now))
+
+
+def doctor_availability(doctor_id, start_date, end_date, tz=None, now=None):
+    """
+    Return the free ``(start, end)`` slots of a doctor between two dates
+    (inclusive, interpreted in the clinic time zone). Slots already in the
+    past are dropped. Costs three queries regardless of the range length.
+    """
+    slots = _future_slots(_timetable(doctor_id), start_date, end_date, tz, now or timezone.now())
+    if not slots:
+        return []
+    busy = busy_intervals(doctor_id, slots[0][0], max(end for _, end in slots))
+    return list(subtract_busy(slots, busy))
+
+
+async def adoctor_availability(doctor_id, start_date, end_date, tz=None, now=None):
+    """``doctor_availability()`` through the async ORM."""
+    entries = [entry async for entry in _timetable(doctor_id)]
+    slots = _future_slots(entries, start_date, end_date, tz, now or timezone.now())
+    if not slots:
+        return []
+    busy = await abusy_intervals(doctor_id, slots[0][0], max(end for _, end in slots))
+    return list(subtract_busy(slots, busy))
+
+
+def first_free_slot(doctor_id, now=None):
+    """Start of the doctor's earliest free slot within NEXT_SLOT_HORIZON_DAYS, or None."""
+    now = now or timezone.now()
+    today = now.astimezone(clinic_timezone()).date()
+    horizon = today + timedelta(days=settings.NEXT_SLOT_HORIZON_DAYS)
+    slots = doctor_availability(doctor_id, today, horizon, now=now)
+    return slots[0][0] if slots else None
+
+
+def refresh_next_slot(doctor_id, now=None):
+    """Recompute and store the next free slot of one doctor."""
+    starts_at = first_free_slot(doctor_id, now=now)
+    DoctorNextSlot.objects.update_or_create(doctor_id=doctor_id, defaults={'starts_at': starts_at})
+    return starts_at
+
+
+def _enqueue_refresh(doctor_id):
+    # Queued once the write commits; a refresh still waiting for a worker
+    # covers this write too, so at most one is queued per doctor
+    transaction.on_commit(lambda: enqueue(
+        'bookings.refresh_next_slot', {'doctor_id': doctor_id}, unique_key=f'next-slot:{doctor_id}'
+    ))
+
+
+def queue_next_slot_refresh(doctor_id):
+    """
+    Queue a background refresh of the doctor's next slot, or collect it for
+    the end of the enclosing ``defer_next_slot_refresh`` block.
+    """
+    doctor_ids = getattr(_deferred, 'doctor_ids', None)
+    if doctor_ids is None:
+        _enqueue_refresh(doctor_id)
+    else:
+        doctor_ids.add(doctor_id)
+
+
+@contextmanager
+def defer_next_slot_refresh():
+    """
+    Collect next-slot refreshes for the duration of a batch write and queue
+    each doctor's once on exit, instead of once per touched booking.
+    Nothing is queued if the block raises.
+    """
+    if getattr(_deferred, 'doctor_ids', None) is not None:
+        # Nested: the outermost block does the refreshing
+        yield
+        return
+    _deferred.doctor_ids = doctor_ids = set()
+    try:
+        yield
+    finally:
+        _deferred.doctor_ids = None
+    for doctor_id in sorted(doctor_ids):
+        _enqueue_refresh(doctor_id)
@@ -0,0 +1,245 @@
+"""
+Batch create/update/delete for the patient and booking viewsets.
+
+The whole batch is validated before anything is written. Foreign keys are
+resolved with one query per related field (see
+PrefetchedPrimaryKeyRelatedField), cross-row rules such as unique emails
+or free slots are checked for all items at once in ``validate_batch``, and
+errors come back as a list aligned with the request items, like DRF's
+``many=True`` serializers. A valid batch is written with bulk_create /
+bulk_update / a single DELETE inside one transaction.
+
+Batches over a VersionedModel are updated conditionally: items may carry
+the ``version`` the client last read, and every row's version is claimed
+with one conditional UPDATE before the batch is written. A stale version
+or a row changed by a concurrent writer fails the whole batch with 412.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from core.concurrency import PreconditionFailed
+from core.models import VersionedModel
+
+from .availability import defer_next_slot_refresh
+
+MAX_BATCH_SIZE = 100
+
+
+class BatchConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The batch conflicts with a concurrent change; reload and retry.'
+    default_code = 'batch_conflict'
+
+
+def to_pk(model, value):
+    """Coerce ``value`` to ``model``'s pk type, or None if it is not a valid pk."""
+    if value is None:
+        return None
+    try:
+        return model._meta.pk.to_python(value)
+    except DjangoValidationError:
+        return None
+
+
+class BulkWriteMixin:
+    """
+    Adds ``<list url>/bulk/`` to a ModelViewSet:
+
+    - ``POST``   a list of objects to create,
+    - ``PATCH``  a list of partial objects, each with its ``id``,
+    - ``DELETE`` a list of ids.
+
+    Items are looked up through ``get_queryset()``, so the viewset's row
+    scoping applies to batches too.
+    """
+    max_batch_size = MAX_BATCH_SIZE
+    # Serializer used to validate batch items; defaults to the viewset's own
+    bulk_serializer_class = None
+    # Raised when a constraint that passed validation fails on write (concurrent writers)
+    bulk_conflict_exception = BatchConflict
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        handler = {
+            'POST': self.bulk_create,
+            'PATCH': self.bulk_update,
+            'DELETE': self.bulk_destroy,
+        }[request.method]
+        try:
+            with transaction.atomic(), defer_next_slot_refresh():
+                return handler(request)
+        except IntegrityError:
+            raise self.bulk_conflict_exception()
+
+    def bulk_create(self, request):
+        items = self.get_batch(request)
+        valid = self.validate_batch_items(items, [None] * len(items))
+        instances = self.perform_bulk_create([data for _, data in valid])
+        return Response(self.get_serializer(instances, many=True).data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        items = self.get_batch(request)
+        model = self.get_queryset().model
+        pks = [to_pk(model, item.get('id')) if isinstance(item, dict) else None for item in items]
+        found = self.get_queryset().in_bulk([pk for pk in pks if pk is not None])
+
+        instances, errors, seen = [], {}, set()
+        for index, pk in enumerate(pks):
+            instance = found.get(pk)
+            if instance is None:
+                errors[index] = {'id': ['Not found.']}
+            elif pk in seen:
+                errors[index] = {'id': ['Duplicate id in batch.']}
+            seen.add(pk)
+            instances.append(instance)
+        if issubclass(model, VersionedModel):
+            self.check_batch_versions(items, instances, errors)
+        valid = self.validate_batch_items(items, instances, partial=True, errors=errors)
+        self.perform_bulk_update(valid)
+        return Response(self.get_serializer([instance for instance, _ in valid], many=True).data)
+
+    def bulk_destroy(self, request):
+        items = self.get_batch(request)
+        model = self.get_queryset().model
+        pks = [to_pk(model, item) for item in items]
+        existing = set(
+            self.get_queryset().filter(pk__in=[pk for pk in pks if pk is not None])
+            .values_list('pk', flat=True)
+        )
+        errors = [{} if pk in existing else {'id': ['Not found.']} for pk in pks]
+        if any(errors):
+            raise ValidationError(errors)
+        self.perform_bulk_destroy(self.get_queryset().filter(pk__in=existing))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def check_batch_versions(self, items, instances, errors):
+        """
+        Compare the ``version`` the items carry with the rows read; raise
+        PreconditionFailed listing the stale items. Malformed versions are
+        added to ``errors``.
+        """
+        stale = {}
+        for index, (item, instance) in enumerate(zip(items, instances)):
+            if instance is None or index in errors or 'version' not in item:
+                continue
+            try:
+                version = int(item['version'])
+            except (TypeError, ValueError):
+                errors[index] = {'version': ['A valid integer is required.']}
+                continue
+            if version != instance.version:
+                stale[index] = {'version': [PreconditionFailed.default_detail]}
+        if stale:
+            raise PreconditionFailed([stale.get(index, {}) for index in range(len(items))])
+
+    def claim_versions(self, instances):
+        """
+        Bump the version of every row with one conditional UPDATE, or raise
+        PreconditionFailed if any row changed since it was read.
+        """
+        condition = Q()
+        for instance in instances:
+            condition |= Q(pk=instance.pk, version=instance.version)
+        model = self.get_queryset().model
+        if model.objects.filter(condition).update(version=F('version') + 1) != len(instances):
+            raise PreconditionFailed()
+        for instance in instances:
+            instance.version += 1
+
+    def get_batch(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'non_field_errors': ['Expected a non-empty list of items.']})
+        if len(items) > self.max_batch_size:
+            raise ValidationError({
+                'non_field_errors': [f'A batch is limited to {self.max_batch_size} items.']
+            })
+        return items
+
+    def get_bulk_serializer_class(self):
+        return self.bulk_serializer_class or self.get_serializer_class()
+
+    def get_bulk_serializer_context(self, serializer_class, items):
+        """Serializer context with every referenced related object loaded up front."""
+        context = self.get_serializer_context()
+        prefetched = {}
+        for name, field in serializer_class(context=context).fields.items():
+            if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pks = {
+                to_pk(queryset.model, item[name])
+                for item in items
+                if isinstance(item, dict) and item.get(name) is not None
+            }
+            pks.discard(None)
+            prefetched[name] = queryset.in_bulk(pks)
+        context['prefetched'] = prefetched
+        return context
+
+    def validate_batch_items(self, items, instances, partial=False, errors=None):
+        """
+        Validate every item and return ``(instance, validated_data)`` pairs;
+        raises a ValidationError listing per-item errors if any item fails.
+        """
+        errors = dict(errors or {})
+        serializer_class = self.get_bulk_serializer_class()
+        context = self.get_bulk_serializer_context(serializer_class, items)
+        valid = {}
+        for index, (item, instance) in enumerate(zip(items, instances)):
+            if index in errors:
+                continue
+            serializer = serializer_class(instance, data=item, partial=partial, context=context)
+            if serializer.is_valid():
+                valid[index] = (instance, serializer.validated_data)
+            else:
+                errors[index] = serializer.errors
+        for index, error in self.validate_batch(valid).items():
+            errors[index] = error
+        if errors:
+            raise ValidationError([errors.get(index, {}) for index in range(len(items))])
+        return list(valid.values())
+
+    def validate_batch(self, valid):
+        """
+        Cross-item checks. ``valid`` maps item index to ``(instance,
+        validated_data)``; return a mapping of index to errors.
+        """
+        return {}
+
+    def perform_bulk_create(self, validated):
+        model = self.get_queryset().model
+        return model.objects.bulk_create([model(**data) for data in validated])
+
+    def apply_update(self, instance, validated_data):
+        """Set ``validated_data`` on ``instance``; return the names of changed fields."""
+        fields = set()
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+            fields.add(attr)
+        # bulk_update() does not run auto_now
+        for field in instance._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):
+                field.pre_save(instance, add=False)
+                fields.add(field.name)
+        return fields
+
+    def perform_bulk_update(self, valid):
+        instances = [instance for instance, _ in valid]
+        model = self.get_queryset().model
+        if issubclass(model, VersionedModel):
+            # bulk_update() skips the conditional save of VersionedModel
+            self.claim_versions(instances)
+        fields = set()
+        for instance, validated_data in valid:
+            fields |= self.apply_update(instance, validated_data)
+        model.objects.bulk_update(instances, sorted(fields))
+        return instances
+
+    def perform_bulk_destroy(self, queryset):
+        queryset.delete()
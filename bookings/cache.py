@@ -0,0 +1,81 @@
+"""
+Per-patient response cache for the patient history endpoint.
+
+Every patient has a version counter that is bumped by any write touching
+that patient or their bookings (see bookings.signals, the bulk endpoints
+and merge_patients). Cached pages are keyed by that version, so a bump
+orphans all of the patient's pages at once. The doctor directory version
+is part of the key too, so renaming a doctor refreshes the histories
+showing them.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from profiles import cache as directory_cache
+
+KEY_PREFIX = 'patient-history'
+
+
+def _version_key(patient_id):
+    return f'{KEY_PREFIX}:{patient_id}:version'
+
+
+def get_version(patient_id):
+    key = _version_key(patient_id)
+    version = cache.get(key)
+    if version is None:
+        # Time-based start so a recreated counter never reuses an old version
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump(patient_ids):
+    for patient_id in patient_ids:
+        try:
+            cache.incr(_version_key(patient_id))
+        except ValueError:
+            cache.set(_version_key(patient_id), time.time_ns(), timeout=None)
+
+
+def invalidate(*patient_ids):
+    """
+    Invalidate now and again once the surrounding transaction commits, so a
+    page rendered from pre-commit data in between cannot stay cached.
+    """
+    patient_ids = {pk for pk in patient_ids if pk is not None}
+    if not patient_ids:
+        return
+    _bump(patient_ids)
+    transaction.on_commit(lambda: _bump(patient_ids))
+
+
+def cache_key(request, patient_id, scope):
+    """``scope`` separates what different users may see (e.g. a doctor's own bookings)."""
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    # Host is part of the key because pagination links are absolute URLs
+    raw = json.dumps([request.get_host(), scope, params], separators=(',', ':'))
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return (
+        f'{KEY_PREFIX}:{patient_id}:{get_version(patient_id)}:'
+        f'{directory_cache.get_version()}:{digest}'
+    )
+
+
+def get_page(key):
+    return cache.get(key)
+
+
+def store_page(key, data):
+    cache.set(key, data, timeout=settings.PATIENT_HISTORY_CACHE_TIMEOUT)
@@ -0,0 +1,73 @@
+"""
+Duplicate patient detection and merging.
+
+Candidates are found with a blocking key instead of pairwise comparison:
+patients are streamed in date-of-birth order (served by the
+``date_of_birth`` index) and, within each birth date, grouped by their
+normalized name tokens in any order. One pass over the table, with memory
+bounded by the patients sharing a single birth date.
+"""
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import audit
+from . import cache as history_cache
+from . import events
+from .models import ArchivedBooking, AuditEntry, Booking, Patient
+
+
+def blocking_key(name_key):
+    """Order-insensitive name key: "Doe John" and "john DOE" block together."""
+    return ' '.join(sorted(name_key.split()))
+
+
+def duplicate_groups(queryset=None, chunk_size=2000):
+    """
+    Yield lists of patient ids (ascending) that share a date of birth and
+    the same normalized name.
+    """
+    queryset = Patient.objects.all() if queryset is None else queryset
+    rows = (
+        queryset.order_by('date_of_birth', 'id')
+        .values_list('date_of_birth', 'id', 'name_key')
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, same_birth_date in groupby(rows, key=lambda row: row[0]):
+        blocks = {}
+        for _, patient_id, name_key in same_birth_date:
+            if name_key:
+                blocks.setdefault(blocking_key(name_key), []).append(patient_id)
+        for ids in blocks.values():
+            if len(ids) > 1:
+                yield ids
+
+
+def merge_patients(survivor_id, duplicate_ids):
+    """
+    Re-point every booking of ``duplicate_ids`` to ``survivor_id`` with one
+    UPDATE (plus one for archived bookings) and delete the duplicates,
+    atomically. Returns the number of live bookings moved.
+    """
+    duplicate_ids = [pk for pk in duplicate_ids if pk != survivor_id]
+    if not duplicate_ids:
+        return 0
+    with transaction.atomic():
+        # Lock the rows involved so concurrent merges cannot interleave
+        list(
+            Patient.objects.select_for_update()
+            .filter(pk__in=[survivor_id, *duplicate_ids]).values_list('pk', flat=True)
+        )
+        bookings = Booking.objects.filter(patient_id__in=duplicate_ids)
+        moving = list(bookings.only('id', 'patient_id', 'doctor_id', 'scheduled_at', 'ends_at'))
+        moved = bookings.update(patient_id=survivor_id, updated_at=timezone.now(), version=F('version') + 1)
+        ArchivedBooking.objects.filter(patient_id__in=duplicate_ids).update(patient_id=survivor_id)
+        Patient.objects.filter(pk__in=duplicate_ids).delete()
+        history_cache.invalidate(survivor_id, *duplicate_ids)
+        for booking in moving:
+            audit.record(AuditEntry.UPDATED, booking, {'patient': booking.patient_id}, {'patient': survivor_id})
+            booking.patient_id = survivor_id
+        events.publish(*(events.booking_event(events.UPDATED, booking) for booking in moving))
+    return moved
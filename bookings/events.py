@@ -0,0 +1,257 @@
+"""
+Booking change feed behind the reception dashboard's SSE stream.
+
+Booking writes are turned into small events (``created``, ``updated``,
+``deleted`` with doctor, patient and times) and published once the
+surrounding transaction commits, so rolled back writes are never
+announced. Events go to an append-only log with increasing sequence
+numbers, which is what lets a reconnecting client resume from its
+``Last-Event-ID``:
+
+* ``LocalEventLog`` (default) keeps the last BOOKING_EVENTS_BUFFER events
+  in process memory. Subscribers wait on an asyncio event that publishing
+  sets, so an idle stream costs nothing until the next heartbeat.
+* ``CacheEventLog`` stores events in the shared cache (CACHE_URL) so that
+  every web process sees every other process's writes: a stand-in for a
+  real pub/sub channel. In-process subscribers are still woken directly;
+  events from other processes are picked up every
+  BOOKING_EVENTS_POLL_SECONDS.
+
+Event ids are ``<epoch>:<sequence>``. A client whose id belongs to another
+epoch (process restart, cache flush) or fell out of the buffer gets a
+``reset`` event and should reload its snapshot.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .revenue import booking_day
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+
+def booking_event(kind, booking, previous=None):
+    """Event payload for ``booking``; ``previous`` is its stored (doctor_id, scheduled_at) before an update."""
+    event = {
+        'type': kind,
+        'id': booking.pk,
+        'doctor': booking.doctor_id,
+        'patient': booking.patient_id,
+        'scheduled_at': booking.scheduled_at.isoformat(),
+        'ends_at': booking.ends_at.isoformat() if booking.ends_at else None,
+        'days': [booking_day(booking.scheduled_at).isoformat()],
+    }
+    if previous is not None and previous != (booking.doctor_id, booking.scheduled_at):
+        event['previous_doctor'], previous_at = previous
+        event['previous_scheduled_at'] = previous_at.isoformat()
+        event['days'].append(booking_day(previous_at).isoformat())
+    return event
+
+
+def publish(*events):
+    """Publish ``events`` once the current transaction commits."""
+    if events:
+        transaction.on_commit(lambda: get_log().publish(events))
+
+
+def matches(event, doctor_id=None, day=None):
+    """True if ``event`` concerns ``doctor_id`` and/or clinic-local ``day``, before or after a change."""
+    if doctor_id is not None and doctor_id not in (event['doctor'], event.get('previous_doctor')):
+        return False
+    if day is not None and day.isoformat() not in event['days']:
+        return False
+    return True
+
+
+class EventLog:
+    """Sequence-numbered event log with in-process async wake-ups."""
+    poll_seconds = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def _notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, flag in waiters:
+            loop.call_soon_threadsafe(flag.set)
+
+    def format_id(self, seq):
+        return f'{self.epoch}:{seq}'
+
+    def parse_id(self, value):
+        """Sequence number of an event id of this log's epoch, or None."""
+        epoch, _, seq = (value or '').partition(':')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    async def wait(self, after, timeout):
+        """
+        Return ``(events, gap)`` published after sequence ``after``, waiting
+        up to ``timeout`` seconds for the first one. ``gap`` is True when
+        events after ``after`` are no longer available.
+        """
+        loop = asyncio.get_running_loop()
+        flag = asyncio.Event()
+        waiter = (loop, flag)
+        # Registered before reading so a publish in between is not missed
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                flag.clear()
+                events, gap = await self.since(after)
+                remaining = deadline - loop.time()
+                if events or gap or remaining <= 0:
+                    return events, gap
+                try:
+                    await asyncio.wait_for(flag.wait(), min(remaining, self.poll_seconds or remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class LocalEventLog(EventLog):
+    def __init__(self, size):
+        super().__init__()
+        self.epoch = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=size)
+        self._seq = 0
+
+    def publish(self, events):
+        with self._lock:
+            for event in events:
+                self._seq += 1
+                self._events.append((self._seq, event))
+        self._notify()
+
+    async def last_seq(self):
+        return self._seq
+
+    async def since(self, after):
+        with self._lock:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if after > self._seq or after < oldest - 1:
+                return [], True
+            return [(seq, event) for seq, event in self._events if seq > after], False
+
+
+class CacheEventLog(EventLog):
+    SEQ_KEY = 'booking-events:seq'
+    EPOCH_KEY = 'booking-events:epoch'
+    EVENT_KEY = 'booking-events:event:{}'
+    # How long a client may stay disconnected and still resume
+    RETENTION_SECONDS = 3600
+
+    def __init__(self, size, poll_seconds):
+        super().__init__()
+        self.size = size
+        self.poll_seconds = poll_seconds
+        cache.add(self.EPOCH_KEY, uuid.uuid4().hex[:8], timeout=None)
+        self.epoch = cache.get(self.EPOCH_KEY)
+
+    def publish(self, events):
+        cache.add(self.SEQ_KEY, 0, timeout=None)
+        for event in events:
+            cache.set(self.EVENT_KEY.format(cache.incr(self.SEQ_KEY)), event, timeout=self.RETENTION_SECONDS)
+        self._notify()
+
+    async def last_seq(self):
+        return await cache.aget(self.SEQ_KEY) or 0
+
+    async def since(self, after):
+        current = await self.last_seq()
+        if after > current or current - after > self.size:
+            return [], True
+        if after == current:
+            return [], False
+        seqs = range(after + 1, current + 1)
+        found = await cache.aget_many([self.EVENT_KEY.format(seq) for seq in seqs])
+        events = []
+        for seq in seqs:
+            event = found.get(self.EVENT_KEY.format(seq))
+            if event is None:
+                # A hole followed by later events was lost (expired, evicted);
+                # a missing tail is still being written by its publisher
+                return events, not events and bool(found)
+            events.append((seq, event))
+        return events, False
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    global _log
+    with _log_lock:
+        if _log is None:
+            if settings.BOOKING_EVENTS_BACKEND == 'cache':
+                _log = CacheEventLog(settings.BOOKING_EVENTS_BUFFER, settings.BOOKING_EVENTS_POLL_SECONDS)
+            else:
+                _log = LocalEventLog(settings.BOOKING_EVENTS_BUFFER)
+        return _log
+
+
+def reset_log():
+    """Drop the log instance (tests, settings changes)."""
+    global _log
+    with _log_lock:
+        _log = None
+
+
+def sse_message(event_id, kind, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {kind}\ndata: {payload}\n\n'
+
+
+async def resume_point(log, last_event_id=None):
+    """
+    ``(after, reset)``: the sequence a stream continues from, and whether
+    ``last_event_id`` could not be resumed (the client must reload).
+    """
+    after = log.parse_id(last_event_id)
+    if after is not None:
+        return after, False
+    return await log.last_seq(), bool(last_event_id)
+
+
+async def event_stream(log, after, doctor_id=None, day=None, reset=False):
+    """
+    Yield SSE messages for events after sequence ``after`` that match the
+    filters, with keep-alive comments while idle. Ends after
+    BOOKING_EVENTS_STREAM_SECONDS; the browser then reconnects with
+    ``Last-Event-ID``.
+    """
+    heartbeat = settings.BOOKING_EVENTS_HEARTBEAT_SECONDS
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.BOOKING_EVENTS_STREAM_SECONDS
+    yield f'retry: {settings.BOOKING_EVENTS_RETRY_MS}\n\n'
+    if reset:
+        yield sse_message(log.format_id(after), 'reset', {'reason': 'unknown event id; reload'})
+    while (remaining := deadline - loop.time()) > 0:
+        events, gap = await log.wait(after, min(heartbeat, remaining))
+        if gap:
+            after = await log.last_seq()
+            yield sse_message(log.format_id(after), 'reset', {'reason': 'events missed; reload'})
+            continue
+        if not events:
+            yield ': keep-alive\n\n'
+        for seq, event in events:
+            after = seq
+            if matches(event, doctor_id, day):
+                yield sse_message(log.format_id(seq), event['type'], event)
@@ -0,0 +1,25 @@
+import django_filters
+
+from .models import ArchivedBooking, Booking
+
+
+class BookingFilter(django_filters.FilterSet):
+    """
+    ``?from=&to=`` select bookings starting in ``[from, to)``; together with
+    ``doctor`` or ``patient`` they are answered by the matching composite
+    (doctor|patient, scheduled_at) index as a single range scan.
+    """
+    # "from" is a keyword, so it cannot be declared as a plain attribute
+    locals()['from'] = django_filters.IsoDateTimeFilter(field_name='scheduled_at', lookup_expr='gte')
+    to = django_filters.IsoDateTimeFilter(field_name='scheduled_at', lookup_expr='lt')
+
+    class Meta:
+        model = Booking
+        fields = ['doctor', 'patient']
+
+
+class ArchivedBookingFilter(BookingFilter):
+    """Same filters over the archive, on its own (doctor|patient, scheduled_at) indexes."""
+
+    class Meta(BookingFilter.Meta):
+        model = ArchivedBooking
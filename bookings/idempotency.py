@@ -0,0 +1,88 @@
+"""
+``Idempotency-Key`` support for create endpoints.
+
+The first request with a key runs normally and its response is stored in
+the same transaction as the writes it made. Retries with the same key are
+answered from that row (one indexed lookup) without re-running validation
+or touching the booking tables. Failed requests are not stored, so a
+client can fix its payload and retry with the same key.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is already being processed.'
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request body.'
+    default_code = 'idempotency_key_mismatch'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """Mix into a CreateAPIView; ``idempotency_scope`` namespaces its keys."""
+    idempotency_scope = None
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Must be at most {MAX_KEY_LENGTH} characters.'})
+
+        scope = self.idempotency_scope or type(self).__name__
+        fingerprint = request_fingerprint(request)
+        now = timezone.now()
+
+        stored = IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__gt=now).first()
+        if stored is not None:
+            return self.replay(stored, fingerprint)
+
+        try:
+            with transaction.atomic():
+                # An expired row with the same key would block the insert below
+                IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+                response = super().create(request, *args, **kwargs)
+                IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=fingerprint,
+                    status_code=response.status_code,
+                    response_body=json.loads(json.dumps(response.data, default=str)),
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            stored = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if stored is None:
+                raise IdempotencyKeyInUse()
+            return self.replay(stored, fingerprint)
+        return response
+
+    def replay(self, stored, fingerprint):
+        if stored.request_hash != fingerprint:
+            raise IdempotencyKeyMismatch()
+        return Response(stored.response_body, status=stored.status_code, headers={REPLAY_HEADER: 'true'})
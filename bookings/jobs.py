@@ -0,0 +1,36 @@
+"""Background jobs of the bookings app (run by ``manage.py run_jobs``)."""
+from core.jobs import job
+from profiles.models import DoctorProfile
+
+from . import archive, audit, reminders, revenue
+from .availability import refresh_next_slot
+from .models import AuditEntry
+
+
+@job('bookings.refresh_next_slot')
+def refresh_next_slot_job(doctor_id):
+    # The doctor may have been deleted since the refresh was queued
+    if DoctorProfile.objects.filter(pk=doctor_id).exists():
+        refresh_next_slot(doctor_id)
+
+
+@job('bookings.rebuild_revenue_rollup')
+def rebuild_revenue_rollup(batch_size=1000):
+    revenue.rebuild(batch_size=batch_size)
+
+
+@job('bookings.send_reminders')
+def send_reminders(batch_size=reminders.DEFAULT_BATCH_SIZE, offsets=None):
+    reminders.send_due_reminders(offsets=offsets, batch_size=batch_size)
+
+
+@job('bookings.archive_bookings')
+def archive_bookings(chunk_size=archive.DEFAULT_CHUNK_SIZE, older_than_days=None, limit=None):
+    # The cutoff is taken when the job runs, not when it was queued
+    archive.archive_bookings(archive.archive_cutoff(older_than_days), chunk_size=chunk_size, limit=limit)
+
+
+@job('bookings.write_audit_entries')
+def write_audit_entries(entries):
+    # Raises on failure, so the job is retried with backoff
+    AuditEntry.objects.bulk_create([audit.from_payload(entry) for entry in entries])
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bookings.archive import DEFAULT_CHUNK_SIZE, archive_bookings, archive_cutoff
+from bookings.models import Booking
+from core.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bookings that started more than BOOKING_ARCHIVE_AFTER_DAYS ago "
+        "to the archive table, oldest first, one short transaction per chunk. "
+        "Safe to interrupt and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.BOOKING_ARCHIVE_AFTER_DAYS,
+            help=f"Archive bookings that started this many days ago or earlier "
+                 f"(default: {settings.BOOKING_ARCHIVE_AFTER_DAYS}).",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Bookings moved per transaction (default: {DEFAULT_CHUNK_SIZE}).",
+        )
+        parser.add_argument('--limit', type=int, help="Stop after moving this many bookings.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the bookings due.")
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help="Queue the bookings.archive_bookings job for run_jobs instead of archiving here.",
+        )
+
+    def handle(self, *args, **options):
+        before = archive_cutoff(options['older_than_days'])
+        if options['dry_run']:
+            due = Booking.objects.filter(scheduled_at__lt=before).count()
+            self.stdout.write(self.style.SUCCESS(f"{due} booking(s) before {before:%Y-%m-%d} would be archived."))
+            return
+        if options['enqueue']:
+            queued = enqueue(
+                'bookings.archive_bookings',
+                {
+                    'older_than_days': options['older_than_days'],
+                    'chunk_size': options['chunk_size'],
+                    'limit': options['limit'],
+                },
+                unique_key='bookings.archive_bookings',
+            )
+            self.stdout.write(self.style.SUCCESS(
+                "Queued the archive run." if queued else "An archive run is already queued."
+            ))
+            return
+        moved = archive_bookings(before, chunk_size=options['chunk_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} booking(s) before {before:%Y-%m-%d}."))
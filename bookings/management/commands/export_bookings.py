@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.export import CHUNK_SIZE, FORMATS, iter_export
+from bookings.filters import BookingFilter
+from bookings.models import Booking
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream bookings (with patient/doctor names and totals) as CSV or "
+        "NDJSON, oldest first. Memory use does not grow with the export size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--from', dest='from', help="Only bookings starting at or after this ISO date/datetime.")
+        parser.add_argument('--to', help="Only bookings starting before this ISO date/datetime.")
+        parser.add_argument('--doctor', type=int, help="Only bookings of this doctor profile id.")
+        parser.add_argument('--output', help="Write to this file instead of stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        data = {key: options[key] for key in ('from', 'to', 'doctor') if options[key] is not None}
+        filterset = BookingFilter(data=data, queryset=Booking.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        lines = iter_export(filterset.qs, options['format'], chunk_size=options['chunk_size'])
+        written = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for line in lines:
+                    output.write(line)
+                    written += 1
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+                written += 1
+        if options['format'] == 'csv':
+            written -= 1  # header
+        self.stderr.write(self.style.SUCCESS(f"Exported {written} booking(s)."))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from bookings import audit
+from bookings.dedupe import duplicate_groups, merge_patients
+from bookings.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        "List likely duplicate patients (same date of birth and normalized "
+        "name). With --merge, fold each group into its oldest record."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help="Merge every group into its lowest-id patient instead of only listing it.",
+        )
+
+    def handle(self, *args, **options):
+        # Collected first: merging deletes rows from the table being streamed
+        groups = list(duplicate_groups())
+        merged = moved = 0
+        # Audit entries of every merge are written together at the end
+        with audit.buffered():
+            for ids in groups:
+                survivor = Patient.objects.only('first_name', 'last_name', 'date_of_birth').get(pk=ids[0])
+                self.stdout.write(
+                    f"{survivor.date_of_birth} {survivor.first_name} {survivor.last_name}: "
+                    f"{', '.join(str(pk) for pk in ids)}"
+                )
+                if options['merge']:
+                    moved += merge_patients(ids[0], ids[1:])
+                    merged += len(ids) - 1
+
+        if options['merge']:
+            message = f"Merged {merged} duplicate(s) in {len(groups)} group(s); moved {moved} booking(s)."
+        else:
+            message = f"Found {len(groups)} group(s) of likely duplicates."
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from bookings.revenue import rebuild
+from core.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-doctor daily revenue rollup from Booking. It is "
+        "normally kept in sync on every booking write; run this after "
+        "imports, raw SQL edits or a change of CLINIC_TIME_ZONE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of rollup rows written per INSERT (default: 1000).",
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help="Queue the bookings.rebuild_revenue_rollup job for run_jobs instead of rebuilding here.",
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            queued = enqueue(
+                'bookings.rebuild_revenue_rollup',
+                {'batch_size': options['batch_size']},
+                unique_key='bookings.rebuild_revenue_rollup',
+            )
+            self.stdout.write(self.style.SUCCESS(
+                "Queued the revenue rollup rebuild." if queued else "A revenue rollup rebuild is already queued."
+            ))
+            return
+        rows = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} doctor/day revenue row(s)."))
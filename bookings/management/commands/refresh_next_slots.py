@@ -0,0 +1,43 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from profiles.models import DoctorProfile
+from bookings.availability import clinic_timezone, refresh_next_slot
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the cached next free slot of doctors. By default only "
+        "doctors whose cached slot has already started, was never computed, "
+        "or was empty before today's horizon moved forward are refreshed; "
+        "run it every few minutes from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="Refresh every active doctor, not just stale entries.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        doctors = DoctorProfile.objects.filter(is_active=True)
+        if not options['all']:
+            tz = clinic_timezone()
+            today = datetime.combine(now.astimezone(tz).date(), time.min, tzinfo=tz)
+            doctors = doctors.filter(
+                Q(next_slot__isnull=True)
+                | Q(next_slot__starts_at__lt=now)
+                # No free slot within the horizon as of an earlier day: the
+                # horizon has gained a day since
+                | Q(next_slot__starts_at__isnull=True, next_slot__computed_at__lt=today)
+            )
+        refreshed = 0
+        for doctor_id in list(doctors.values_list('pk', flat=True)):
+            refresh_next_slot(doctor_id, now=now)
+            refreshed += 1
+        self.stdout.write(self.style.SUCCESS(f"Refreshed next slot for {refreshed} doctor(s)."))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.reminders import DEFAULT_BATCH_SIZE, send_due_reminders
+from core.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        "Email reminders for upcoming appointments (REMINDER_OFFSETS_HOURS "
+        "before they start). Each reminder is sent at most once; run it "
+        "every few minutes from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Bookings processed and emails sent per batch (default: {DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--offset',
+            type=int,
+            action='append',
+            dest='offsets',
+            help="Only send reminders for this many hours ahead (repeatable).",
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help="Queue the bookings.send_reminders job for run_jobs instead of sending here.",
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            queued = enqueue(
+                'bookings.send_reminders',
+                {'batch_size': options['batch_size'], 'offsets': options['offsets']},
+                unique_key='bookings.send_reminders',
+            )
+            self.stdout.write(self.style.SUCCESS(
+                "Queued the reminder run." if queued else "A reminder run is already queued."
+            ))
+            return
+        stats = send_due_reminders(offsets=options['offsets'], batch_size=options['batch_size'])
+        for offset_hours, counts in stats.items():
+            self.stdout.write(
+                f"{offset_hours}h: {counts['sent']} sent, {counts['skipped']} skipped (no email)"
+            )
+        failed = sum(counts['failed'] for counts in stats.values())
+        if failed:
+            raise CommandError(f"Delivery failed for {failed} reminder(s); they will be retried on the next run.")
+        sent = sum(counts['sent'] for counts in stats.values())
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} reminder(s)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.models import SlotHold
+
+
+class Command(BaseCommand):
+    help = "Delete expired slot holds (one indexed DELETE on expires_at)."
+
+    def handle(self, *args, **options):
+        deleted, _ = SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} expired hold(s)."))
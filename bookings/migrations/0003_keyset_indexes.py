@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-17 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_total'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['-scheduled_at', 'id'], name='bookings_bo_schedul_090ca1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='bookings_pa_last_na_a6c2fd_idx'),
+        ),
+    ]
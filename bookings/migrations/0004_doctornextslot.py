@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 07:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_keyset_indexes'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorNextSlot',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='next_slot', serialize=False, to='profiles.doctorprofile')),
+                ('starts_at', models.DateTimeField(blank=True, db_index=True, help_text='Start of the earliest free slot; empty if none within the horizon', null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Doctor next slot',
+                'verbose_name_plural': 'Doctor next slots',
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+import bookings.models
+import django.core.validators
+import django.db.models.deletion
+from datetime import datetime, timedelta, timezone
+from django.db import migrations, models
+
+SLOT_GRID_SECONDS = 300
+
+
+def backfill(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingSlot = apps.get_model('bookings', 'BookingSlot')
+    for booking in Booking.objects.all().iterator(chunk_size=1000):
+        booking.ends_at = booking.scheduled_at + timedelta(minutes=booking.duration_minutes)
+        booking.save(update_fields=['ends_at'])
+        start = int(booking.scheduled_at.timestamp()) // SLOT_GRID_SECONDS * SLOT_GRID_SECONDS
+        cell = datetime.fromtimestamp(start, tz=timezone.utc)
+        slots = []
+        while cell < booking.ends_at:
+            slots.append(BookingSlot(booking_id=booking.pk, doctor_id=booking.doctor_id, starts_at=cell))
+            cell += timedelta(seconds=SLOT_GRID_SECONDS)
+        # Legacy double bookings keep their rows; only the first claims the key
+        BookingSlot.objects.bulk_create(slots, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_doctornextslot'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=bookings.models.default_duration, validators=[django.core.validators.MinValueValidator(1)], help_text='Length of the appointment in minutes'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True, help_text='scheduled_at + duration_minutes, maintained on save'),
+        ),
+        migrations.CreateModel(
+            name='BookingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='bookings.booking')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.doctorprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'starts_at'), name='unique_doctor_slot')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, help_text='scheduled_at + duration_minutes, maintained on save'),
+        ),
+    ]
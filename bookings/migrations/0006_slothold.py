@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 07:37
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_booking_duration_and_slots'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='profiles.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'Slot hold',
+                'verbose_name_plural': 'Slot holds',
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'starts_at'), name='unique_doctor_hold')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_idempotencykey'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['doctor', 'scheduled_at'], name='bookings_bo_doctor__a120d6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['patient', 'scheduled_at'], name='bookings_bo_patient_1b56e2_idx'),
+        ),
+    ]
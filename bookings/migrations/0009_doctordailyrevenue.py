@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-17 07:58
+
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_revenue(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    DoctorDailyRevenue = apps.get_model('bookings', 'DoctorDailyRevenue')
+    totals = (
+        Booking.objects.order_by()
+        .annotate(day=TruncDate('scheduled_at', tzinfo=ZoneInfo(settings.CLINIC_TIME_ZONE)))
+        .values('doctor_id', 'day')
+        .annotate(
+            count=models.Count('id'),
+            revenue=Coalesce(
+                models.Sum('total'), models.Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    )
+    DoctorDailyRevenue.objects.bulk_create([
+        DoctorDailyRevenue(
+            doctor_id=row['doctor_id'], day=row['day'],
+            bookings_count=row['count'], revenue=row['revenue'],
+        )
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_booking_calendar_indexes'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Booking date in the clinic time zone')),
+                ('bookings_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='profiles.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'Doctor daily revenue',
+                'verbose_name_plural': 'Doctor daily revenue',
+                'indexes': [models.Index(fields=['day', 'doctor'], name='bookings_do_day_d7228a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day'), name='unique_doctor_revenue_day')],
+            },
+        ),
+        migrations.RunPython(backfill_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-17 08:07
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def _normalize(text):
+    # Frozen copy of bookings.models.normalize_search_text
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(_NON_WORD_RE.split(stripped.casefold())).strip()
+
+
+def backfill_search_keys(apps, schema_editor):
+    Patient = apps.get_model('bookings', 'Patient')
+    batch = []
+    for patient in Patient.objects.order_by('pk').iterator(chunk_size=1000):
+        patient.name_key = _normalize(f"{patient.last_name} {patient.first_name}")
+        patient.name_key_reversed = _normalize(f"{patient.first_name} {patient.last_name}")
+        patient.email_key = (patient.email or '').strip().lower()
+        batch.append(patient)
+        if len(batch) >= 1000:
+            Patient.objects.bulk_update(batch, ['name_key', 'name_key_reversed', 'email_key'])
+            batch = []
+    if batch:
+        Patient.objects.bulk_update(batch, ['name_key', 'name_key_reversed', 'email_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_doctordailyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='email_key',
+            field=models.CharField(default='', editable=False, help_text='Lowercased email', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='name_key',
+            field=models.CharField(default='', editable=False, help_text="'last first', normalized", max_length=201),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='name_key_reversed',
+            field=models.CharField(default='', editable=False, help_text="'first last', normalized", max_length=201),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name_key', 'id'], name='bookings_pa_name_ke_026226_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name_key_reversed', 'id'], name='bookings_pa_name_ke_c87fd5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['email_key', 'id'], name='bookings_pa_email_k_0411db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['date_of_birth'], name='bookings_pa_date_of_fb53ce_idx'),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
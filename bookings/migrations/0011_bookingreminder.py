@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 08:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_patient_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset_hours', models.PositiveSmallIntegerField()),
+                ('scheduled_at', models.DateTimeField(help_text='Appointment time the reminder was for')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('skipped', 'Skipped (no email address)')], default='pending', max_length=10)),
+                ('claim_token', models.CharField(editable=False, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='bookings.booking')),
+            ],
+            options={
+                'verbose_name': 'Booking reminder',
+                'verbose_name_plural': 'Booking reminders',
+                'indexes': [models.Index(fields=['claim_token'], name='bookings_bo_claim_t_f81ec3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'offset_hours', 'scheduled_at'), name='unique_booking_reminder')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-17 08:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_bookingreminder'),
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('scheduled_at', models.DateTimeField()),
+                ('duration_minutes', models.PositiveSmallIntegerField()),
+                ('ends_at', models.DateTimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('total', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='profiles.doctorprofile')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='bookings.patient')),
+            ],
+            options={
+                'verbose_name': 'Archived booking',
+                'verbose_name_plural': 'Archived bookings',
+                'ordering': ['-scheduled_at'],
+                'indexes': [models.Index(fields=['-scheduled_at', 'id'], name='bookings_ar_schedul_cb8575_idx'), models.Index(fields=['doctor', 'scheduled_at'], name='bookings_ar_doctor__2d81b1_idx'), models.Index(fields=['patient', 'scheduled_at'], name='bookings_ar_patient_1ec174_idx')],
+            },
+        ),
+    ]
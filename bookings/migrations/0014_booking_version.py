@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_auditentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
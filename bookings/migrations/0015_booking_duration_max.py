@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-17 10:13
+
+import bookings.models
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0014_booking_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=bookings.models.default_duration, help_text='Length of the appointment in minutes', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(480)]),
+        ),
+    ]
@@ -1,7 +1,36 @@
-from django.db import models
+import re
+import unicodedata
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import models, transaction, IntegrityError
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+from core.models import VersionedModel
 from profiles.models import DoctorProfile
 
+
+_NON_WORD_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+# Granularity of BookingSlot keys; every booking claims each cell it touches
+SLOT_GRID = timedelta(minutes=5)
+
+
+def default_duration():
+    return settings.APPOINTMENT_SLOT_MINUTES
+
+
+# Longest appointment staff can book; keeps one booking from blocking a
+# doctor for days (and claiming thousands of slot keys)
+MAX_DURATION_MINUTES = 8 * 60
+
+
+class SlotUnavailable(ValidationError):
+    """Raised when a booking overlaps another booking of the same doctor."""
+
 class Patient(models.Model):
     """
     Represents a patient in the clinic.
@@ -11,19 +40,56 @@ class Patient(models.Model):
     date_of_birth = models.DateField()
     email         = models.EmailField(unique=True)
 
+    # Normalized (lowercased, unaccented) typeahead keys, maintained on save
+    name_key          = models.CharField(max_length=201, editable=False, default='',
+                                         help_text="'last first', normalized")
+    name_key_reversed = models.CharField(max_length=201, editable=False, default='',
+                                         help_text="'first last', normalized")
+    email_key         = models.CharField(max_length=254, editable=False, default='',
+                                         help_text="Lowercased email")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SEARCH_KEY_FIELDS = ['name_key', 'name_key_reversed', 'email_key']
+
     class Meta:
         ordering = ['last_name', 'first_name']
         verbose_name = 'Patient'
         verbose_name_plural = 'Patients'
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id']),
+            # Prefix range scans for the typeahead endpoint
+            models.Index(fields=['name_key', 'id']),
+            models.Index(fields=['name_key_reversed', 'id']),
+            models.Index(fields=['email_key', 'id']),
+            models.Index(fields=['date_of_birth']),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def update_search_keys(self):
+        self.name_key = normalize_search_text(f"{self.last_name} {self.first_name}")
+        self.name_key_reversed = normalize_search_text(f"{self.first_name} {self.last_name}")
+        self.email_key = (self.email or '').strip().lower()
+
+    def save(self, *args, **kwargs):
+        self.update_search_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.SEARCH_KEY_FIELDS)
+        super().save(*args, **kwargs)
+
+
+def normalize_search_text(text):
+    """Casefold, strip accents and collapse punctuation/whitespace to single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(_NON_WORD_RE.split(stripped.casefold())).strip()
+
 
-class Booking(models.Model):
+class Booking(VersionedModel):
     """
     Represents an appointment booking between a patient and a doctor.
     """
@@ -38,6 +104,15 @@ class Booking(models.Model):
         related_name='bookings'
     )
     scheduled_at = models.DateTimeField()
+    duration_minutes = models.PositiveSmallIntegerField(
+        default=default_duration,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_DURATION_MINUTES)],
+        help_text="Length of the appointment in minutes"
+    )
+    ends_at      = models.DateTimeField(
+        editable=False,
+        help_text="scheduled_at + duration_minutes, maintained on save"
+    )
     notes        = models.TextField(blank=True)
     total = models.DecimalField(
                 max_digits=12,         # Total digits (example: 99999999.99)
@@ -53,6 +128,362 @@ class Booking(models.Model):
         ordering = ['-scheduled_at']
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
+        indexes = [
+            models.Index(fields=['-scheduled_at', 'id']),
+            # Calendar range scans per doctor / per patient
+            models.Index(fields=['doctor', 'scheduled_at']),
+            models.Index(fields=['patient', 'scheduled_at']),
+        ]
+
+    def __str__(self):
+        return f"Booking: {self.patient} with {self.doctor} at {self.scheduled_at}"
+
+    def update_ends_at(self):
+        self.ends_at = self.scheduled_at + timedelta(minutes=self.duration_minutes)
+
+    def save(self, *args, **kwargs):
+        self.update_ends_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'ends_at'}
+        # Booking row and slot keys commit together or not at all
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # The pre_save receiver snapshots the stored row; notes or price
+            # edits keep their slot keys
+            previous = getattr(self, '_previous_values', None)
+            if previous is None or (
+                previous['doctor'], previous['scheduled_at'], previous['duration_minutes']
+            ) != (self.doctor_id, self.scheduled_at, self.duration_minutes):
+                self.reserve_slots()
+
+    def reserve_slots(self):
+        """
+        Claim the BookingSlot keys covered by this booking. The unique
+        (doctor, starts_at) constraint makes overlapping bookings impossible
+        even under concurrent writes; the pre-check only gives a cleaner error.
+        """
+        keys = self.slot_keys()
+        BookingSlot.objects.filter(booking=self).delete()
+        taken = BookingSlot.objects.filter(
+            doctor_id=self.doctor_id, starts_at__in=[key.starts_at for key in keys]
+        )
+        if taken.exists():
+            raise SlotUnavailable("The doctor already has a booking at this time.", code='slot_unavailable')
+        try:
+            with transaction.atomic():
+                BookingSlot.objects.bulk_create(keys)
+        except IntegrityError:
+            raise SlotUnavailable("The doctor already has a booking at this time.", code='slot_unavailable')
+
+    def slot_keys(self):
+        """Unsaved BookingSlot rows for the cells this booking covers."""
+        return [
+            BookingSlot(booking=self, doctor_id=self.doctor_id, starts_at=cell)
+            for cell in slot_cells(self.scheduled_at, self.ends_at)
+        ]
+
+
+def slot_cells(start, end):
+    """SLOT_GRID-aligned cell starts (UTC) covering ``[start, end)``."""
+    grid = int(SLOT_GRID.total_seconds())
+    cell = datetime.fromtimestamp(int(start.timestamp()) // grid * grid, tz=dt_timezone.utc)
+    cells = []
+    while cell < end:
+        cells.append(cell)
+        cell += SLOT_GRID
+    return cells
+
+
+class BookingSlot(models.Model):
+    """
+    Unique (doctor, cell) keys claimed by bookings: an exclusion-constraint
+    emulation that keeps one doctor from being booked twice at once.
+    """
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='slots'
+    )
+    doctor = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    starts_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'starts_at'], name='unique_doctor_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} @ {self.starts_at}"
+
+
+class DoctorNextSlot(models.Model):
+    """
+    Precomputed earliest free appointment slot per doctor.
+    Maintained by bookings.signals on Booking/TimetableEntry writes and
+    by the refresh_next_slots command as time moves past cached slots.
+    """
+    doctor = models.OneToOneField(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='next_slot'
+    )
+    starts_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Start of the earliest free slot; empty if none within the horizon"
+    )
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Doctor next slot'
+        verbose_name_plural = 'Doctor next slots'
+
+    def __str__(self):
+        return f"{self.doctor} next free at {self.starts_at}"
+
+
+class DoctorDailyRevenue(models.Model):
+    """
+    Rollup of bookings and ``Booking.total`` per doctor per clinic-local day.
+    Maintained incrementally by bookings.revenue (via signals and the bulk
+    endpoints) and rebuilt from scratch by rebuild_revenue_rollup.
+    """
+    doctor = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name='daily_revenue'
+    )
+    day = models.DateField(help_text="Booking date in the clinic time zone")
+    bookings_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Doctor daily revenue'
+        verbose_name_plural = 'Doctor daily revenue'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day'], name='unique_doctor_revenue_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'doctor']),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} on {self.day}: {self.revenue} ({self.bookings_count})"
+
+    @classmethod
+    def adjust(cls, changes):
+        """
+        Apply ``{(doctor_id, day): (count_delta, revenue_delta)}``. Missing
+        rows are inserted in one statement that ignores conflicts, then each
+        row gets a single F() UPDATE so concurrent writers never clobber
+        each other.
+        """
+        cls.objects.bulk_create(
+            [cls(doctor_id=doctor_id, day=day) for doctor_id, day in changes],
+            ignore_conflicts=True,
+        )
+        # Sorted so concurrent batches lock rows in the same order
+        for (doctor_id, day), (count_delta, revenue_delta) in sorted(changes.items()):
+            cls.objects.filter(doctor_id=doctor_id, day=day).update(
+                bookings_count=models.F('bookings_count') + count_delta,
+                revenue=models.F('revenue') + revenue_delta,
+            )
+
+
+class SlotHold(models.Model):
+    """
+    Short-lived reservation of a doctor's slot while a patient fills in the
+    booking form. Claiming and confirming touch a single row keyed by token;
+    expired holds are reclaimed on the next claim or by sweep_slot_holds.
+    """
+    token = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    doctor = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name='slot_holds'
+    )
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Slot hold'
+        verbose_name_plural = 'Slot holds'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'starts_at'], name='unique_doctor_hold'),
+        ]
+
+    def __str__(self):
+        return f"Hold {self.token} on {self.doctor_id} at {self.starts_at}"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a request sent with an ``Idempotency-Key`` header,
+    replayed verbatim when the client retries with the same key.
+    """
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Idempotency key'
+        verbose_name_plural = 'Idempotency keys'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class BookingReminder(models.Model):
+    """
+    One reminder of a booking, ``offset_hours`` before its start. The row
+    is inserted before the email goes out and its unique key includes the
+    appointment time, so each reminder is sent at most once while a
+    rescheduled booking gets reminded again for its new time.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (SKIPPED, 'Skipped (no email address)'),
+    ]
+
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='reminders'
+    )
+    offset_hours = models.PositiveSmallIntegerField()
+    scheduled_at = models.DateTimeField(help_text="Appointment time the reminder was for")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    claim_token = models.CharField(max_length=32, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Booking reminder'
+        verbose_name_plural = 'Booking reminders'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['booking', 'offset_hours', 'scheduled_at'], name='unique_booking_reminder'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['claim_token']),
+        ]
+
+    def __str__(self):
+        return f"{self.offset_hours}h reminder for booking {self.booking_id} ({self.status})"
+
+
+class ArchivedBooking(models.Model):
+    """
+    A past booking moved out of the live Booking table by archive_bookings,
+    so the queries and indexes on Booking only cover recent and upcoming
+    appointments. Keeps the booking's id and every column; read-only.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings'
+    )
+    doctor = models.ForeignKey(
+        DoctorProfile,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings'
+    )
+    scheduled_at = models.DateTimeField()
+    duration_minutes = models.PositiveSmallIntegerField()
+    ends_at = models.DateTimeField()
+    notes = models.TextField(blank=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Booking columns copied verbatim on archiving
+    COPIED_FIELDS = [
+        'id', 'patient_id', 'doctor_id', 'scheduled_at', 'duration_minutes', 'ends_at',
+        'notes', 'total', 'created_at', 'updated_at',
+    ]
+
+    class Meta:
+        ordering = ['-scheduled_at']
+        verbose_name = 'Archived booking'
+        verbose_name_plural = 'Archived bookings'
+        indexes = [
+            models.Index(fields=['-scheduled_at', 'id']),
+            models.Index(fields=['doctor', 'scheduled_at']),
+            models.Index(fields=['patient', 'scheduled_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived booking: {self.patient_id} with {self.doctor_id} at {self.scheduled_at}"
+
+    @classmethod
+    def from_booking(cls, booking):
+        return cls(**{name: getattr(booking, name) for name in cls.COPIED_FIELDS})
+
+
+class AuditEntry(models.Model):
+    """
+    One create, update or delete of a Booking or Patient: who made it, when,
+    and the audited fields it changed as ``{field: [old, new]}``. Rows are
+    only ever inserted (see bookings.audit).
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    ]
+
+    # Model name of the audited object ("booking", "patient")
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = 'Audit entry'
+        verbose_name_plural = 'Audit entries'
+        indexes = [
+            # An object's trail, newest first
+            models.Index(fields=['model', 'object_id', '-created_at', '-id']),
+        ]
 
     def __str__(self):
-        return f"Booking: {self.patient} with {self.doctor} at {self.scheduled_at}"
\ No newline at end of file
+        return f"{self.model} {self.object_id} {self.action} at {self.created_at}"
@@ -0,0 +1,16 @@
+from core.pagination import KeysetPagination
+
+
+class BookingPagination(KeysetPagination):
+    # Served by the (-scheduled_at, id) index on Booking
+    ordering = ('-scheduled_at', 'id')
+
+
+class PatientPagination(KeysetPagination):
+    # Served by the (last_name, first_name, id) index on Patient
+    ordering = ('last_name', 'first_name', 'id')
+
+
+class AuditPagination(KeysetPagination):
+    # Served by the (model, object_id, -created_at, -id) index on AuditEntry
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,135 @@
+"""
+Appointment reminder emails.
+
+Each offset in REMINDER_OFFSETS_HOURS owns a window of upcoming
+appointments: the 2h reminder covers ``(now, now + 2h]``, the 24h one
+``(now + 2h, now + 24h]``, so a booking made late only gets the reminders
+still relevant to it. Windows are walked in ``(scheduled_at, id)`` order
+(the ``scheduled_at`` index) in keyset batches, skipping bookings already
+reminded for their current time with an indexed NOT EXISTS.
+
+Per batch: one SELECT of bookings with patient and doctor names, one bulk
+INSERT claiming them as pending reminders, one SELECT of what this run
+actually claimed (another run may have won some rows), one
+``send_messages()`` call on the email backend and one UPDATE marking
+them sent. The claim makes a reminder go out at most once; if delivery
+fails the batch's claims are dropped so the next run retries them.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .availability import clinic_timezone
+from .models import Booking, BookingReminder
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+FIELDS = (
+    'id', 'scheduled_at', 'patient__email', 'patient__first_name',
+    'doctor__user__first_name', 'doctor__user__last_name',
+)
+
+
+def reminder_windows(now, offsets=None):
+    """Yield ``(offset_hours, start, end)``, nearest offset first."""
+    lower = 0
+    for hours in sorted(set(offsets or settings.REMINDER_OFFSETS_HOURS)):
+        yield hours, now + timedelta(hours=lower), now + timedelta(hours=hours)
+        lower = hours
+
+
+def due_batches(offset_hours, start, end, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of ``FIELDS`` rows for bookings in ``(start, end]`` not yet reminded."""
+    reminded = BookingReminder.objects.filter(
+        booking=OuterRef('pk'), offset_hours=offset_hours, scheduled_at=OuterRef('scheduled_at'),
+    )
+    bookings = (
+        Booking.objects.filter(scheduled_at__gt=start, scheduled_at__lte=end)
+        .exclude(Exists(reminded))
+        .order_by('scheduled_at', 'id')
+        .values_list(*FIELDS)
+    )
+    last = None
+    while True:
+        page = bookings
+        if last is not None:
+            page = page.filter(Q(scheduled_at__gt=last[1]) | Q(scheduled_at=last[1], id__gt=last[0]))
+        rows = list(page[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+def build_message(offset_hours, row):
+    _, scheduled_at, email, first_name, doctor_first_name, doctor_last_name = row
+    local = scheduled_at.astimezone(clinic_timezone())
+    doctor = f"{doctor_first_name} {doctor_last_name}".strip()
+    when = f"{local:%d.%m.%Y} at {local:%H:%M}"
+    return EmailMessage(
+        subject=f"Reminder: your appointment on {when}",
+        body=(
+            f"Dear {first_name},\n\n"
+            f"This is a reminder of your appointment with Dr. {doctor} on {when} "
+            f"(in about {offset_hours} hour{'s' if offset_hours != 1 else ''}).\n\n"
+            "If you cannot attend, please let the clinic know."
+        ),
+        to=[email],
+    )
+
+
+def claim(offset_hours, rows):
+    """Insert pending reminders for ``rows``; returns the booking ids this call claimed and its token."""
+    token = uuid.uuid4().hex
+    BookingReminder.objects.bulk_create(
+        [
+            BookingReminder(
+                booking_id=row[0],
+                offset_hours=offset_hours,
+                scheduled_at=row[1],
+                claim_token=token,
+                status=BookingReminder.PENDING if row[2] else BookingReminder.SKIPPED,
+            )
+            for row in rows
+        ],
+        ignore_conflicts=True,
+    )
+    claimed = set(BookingReminder.objects.filter(claim_token=token).values_list('booking_id', flat=True))
+    return claimed, token
+
+
+def send_due_reminders(now=None, offsets=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Send every reminder that is due. Returns ``{offset_hours: {'sent': n,
+    'skipped': n, 'failed': n}}``; stops at the first failed delivery.
+    """
+    now = now or timezone.now()
+    stats = {}
+    # Opened by the backend on demand, once per batch
+    connection = get_connection()
+    for offset_hours, start, end in reminder_windows(now, offsets):
+        counts = stats.setdefault(offset_hours, {'sent': 0, 'skipped': 0, 'failed': 0})
+        for rows in due_batches(offset_hours, start, end, batch_size):
+            claimed, token = claim(offset_hours, rows)
+            messages = [build_message(offset_hours, row) for row in rows if row[0] in claimed and row[2]]
+            counts['skipped'] += len(claimed) - len(messages)
+            if not messages:
+                continue
+            pending = BookingReminder.objects.filter(claim_token=token, status=BookingReminder.PENDING)
+            try:
+                connection.send_messages(messages)
+            except Exception:
+                logger.exception("Sending %s reminder(s) failed", len(messages))
+                pending.delete()
+                counts['failed'] += len(messages)
+                return stats
+            pending.update(status=BookingReminder.SENT, sent_at=timezone.now())
+            counts['sent'] += len(messages)
+    return stats
@@ -0,0 +1,75 @@
+"""
+Patient typeahead.
+
+Patients carry normalized search keys (see Patient.update_search_keys),
+each with its own index. Every lookup below is an index range scan that
+stops after ``limit`` rows, so the cost does not grow with the table.
+"""
+from datetime import date, datetime
+
+from .models import Patient, normalize_search_text
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Upper bound for "starts with" range scans: sorts after any continuation
+_PREFIX_END = '\U0010ffff'
+
+_DATE_FORMATS = ('%d.%m.%Y', '%d/%m/%Y')
+
+
+def prefix_filter(field, prefix):
+    """``field`` starts with ``prefix``, as a range every backend serves from a B-tree index."""
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + _PREFIX_END}
+
+
+def parse_birth_date(token):
+    try:
+        return date.fromisoformat(token)
+    except ValueError:
+        pass
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(token, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def typeahead(query, limit=DEFAULT_LIMIT, queryset=None):
+    """
+    Up to ``limit`` patients matching ``query``: name prefixes in either
+    order ("doe jo", "john d"), an email prefix, and/or a date of birth
+    (ISO or dd.mm.yyyy). Last-name matches come first, then first-name,
+    then email matches.
+    """
+    queryset = Patient.objects.all() if queryset is None else queryset
+    terms = []
+    for token in query.split():
+        birth_date = parse_birth_date(token)
+        if birth_date is not None:
+            queryset = queryset.filter(date_of_birth=birth_date)
+        else:
+            terms.append(token)
+
+    lookups = []
+    name = normalize_search_text(' '.join(terms))
+    if name:
+        lookups += [('name_key', name), ('name_key_reversed', name)]
+    if len(terms) == 1:
+        email = ('email_key', terms[0].lower())
+        lookups.insert(0 if '@' in terms[0] else len(lookups), email)
+    if not lookups:
+        if terms or not query.strip():
+            # Nothing searchable
+            return []
+        # Only a date of birth was given
+        return list(queryset.order_by('name_key', 'id')[:limit])
+
+    matches = {}
+    for field, prefix in lookups:
+        for patient in queryset.filter(**prefix_filter(field, prefix)).order_by(field, 'id')[:limit]:
+            matches.setdefault(patient.pk, patient)
+        if len(matches) >= limit:
+            break
+    return list(matches.values())[:limit]
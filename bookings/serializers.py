@@ -1,15 +1,173 @@
-from rest_framework import serializers
-from .models import Patient, Booking
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from rest_framework import serializers, exceptions, status
+from profiles.models import DoctorProfile
+from . import search
+from .export import FORMATS as EXPORT_FORMATS
+from .models import Patient, Booking, ArchivedBooking, AuditEntry, BookingSlot, SlotHold, SlotUnavailable, slot_cells, default_duration
+
+
+class SlotConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The doctor already has a booking at this time.'
+    default_code = 'slot_unavailable'
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves pks from ``context['prefetched'][field_name]`` when present, so
+    a batch of items costs one query per related field instead of one per item.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
 
 class PatientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
         fields = ['id', 'first_name', 'last_name', 'date_of_birth', 'email', 'created_at', 'updated_at']
 
+
+class PatientBulkSerializer(PatientSerializer):
+    """Batch item serializer; email uniqueness is checked once per batch by the view."""
+    class Meta(PatientSerializer.Meta):
+        extra_kwargs = {'email': {'validators': []}}
+
+
+class PatientLookupSerializer(serializers.ModelSerializer):
+    """Compact row for the typeahead endpoint."""
+    class Meta:
+        model = Patient
+        fields = ['id', 'first_name', 'last_name', 'date_of_birth', 'email']
+
+
+class PatientSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=search.MAX_LIMIT, default=search.DEFAULT_LIMIT)
+
+
+class PatientMergeSerializer(serializers.Serializer):
+    duplicates = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=100
+    )
+
+
+class PatientHistoryBookingSerializer(serializers.ModelSerializer):
+    """Booking row of a patient's history; expects ``select_related('doctor__user')``."""
+    doctor_name = serializers.SerializerMethodField()
+    doctor_specialty = serializers.CharField(source='doctor.main_specialty')
+
+    class Meta:
+        model = Booking
+        fields = [
+            'id', 'scheduled_at', 'ends_at', 'duration_minutes', 'notes', 'total',
+            'doctor', 'doctor_name', 'doctor_specialty',
+        ]
+
+    def get_doctor_name(self, obj):
+        user = obj.doctor.user
+        return user.get_full_name() or user.username
+
+
 class BookingSerializer(serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
     class Meta:
         model = Booking
-        fields = ['id', 'patient', 'doctor', 'scheduled_at', 'notes', 'created_at', 'updated_at','total']
+        fields = ['id', 'patient', 'doctor', 'scheduled_at', 'duration_minutes', 'ends_at', 'notes', 'created_at', 'updated_at','total', 'version']
+        read_only_fields = ['ends_at', 'version']
+
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except SlotUnavailable:
+            raise SlotConflict()
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except SlotUnavailable:
+            raise SlotConflict()
+
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedBooking
+        fields = [
+            'id', 'patient', 'doctor', 'scheduled_at', 'duration_minutes', 'ends_at', 'notes',
+            'created_at', 'updated_at', 'total', 'archived_at',
+        ]
+        read_only_fields = fields
+
+
+class AuditEntrySerializer(serializers.ModelSerializer):
+    """Audit trail row; expects ``select_related('actor')``."""
+    actor_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AuditEntry
+        fields = ['id', 'action', 'changes', 'actor', 'actor_name', 'created_at']
+
+    def get_actor_name(self, obj):
+        if obj.actor is None:
+            return None
+        return obj.actor.get_full_name() or obj.actor.username
+
+
+class BookingCalendarSerializer(serializers.ModelSerializer):
+    """Compact booking row for calendar views."""
+    patient_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'doctor', 'scheduled_at', 'ends_at', 'patient', 'patient_name']
+
+    def get_patient_name(self, obj):
+        initial = f"{obj.patient.first_name[:1]}. " if obj.patient.first_name else ''
+        return f"{initial}{obj.patient.last_name}"
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    """Both bounds are required so a calendar request is always one bounded range scan."""
+    MAX_DAYS = 31
+
+    # "from" is a keyword, so it cannot be declared as a plain attribute
+    locals()['from'] = serializers.DateTimeField()
+    to = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['to'] <= attrs['from']:
+            raise serializers.ValidationError({'to': 'Must be after from.'})
+        if attrs['to'] - attrs['from'] > timedelta(days=self.MAX_DAYS):
+            raise serializers.ValidationError({'to': f'Range is limited to {self.MAX_DAYS} days.'})
+        return attrs
+
+
+class BookingEventsQuerySerializer(serializers.Serializer):
+    """Filters of the booking change feed; ``date`` is a clinic-local day."""
+    doctor = serializers.IntegerField(required=False, min_value=1)
+    date = serializers.DateField(required=False)
+    # For clients that cannot send the Last-Event-ID header
+    last_event_id = serializers.CharField(required=False)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
 
 
 class PublicBookingSerializer(serializers.ModelSerializer):
@@ -17,21 +175,196 @@ class PublicBookingSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Booking
-        fields = ['id', 'patient', 'doctor', 'scheduled_at', 'notes', 'total', 'created_at', 'updated_at']
-        
+        fields = ['id', 'patient', 'doctor', 'scheduled_at', 'duration_minutes', 'ends_at', 'notes', 'total', 'created_at', 'updated_at']
+        # Anonymous bookings always take one APPOINTMENT_SLOT_MINUTES slot
+        read_only_fields = ['duration_minutes', 'ends_at']
+
+    def validate(self, attrs):
+        # Slots held by someone else are off limits; the holder's own hold
+        # is passed in the context by the confirm endpoint
+        start = attrs['scheduled_at']
+        end = start + timedelta(minutes=default_duration())
+        held = SlotHold.objects.filter(
+            doctor=attrs['doctor'],
+            starts_at__lt=end,
+            ends_at__gt=start,
+            expires_at__gt=timezone.now(),
+        )
+        hold = self.context.get('hold')
+        if hold is not None:
+            held = held.exclude(pk=hold.pk)
+        if held.exists():
+            raise SlotConflict('This slot is currently held by another patient.')
+        return attrs
+
     def create(self, validated_data):
         patient_data = validated_data.pop('patient')
-        
-        # Create or get patient
-        patient, created = Patient.objects.get_or_create(
-            email=patient_data.get('email'),
-            defaults={
-                'first_name': patient_data.get('first_name'),
-                'last_name': patient_data.get('last_name'),
-                'date_of_birth': patient_data.get('date_of_birth', '1990-01-01'),
-            }
-        )
-        
-        # Create booking with patient
-        booking = Booking.objects.create(patient=patient, **validated_data)
-        return booking
\ No newline at end of file
+
+        try:
+            # A taken slot rolls back the patient row created for it as well
+            with transaction.atomic():
+                # Create or get patient
+                patient, created = Patient.objects.get_or_create(
+                    email=patient_data.get('email'),
+                    defaults={
+                        'first_name': patient_data.get('first_name'),
+                        'last_name': patient_data.get('last_name'),
+                        'date_of_birth': patient_data.get('date_of_birth', '1990-01-01'),
+                    }
+                )
+
+                # Create booking with patient
+                booking = Booking.objects.create(patient=patient, **validated_data)
+        except SlotUnavailable:
+            raise SlotConflict()
+        return booking
+
+
+class SlotHoldSerializer(serializers.ModelSerializer):
+    """
+    Claim a slot for SLOT_HOLD_MINUTES. A claim is rejected while a live
+    hold of the doctor overlaps it; holds on the same start are also caught
+    by the (doctor, starts_at) unique constraint.
+    """
+    doctor = serializers.PrimaryKeyRelatedField(queryset=DoctorProfile.objects.filter(is_active=True))
+
+    class Meta:
+        model = SlotHold
+        fields = ['token', 'doctor', 'starts_at', 'ends_at', 'expires_at']
+        read_only_fields = ['token', 'ends_at', 'expires_at']
+        # Uniqueness is enforced by the insert itself (409), which also lets
+        # create() reclaim an expired hold on the same slot first
+        validators = []
+
+    def validate_starts_at(self, value):
+        if value <= timezone.now():
+            raise serializers.ValidationError('Slot has already started.')
+        return value
+
+    def create(self, validated_data):
+        doctor = validated_data['doctor']
+        start = validated_data['starts_at']
+        end = start + timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+        now = timezone.now()
+        overlapping = SlotHold.objects.filter(doctor=doctor, starts_at__lt=end, ends_at__gt=start)
+        with transaction.atomic():
+            # Reclaim expired holds on this slot instead of waiting for the
+            # sweeper (the write also serializes concurrent claims on SQLite)
+            overlapping.filter(expires_at__lte=now).delete()
+            if BookingSlot.objects.filter(doctor=doctor, starts_at__in=slot_cells(start, end)).exists():
+                raise SlotConflict()
+            # The unique key only catches the same start; a live hold on an
+            # overlapping slot would make both confirmations fail
+            if overlapping.filter(expires_at__gt=now).exists():
+                raise SlotConflict('This slot is currently held by another patient.')
+            try:
+                with transaction.atomic():
+                    return SlotHold.objects.create(
+                        doctor=doctor,
+                        starts_at=start,
+                        ends_at=end,
+                        expires_at=now + timedelta(minutes=settings.SLOT_HOLD_MINUTES),
+                    )
+            except IntegrityError:
+                raise SlotConflict('This slot is currently held by another patient.')
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """
+    Query parameters for the availability endpoint. ``start``/``end`` are
+    inclusive clinic-local dates; ``tz`` only changes how slots are rendered.
+    """
+    MAX_DAYS = 62
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    tz = serializers.CharField(required=False)
+
+    def validate_tz(self, value):
+        try:
+            return ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError('Unknown time zone.')
+
+    def validate(self, attrs):
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': 'Must not be before start.'})
+        if (attrs['end'] - attrs['start']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'end': f'Range is limited to {self.MAX_DAYS} days.'})
+        return attrs
+
+
+class RevenueReportQuerySerializer(serializers.Serializer):
+    """
+    ``start``/``end`` are inclusive clinic-local dates; by default the
+    report covers the current month and the eleven before it.
+    """
+    MAX_DAILY_DAYS = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    period = serializers.ChoiceField(choices=['day', 'month', 'year'], default='month')
+    doctor = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.now().astimezone(ZoneInfo(settings.CLINIC_TIME_ZONE)).date()
+        start = attrs.get('start')
+        if start is None:
+            months = end.year * 12 + end.month - 1 - 11
+            start = end.replace(year=months // 12, month=months % 12 + 1, day=1)
+        if end < start:
+            raise serializers.ValidationError({'end': 'Must not be before start.'})
+        if attrs['period'] == 'day' and (end - start).days >= self.MAX_DAILY_DAYS:
+            raise serializers.ValidationError(
+                {'end': f'Daily reports are limited to {self.MAX_DAILY_DAYS} days.'}
+            )
+        attrs.update(start=start, end=end)
+        return attrs
+
+
+class RevenueRowSerializer(serializers.Serializer):
+    doctor = serializers.IntegerField(source='doctor_id')
+    doctor_name = serializers.SerializerMethodField()
+    period = serializers.DateField()
+    bookings = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    def get_doctor_name(self, row):
+        return f"{row['doctor__user__first_name']} {row['doctor__user__last_name']}".strip()
+
+
+class NextAvailableQuerySerializer(serializers.Serializer):
+    TIEBREAKERS = {
+        'rating': '-rating_average',
+        'experience': '-years_of_experience',
+    }
+
+    specialty = serializers.CharField()
+    tiebreak = serializers.CharField(required=False, default='rating,experience')
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=50)
+
+    def validate_tiebreak(self, value):
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.TIEBREAKERS]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown tie-breaker(s): {', '.join(unknown)}. Use {', '.join(self.TIEBREAKERS)}."
+            )
+        return [self.TIEBREAKERS[name] for name in names]
+
+
+class NextAvailableDoctorSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField()
+    average_rating = serializers.FloatField(read_only=True)
+    next_available_at = serializers.DateTimeField(source='next_slot.starts_at')
+
+    class Meta:
+        model = DoctorProfile
+        fields = [
+            'id',
+            'user',
+            'main_specialty',
+            'years_of_experience',
+            'average_rating',
+            'next_available_at',
+        ]
@@ -0,0 +1,174 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from profiles.models import DoctorProfile, TimetableEntry
+from .models import AuditEntry, Booking, Patient
+from . import audit
+from . import cache as history_cache
+from . import events
+from .archive import is_archiving
+from .availability import queue_next_slot_refresh
+from .revenue import RevenueDelta
+
+
+_bulk = threading.local()
+
+
+def is_bulk_deleting():
+    return getattr(_bulk, 'active', False)
+
+
+@contextmanager
+def bulk_deleting():
+    """
+    Skip the per-row Booking delete receivers inside the block, for bulk
+    deletes that apply the rollup, cache, feed and audit changes themselves.
+    """
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = False
+
+
+def _handled_elsewhere(sender, origin):
+    """True when a Booking delete's side effects are applied by the caller."""
+    if origin is not None and _cascaded_from_doctor(origin):
+        return True
+    return is_archiving() or (sender is Booking and is_bulk_deleting())
+
+
+def _cascaded_from_doctor(origin):
+    """True when a delete was triggered by removing the doctor (or their user) itself."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, (DoctorProfile, get_user_model()))
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_booking(sender, instance, **kwargs):
+    """
+    Snapshot the stored row so post_save can apply deltas: the audited
+    fields, and doctor/time/total/patient/duration for the other receivers.
+    """
+    instance._previous_values = instance._previous_booking = None
+    if instance.pk and not instance._state.adding:
+        previous = instance._previous_values = audit.stored_snapshot(sender, instance.pk)
+        if previous is not None:
+            instance._previous_booking = (
+                previous['doctor'], previous['scheduled_at'], previous['total'], previous['patient'],
+                previous['duration_minutes'],
+            )
+
+
+@receiver(pre_save, sender=Patient)
+def remember_previous_patient(sender, instance, **kwargs):
+    instance._previous_values = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_values = audit.stored_snapshot(sender, instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+def refresh_booking_doctor_slot(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_booking', None)
+    if not created and previous:
+        doctor_id, scheduled_at, _, _, duration_minutes = previous
+        # Notes, price or patient changes do not move the doctor's free slots
+        if (doctor_id, scheduled_at, duration_minutes) == (
+            instance.doctor_id, instance.scheduled_at, instance.duration_minutes
+        ):
+            return
+        if doctor_id != instance.doctor_id:
+            queue_next_slot_refresh(doctor_id)
+    queue_next_slot_refresh(instance.doctor_id)
+
+
+@receiver(post_save, sender=Booking)
+def apply_booking_revenue(sender, instance, **kwargs):
+    delta = RevenueDelta()
+    previous = getattr(instance, '_previous_booking', None)
+    if previous:
+        delta.remove(*previous[:3])
+    delta.add(instance.doctor_id, instance.scheduled_at, instance.total)
+    delta.apply()
+
+
+@receiver(post_save, sender=TimetableEntry)
+def refresh_timetable_doctor_slot(sender, instance, **kwargs):
+    queue_next_slot_refresh(instance.doctor_id)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=TimetableEntry)
+def refresh_doctor_slot_on_delete(sender, instance, origin=None, **kwargs):
+    if _handled_elsewhere(sender, origin):
+        return
+    queue_next_slot_refresh(instance.doctor_id)
+
+
+@receiver(post_delete, sender=Booking)
+def revert_booking_revenue(sender, instance, origin=None, **kwargs):
+    # The doctor's rollup rows are deleted by the same cascade; archived
+    # bookings keep counting
+    if _handled_elsewhere(sender, origin):
+        return
+    delta = RevenueDelta()
+    delta.remove(instance.doctor_id, instance.scheduled_at, instance.total)
+    delta.apply()
+
+
+# Patient history cache
+
+@receiver(post_save, sender=Booking)
+def invalidate_booking_patient_history(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_booking', None)
+    history_cache.invalidate(instance.patient_id, previous[3] if previous else None)
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_deleted_booking_patient_history(sender, instance, **kwargs):
+    # Archiving and bulk deletes invalidate once per batch
+    if not is_archiving() and not is_bulk_deleting():
+        history_cache.invalidate(instance.patient_id)
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_history(sender, instance, **kwargs):
+    history_cache.invalidate(instance.pk)
+
+
+# Booking change feed
+
+@receiver(post_save, sender=Booking)
+def publish_booking_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_booking', None)
+    kind = events.CREATED if created else events.UPDATED
+    events.publish(events.booking_event(kind, instance, previous[:2] if previous else None))
+
+
+@receiver(post_delete, sender=Booking)
+def publish_booking_deleted(sender, instance, **kwargs):
+    if not is_archiving() and not is_bulk_deleting():
+        events.publish(events.booking_event(events.DELETED, instance))
+
+
+# Audit trail
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Patient)
+def audit_saved(sender, instance, created, **kwargs):
+    action = AuditEntry.CREATED if created else AuditEntry.UPDATED
+    audit.record(action, instance, getattr(instance, '_previous_values', None), audit.snapshot(instance))
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Patient)
+def audit_deleted(sender, instance, **kwargs):
+    # Archiving moves bookings, it does not delete them; bulk deletes record their own
+    if not is_archiving() and not (sender is Booking and is_bulk_deleting()):
+        audit.record(AuditEntry.DELETED, instance, audit.snapshot(instance))
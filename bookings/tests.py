@@ -1,14 +1,40 @@
-from django.test import TestCase
+from django.test import TestCase, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Sum
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from datetime import timedelta
+from io import StringIO
+import csv
+import json
+from base64 import urlsafe_b64encode
+from django.core.management import call_command, CommandError
+from django.core import mail
+from unittest import mock
+from smtplib import SMTPException
+from datetime import timedelta, datetime, date, time
+from zoneinfo import ZoneInfo
+from asgiref.sync import async_to_sync
 
-from .models import Patient, Booking
-from profiles.models import DoctorProfile, Specialty
+from .models import (
+    Patient, Booking, ArchivedBooking, AuditEntry, BookingReminder, BookingSlot, DoctorDailyRevenue, DoctorNextSlot, SlotHold, SlotUnavailable, IdempotencyKey, slot_cells,
+)
+from .availability import merge_intervals, subtract_busy, doctor_availability
+from .search import prefix_filter
+from .dedupe import duplicate_groups, merge_patients
+from .reminders import send_due_reminders
+from .archive import archive_bookings
+from .views import BookingViewSet
+from . import revenue
+from . import events
+from profiles.models import DoctorProfile, Specialty, TimetableEntry
+from core.models import Job, VersionConflict
 
 User = get_user_model()
 
@@ -153,8 +179,8 @@ class BookingAPITest(APITestCase):
         url = reverse('booking-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['id'], self.booking.id)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['id'], self.booking.id)
 
     def test_doctor_cannot_view_other_doctor_bookings(self):
         # Create another doctor and booking
@@ -179,14 +205,14 @@ class BookingAPITest(APITestCase):
         url = reverse('booking-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Only own booking
+        self.assertEqual(len(response.data['results']), 1)  # Only own booking
 
     def test_receptionist_can_view_all_bookings(self):
         self.client.force_authenticate(user=self.receptionist_user)
         url = reverse('booking-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_booking_authenticated(self):
         self.client.force_authenticate(user=self.receptionist_user)
@@ -286,6 +312,37 @@ class PublicBookingAPITest(APITestCase):
         self.assertEqual(Patient.objects.count(), 1)  # No new patient created
         self.assertEqual(Booking.objects.count(), 1)
 
+    def test_public_booking_cannot_pick_duration(self):
+        response = self.client.post(reverse('public_booking_create'), {
+            'doctor': self.doctor_profile.id,
+            'scheduled_at': (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0).isoformat(),
+            'duration_minutes': 32000,
+            'patient': {
+                'first_name': 'Alice', 'last_name': 'Johnson',
+                'email': 'alice.johnson@example.com', 'date_of_birth': '1990-05-15'
+            }
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['duration_minutes'], 30)
+        self.assertEqual(BookingSlot.objects.count(), 6)
+
+    def test_staff_duration_is_bounded(self):
+        self.client.force_authenticate(user=User.objects.create_user(
+            username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST
+        ))
+        patient = Patient.objects.create(
+            first_name='Bob', last_name='Smith', date_of_birth='1980-01-01', email='bob@example.com'
+        )
+        response = self.client.post(reverse('booking-list'), {
+            'patient': patient.id,
+            'doctor': self.doctor_profile.id,
+            'scheduled_at': (timezone.now() + timedelta(days=1)).isoformat(),
+            'duration_minutes': 32000,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('duration_minutes', response.data)
+        self.assertFalse(Booking.objects.exists())
+
     def test_public_booking_missing_patient_data(self):
         url = reverse('public_booking_create')
         data = {
@@ -324,7 +381,7 @@ class PatientAPITest(APITestCase):
         url = reverse('patient-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_patient(self):
         self.client.force_authenticate(user=self.user)
@@ -337,4 +394,2228 @@ class PatientAPITest(APITestCase):
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Patient.objects.count(), 2)
\ No newline at end of file
+        self.assertEqual(Patient.objects.count(), 2)
+
+
+class PatientSearchTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('patient-search')
+        people = [
+            ('John', 'Doe', '1990-01-01', 'john.doe@example.com'),
+            ('Jane', 'Doe', '1985-03-12', 'jane@example.com'),
+            ('Zoë', "O'Néil", '1990-01-01', 'zoe@clinic.uz'),
+            ('Doeke', 'Smith', '1970-07-07', 'ds@example.com'),
+        ]
+        self.patients = {
+            first: Patient.objects.create(
+                first_name=first, last_name=last, date_of_birth=dob, email=email
+            )
+            for first, last, dob, email in people
+        }
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['first_name'] for row in response.data]
+
+    def test_keys_are_normalized_on_save(self):
+        zoe = self.patients['Zoë']
+        self.assertEqual(zoe.name_key, 'o neil zoe')
+        self.assertEqual(zoe.name_key_reversed, 'zoe o neil')
+        zoe.email = 'Zoe@Clinic.UZ'
+        zoe.save(update_fields=['email'])
+        zoe.refresh_from_db()
+        self.assertEqual(zoe.email_key, 'zoe@clinic.uz')
+
+    def test_name_prefix_in_either_order(self):
+        # Last-name matches first, then first-name matches
+        self.assertEqual(self.names(q='doe'), ['Jane', 'John', 'Doeke'])
+        self.assertEqual(self.names(q='Doe Jo'), ['John'])
+        self.assertEqual(self.names(q='john d'), ['John'])
+        self.assertEqual(self.names(q='zoe o ne'), ['Zoë'])
+        self.assertEqual(self.names(q='ONEIL'), [])
+        self.assertEqual(self.names(q="o'n"), ['Zoë'])
+
+    def test_email_prefix(self):
+        self.assertEqual(self.names(q='JOHN.DOE@'), ['John'])
+        self.assertEqual(self.names(q='ds@ex'), ['Doeke'])
+
+    def test_date_of_birth(self):
+        self.assertEqual(self.names(q='1990-01-01'), ['John', 'Zoë'])
+        self.assertEqual(self.names(q='01.01.1990 doe'), ['John'])
+
+    def test_limit_and_validation(self):
+        self.assertEqual(len(self.names(q='d', limit=2)), 2)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.get(self.url, {'q': 'doe', 'limit': 500}).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_bulk_writes_maintain_keys(self):
+        response = self.client.post(reverse('patient-bulk'), [{
+            'first_name': 'Ali', 'last_name': 'Karimov',
+            'date_of_birth': '1999-09-09', 'email': 'ali@example.com',
+        }], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.names(q='karim'), ['Ali'])
+        response = self.client.patch(reverse('patient-bulk'), [
+            {'id': response.data[0]['id'], 'last_name': 'Rahimov'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.names(q='karim'), [])
+        self.assertEqual(self.names(q='rahim'), ['Ali'])
+
+    def test_lookups_use_the_key_indexes(self):
+        for field in Patient.SEARCH_KEY_FIELDS:
+            plan = Patient.objects.filter(**prefix_filter(field, 'doe')).order_by(field, 'id')[:10].explain()
+            self.assertIn('INDEX', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class DuplicatePatientTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        people = [
+            ('John', 'Doe', '1990-01-01', 'john@example.com'),
+            ('JOHN', 'Doé', '1990-01-01', 'jd@work.com'),
+            ('Doe', 'John', '1990-01-01', 'doe.john@example.com'),
+            ('John', 'Doe', '1991-01-01', 'other.john@example.com'),
+            ('Jane', 'Doe', '1990-01-01', 'jane@example.com'),
+        ]
+        self.patients = [
+            Patient.objects.create(first_name=first, last_name=last, date_of_birth=dob, email=email)
+            for first, last, dob, email in people
+        ]
+        start = timezone.now() + timedelta(days=1)
+        self.bookings = [
+            Booking.objects.create(
+                patient=patient, doctor=self.doctor, scheduled_at=start + timedelta(hours=i)
+            )
+            for i, patient in enumerate(self.patients[:3])
+        ]
+
+    def test_groups_by_birth_date_and_name(self):
+        self.assertEqual(
+            list(duplicate_groups(chunk_size=2)), [[p.id for p in self.patients[:3]]]
+        )
+
+    def test_merge_moves_bookings(self):
+        survivor, *duplicates = self.patients[:3]
+        moved = merge_patients(survivor.id, [d.id for d in duplicates])
+        self.assertEqual(moved, 2)
+        self.assertEqual(
+            set(survivor.bookings.values_list('id', flat=True)), {b.id for b in self.bookings}
+        )
+        self.assertFalse(Patient.objects.filter(pk__in=[d.id for d in duplicates]).exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('find_duplicate_patients', stdout=out)
+        self.assertIn('Found 1 group(s)', out.getvalue())
+        self.assertEqual(Patient.objects.count(), 5)
+
+        out = StringIO()
+        call_command('find_duplicate_patients', '--merge', stdout=out)
+        self.assertIn('Merged 2 duplicate(s) in 1 group(s); moved 2 booking(s)', out.getvalue())
+        self.assertEqual(Patient.objects.count(), 3)
+        self.assertEqual(self.patients[0].bookings.count(), 3)
+
+    def test_merge_endpoint(self):
+        survivor = self.patients[0]
+        url = reverse('patient-merge', args=[survivor.id])
+        response = self.client.post(url, {'duplicates': [self.patients[1].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['moved_bookings'], 1)
+        self.assertEqual(response.data['merged'], [self.patients[1].id])
+        self.assertEqual(survivor.bookings.count(), 2)
+
+    def test_merge_endpoint_validation(self):
+        url = reverse('patient-merge', args=[self.patients[0].id])
+        response = self.client.post(url, {'duplicates': [self.patients[0].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'duplicates': [self.patients[1].id, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Patient.objects.count(), 5)
+
+
+class PatientHistoryTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR,
+                    first_name='Greg', last_name=f'House{i}'
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.other = Patient.objects.create(
+            first_name='Jane', last_name='Doe',
+            date_of_birth='1990-01-01', email='jane@example.com'
+        )
+        start = timezone.now().replace(microsecond=0)
+        self.bookings = [
+            Booking.objects.create(
+                patient=self.patient, doctor=self.doctors[i % 2],
+                scheduled_at=start + timedelta(days=i), total=Decimal('10.00')
+            )
+            for i in range(5)
+        ]
+        Booking.objects.create(patient=self.other, doctor=self.doctors[0], scheduled_at=start - timedelta(days=1))
+        self.url = reverse('patient-history', args=[self.patient.id])
+
+    def test_history_pages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Doctor scope check, patient, one joined page of bookings
+        self.assertEqual(len(queries.captured_queries), 3)
+        self.assertEqual(response.data['patient']['email'], 'john@example.com')
+        results = response.data['results']
+        self.assertEqual([r['id'] for r in results], [b.id for b in self.bookings[::-1][:3]])
+        self.assertEqual(results[0]['doctor_name'], 'Greg House0')
+        self.assertEqual(results[0]['doctor_specialty'], 'Cardiology')
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([r['id'] for r in response.data['results']], [b.id for b in self.bookings[1::-1]])
+        self.assertIsNone(response.data['next'])
+
+    def test_cached_until_booking_write(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(len(response.data['results']), 5)
+
+        self.bookings[0].delete()
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 4)
+
+        # Moving a booking to another patient refreshes both histories
+        booking = self.bookings[1]
+        booking.patient = self.other
+        booking.save()
+        self.assertEqual(len(self.client.get(self.url).data['results']), 3)
+        other_url = reverse('patient-history', args=[self.other.id])
+        self.assertEqual(len(self.client.get(other_url).data['results']), 2)
+
+    def test_cache_invalidated_by_bulk_and_doctor_rename(self):
+        self.client.get(self.url)
+        response = self.client.patch(reverse('booking-bulk'), [
+            {'id': self.bookings[0].id, 'notes': 'Bring results'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = self.client.get(self.url).data['results']
+        self.assertEqual(results[-1]['notes'], 'Bring results')
+
+        user = self.doctors[0].user
+        user.last_name = 'Wilson'
+        user.save()
+        results = self.client.get(self.url).data['results']
+        self.assertEqual(results[-1]['doctor_name'], 'Greg Wilson')
+
+    def test_doctor_sees_only_own_bookings(self):
+        self.client.get(self.url)
+        self.client.force_authenticate(user=self.doctors[1].user)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [r['id'] for r in response.data['results']], [self.bookings[3].id, self.bookings[1].id]
+        )
+
+    def test_unknown_patient(self):
+        response = self.client.get(reverse('patient-history', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('patient-history', args=['abc']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookingPaginationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        start = timezone.now().replace(microsecond=0)
+        # Pairs of bookings (one per doctor) share a scheduled_at so pages have to split ties
+        self.bookings = [
+            Booking.objects.create(
+                patient=patient, doctor=doctors[i % 2],
+                scheduled_at=start + timedelta(hours=i // 2)
+            )
+            for i in range(7)
+        ]
+        self.expected = [
+            b.id for b in sorted(self.bookings, key=lambda b: (-b.scheduled_at.timestamp(), b.id))
+        ]
+
+    def test_walk_forward_and_back(self):
+        url = reverse('booking-list')
+        seen = []
+        pages = []
+        while url:
+            response = self.client.get(url, {'page_size': 3} if not pages else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(
+            [row['id'] for row in response.data['results']], self.expected[3:6]
+        )
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in response.data['results']], self.expected[:3]
+        )
+        self.assertIsNone(response.data['previous'])
+
+    def test_page_does_not_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('booking-list'), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('booking-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        for url, position in [
+            (reverse('booking-list'), ['notadate', 1]),
+            (reverse('patient-list'), ['x', 'y', 'abc']),
+        ]:
+            cursor = urlsafe_b64encode(json.dumps({'p': position, 'r': 0}).encode()).decode()
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+    def test_patients_ordered_by_name(self):
+        for first, last in [('Zed', 'Adams'), ('Amy', 'Adams'), ('Bob', 'Young')]:
+            Patient.objects.create(
+                first_name=first, last_name=last,
+                date_of_birth='1990-01-01', email=f'{first}@example.com'
+            )
+        response = self.client.get(reverse('patient-list'), {'page_size': 2})
+        names = [row['first_name'] for row in response.data['results']]
+        self.assertEqual(names, ['Amy', 'Zed'])
+        response = self.client.get(response.data['next'])
+        names = [row['first_name'] for row in response.data['results']]
+        self.assertEqual(names, ['John', 'Bob'])
+        self.assertIsNone(response.data['next'])
+
+
+class BookingCalendarTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patients = [
+            Patient.objects.create(
+                first_name=first, last_name='Doe',
+                date_of_birth='1990-01-01', email=f'{first}@example.com'
+            )
+            for first in ('John', 'Jane')
+        ]
+        self.start = datetime(2030, 1, 7, 9, tzinfo=ZoneInfo('UTC'))
+        # One booking per day for five days, alternating doctor and patient
+        self.bookings = [
+            Booking.objects.create(
+                patient=self.patients[i % 2], doctor=self.doctors[i % 2],
+                scheduled_at=self.start + timedelta(days=i)
+            )
+            for i in range(5)
+        ]
+
+    def params(self, days_from, days_to, **extra):
+        return {
+            'from': (self.start + timedelta(days=days_from)).isoformat(),
+            'to': (self.start + timedelta(days=days_to)).isoformat(),
+            **extra,
+        }
+
+    def test_list_range_filter(self):
+        response = self.client.get(reverse('booking-list'), self.params(1, 3))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = sorted(row['id'] for row in response.data['results'])
+        # ``to`` is exclusive
+        self.assertEqual(ids, [self.bookings[1].id, self.bookings[2].id])
+
+    def test_list_doctor_and_patient_filters(self):
+        response = self.client.get(reverse('booking-list'), {'doctor': self.doctors[0].id})
+        self.assertEqual(
+            {row['id'] for row in response.data['results']},
+            {self.bookings[0].id, self.bookings[2].id, self.bookings[4].id}
+        )
+        response = self.client.get(
+            reverse('booking-list'), self.params(0, 5, patient=self.patients[1].id)
+        )
+        self.assertEqual(
+            {row['id'] for row in response.data['results']},
+            {self.bookings[1].id, self.bookings[3].id}
+        )
+
+    def test_list_rejects_bad_datetime(self):
+        response = self.client.get(reverse('booking-list'), {'from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_calendar(self):
+        response = self.client.get(
+            reverse('booking-calendar'), self.params(0, 7, doctor=self.doctors[0].id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row['id'] for row in response.data],
+            [self.bookings[0].id, self.bookings[2].id, self.bookings[4].id]
+        )
+        row = response.data[0]
+        self.assertEqual(
+            set(row), {'id', 'doctor', 'scheduled_at', 'ends_at', 'patient', 'patient_name'}
+        )
+        self.assertEqual(row['patient_name'], 'J. Doe')
+
+    def test_calendar_requires_bounded_range(self):
+        url = reverse('booking-calendar')
+        response = self.client.get(url, {'from': self.start.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, self.params(3, 1))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, self.params(0, 40))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_calendar_single_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('booking-calendar'), self.params(0, 7))
+        self.assertEqual(len(response.data), 5)
+        # Role lookup for the requesting user plus the calendar query itself
+        self.assertLessEqual(len(queries.captured_queries), 2)
+
+
+
+class BulkPatientTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('patient-bulk')
+        self.existing = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+
+    def patient(self, i, **extra):
+        return {
+            'first_name': f'Walk{i}', 'last_name': 'In',
+            'date_of_birth': '1985-05-05', 'email': f'walkin{i}@example.com', **extra,
+        }
+
+    def test_bulk_create(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, [self.patient(i) for i in range(20)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 20)
+        self.assertTrue(all(row['id'] for row in response.data))
+        self.assertEqual(Patient.objects.count(), 21)
+        self.assertLess(len(queries.captured_queries), 10)
+
+    def test_errors_are_reported_per_item_and_nothing_is_written(self):
+        items = [
+            self.patient(0),
+            self.patient(1, email='john@example.com'),
+            self.patient(2, date_of_birth='not a date'),
+            self.patient(3, email='walkin0@example.com'),
+        ]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('email', response.data[1])
+        self.assertIn('date_of_birth', response.data[2])
+        self.assertIn('email', response.data[3])
+        self.assertEqual(Patient.objects.count(), 1)
+
+    def test_bulk_update(self):
+        other = Patient.objects.create(**self.patient(9))
+        response = self.client.patch(self.url, [
+            {'id': self.existing.id, 'last_name': 'Smith'},
+            {'id': other.id, 'email': 'new@example.com'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.existing.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.existing.last_name, 'Smith')
+        self.assertEqual(other.email, 'new@example.com')
+        self.assertGreater(other.updated_at, other.created_at)
+
+    def test_bulk_update_unknown_id(self):
+        response = self.client.patch(self.url, [
+            {'id': self.existing.id, 'last_name': 'Smith'},
+            {'id': 999999, 'last_name': 'Ghost'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('id', response.data[1])
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.last_name, 'Doe')
+
+    def test_bulk_delete(self):
+        other = Patient.objects.create(**self.patient(9))
+        response = self.client.delete(self.url, [self.existing.id, other.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Patient.objects.exists())
+
+    def test_rejects_non_list_and_oversized_batches(self):
+        response = self.client.post(self.url, self.patient(0), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, [self.patient(i) for i in range(101)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkBookingTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('booking-bulk')
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.start = (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    def booking(self, i, doctor=0, **extra):
+        return {
+            'patient': self.patient.id, 'doctor': self.doctors[doctor].id,
+            'scheduled_at': (self.start + timedelta(minutes=30 * i)).isoformat(),
+            'duration_minutes': 30, **extra,
+        }
+
+    def test_bulk_create_claims_slots(self):
+        items = [self.booking(i, doctor=i % 2) for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Booking.objects.count(), 50)
+        self.assertEqual(BookingSlot.objects.count(), 50 * 6)
+        self.assertTrue(all(row['ends_at'] for row in response.data))
+        # Validation, inserts, rollup and next-slot updates per doctor/day, not per booking
+        self.assertLess(len(queries.captured_queries), 30)
+
+        # Slot keys written by the batch protect against single creates too
+        response = self.client.post(reverse('booking-list'), self.booking(0), format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_overlaps_are_reported_per_item(self):
+        Booking.objects.create(
+            patient=self.patient, doctor=self.doctors[0], scheduled_at=self.start
+        )
+        items = [
+            self.booking(0),               # overlaps the stored booking
+            self.booking(2),
+            self.booking(2, doctor=1),     # other doctor: fine
+            self.booking(2),               # overlaps item 1
+            {**self.booking(4), 'doctor': 999999},    # unknown doctor
+        ]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data[0])
+        self.assertEqual(response.data[1], {})
+        self.assertEqual(response.data[2], {})
+        self.assertIn('non_field_errors', response.data[3])
+        self.assertIn('doctor', response.data[4])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_reschedule_afternoon(self):
+        bookings = [
+            Booking.objects.create(
+                patient=self.patient, doctor=self.doctors[0],
+                scheduled_at=self.start + timedelta(minutes=30 * i), duration_minutes=30
+            )
+            for i in range(10)
+        ]
+        # Shift every booking by one slot: each moves into its neighbour's old slot
+        items = [
+            {'id': b.id, 'scheduled_at': (b.scheduled_at + timedelta(minutes=30)).isoformat()}
+            for b in bookings
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(len(queries.captured_queries), 20)
+        for booking in bookings:
+            old = booking.scheduled_at
+            booking.refresh_from_db()
+            self.assertEqual(booking.scheduled_at, old + timedelta(minutes=30))
+            self.assertEqual(booking.ends_at, booking.scheduled_at + timedelta(minutes=30))
+        self.assertEqual(BookingSlot.objects.count(), 60)
+        self.assertEqual(
+            min(BookingSlot.objects.values_list('starts_at', flat=True)),
+            self.start + timedelta(minutes=30)
+        )
+
+    def test_update_into_taken_slot(self):
+        first, second = [
+            Booking.objects.create(
+                patient=self.patient, doctor=self.doctors[0],
+                scheduled_at=self.start + timedelta(hours=i)
+            )
+            for i in range(2)
+        ]
+        response = self.client.patch(
+            self.url, [{'id': second.id, 'scheduled_at': first.scheduled_at.isoformat()}],
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data[0])
+
+    def test_bulk_delete_frees_slots(self):
+        bookings = [
+            Booking.objects.create(
+                patient=self.patient, doctor=self.doctors[0],
+                scheduled_at=self.start + timedelta(hours=i)
+            )
+            for i in range(3)
+        ]
+        response = self.client.delete(self.url, [b.id for b in bookings], format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(BookingSlot.objects.exists())
+
+    def test_bulk_delete_is_a_handful_of_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, [
+                self.booking(i, doctor=i % 2, total='10.00') for i in range(50)
+            ], format='json')
+        ids = [row['id'] for row in response.data]
+        self.assertEqual(DoctorDailyRevenue.objects.aggregate(total=Sum('revenue'))['total'], Decimal('500.00'))
+        AuditEntry.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.delete(self.url, ids, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        # Lookup, delete cascade and one rollup write per doctor/day, not per booking
+        self.assertLess(len(queries.captured_queries), 20)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(DoctorDailyRevenue.objects.exclude(revenue=0, bookings_count=0).exists())
+        self.assertEqual(AuditEntry.objects.filter(action=AuditEntry.DELETED).count(), 50)
+        self.assertEqual(Job.objects.filter(name='bookings.refresh_next_slot', status=Job.QUEUED).count(), 2)
+
+    def test_doctor_cannot_touch_other_doctors_bookings(self):
+        booking = Booking.objects.create(
+            patient=self.patient, doctor=self.doctors[1], scheduled_at=self.start
+        )
+        self.client.force_authenticate(user=self.doctors[0].user)
+        response = self.client.delete(self.url, [booking.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Booking.objects.filter(pk=booking.pk).exists())
+
+
+
+
+class BookingExportTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR,
+                    first_name='Greg', last_name=f'House{i}'
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.start = datetime(2030, 1, 7, 9, tzinfo=ZoneInfo('UTC'))
+        self.bookings = [
+            Booking.objects.create(
+                patient=self.patient, doctor=self.doctors[i % 2],
+                scheduled_at=self.start + timedelta(days=i), total=Decimal('100.50')
+            )
+            for i in range(6)
+        ]
+
+    def read(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        response = self.client.get(reverse('booking-export'))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0].split(','), [
+            'id', 'scheduled_at', 'ends_at', 'duration_minutes', 'doctor_id', 'doctor_name',
+            'patient_id', 'patient_name', 'total', 'created_at',
+        ])
+        self.assertEqual(len(lines), 7)
+        first = lines[1].split(',')
+        self.assertEqual(first[0], str(self.bookings[0].id))
+        self.assertEqual(first[5], 'Greg House0')
+        self.assertEqual(first[7], 'John Doe')
+        self.assertEqual(first[8], '100.50')
+
+    def test_csv_neutralises_formulas(self):
+        Patient.objects.filter(pk=self.patient.pk).update(first_name='=HYPERLINK("http://x")', last_name='Doe')
+        Patient.objects.create(
+            first_name='-2+3', last_name='', date_of_birth='1990-01-01', email='eve@example.com'
+        )
+        self.bookings[1].patient = Patient.objects.get(email='eve@example.com')
+        self.bookings[1].save()
+        rows = list(csv.reader(self.read(self.client.get(reverse('booking-export'))).splitlines()))
+        self.assertEqual(rows[1][7], '\'=HYPERLINK("http://x") Doe')
+        self.assertEqual(rows[2][7], "'-2+3")
+        self.assertEqual(rows[1][8], '100.50')
+
+        # NDJSON is not opened by spreadsheets and stays verbatim
+        response = self.client.get(reverse('booking-export'), {'type': 'ndjson'})
+        first = json.loads(self.read(response).splitlines()[0])
+        self.assertEqual(first['patient_name'], '=HYPERLINK("http://x") Doe')
+
+    def test_ndjson_with_filters(self):
+        response = self.client.get(reverse('booking-export'), {
+            'type': 'ndjson',
+            'doctor': self.doctors[1].id,
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(days=4)).isoformat(),
+        })
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.bookings[1].id, self.bookings[3].id])
+        self.assertEqual(rows[0]['doctor_name'], 'Greg House1')
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.read(self.client.get(reverse('booking-export')))
+        # Role lookup for the requesting user plus the export query itself
+        self.assertLessEqual(len(queries.captured_queries), 2)
+
+    def test_asgi_streams_an_async_iterator(self):
+        async def fetch():
+            client = AsyncClient()
+            response = await client.get(
+                reverse('booking-export'), {'type': 'csv'},
+                headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+            )
+            # StreamingHttpResponse would buffer a sync iterator in full under ASGI
+            self.assertTrue(response.is_async)
+            return response.status_code, b''.join([chunk async for chunk in response.streaming_content])
+
+        code, body = async_to_sync(fetch)()
+        self.assertEqual(code, status.HTTP_200_OK)
+        lines = body.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[1].split(',')[0], str(self.bookings[0].id))
+
+    def test_invalid_type(self):
+        response = self.client.get(reverse('booking-export'), {'type': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'export_bookings', '--format', 'ndjson', '--doctor', str(self.doctors[0].id),
+            '--chunk-size', '2', stdout=out, stderr=err
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [b.id for b in self.bookings[0::2]])
+        self.assertIn('Exported 3 booking(s)', err.getvalue())
+
+
+
+
+@override_settings(CLINIC_TIME_ZONE='Asia/Tashkent')
+class RevenueRollupTest(APITestCase):
+    TZ = ZoneInfo('Asia/Tashkent')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='receptionist1',
+            password='testpass123',
+            role=User.ROLE_RECEPTIONIST
+        )
+        self.client.force_authenticate(user=self.user)
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+
+    def book(self, doctor, when, total):
+        return Booking.objects.create(
+            patient=self.patient, doctor=self.doctors[doctor], scheduled_at=when, total=Decimal(total)
+        )
+
+    def rollup(self):
+        return {
+            (row.doctor_id, row.day): (row.bookings_count, row.revenue)
+            for row in DoctorDailyRevenue.objects.all()
+            if row.bookings_count
+        }
+
+    def test_maintained_on_create_update_delete(self):
+        day = date(2030, 1, 7)
+        # 00:30 local on the 7th is still the 6th in UTC: rolled up by clinic-local day
+        early = self.book(0, datetime(2030, 1, 7, 0, 30, tzinfo=self.TZ), '100.00')
+        late = self.book(0, datetime(2030, 1, 7, 15, tzinfo=self.TZ), '50.00')
+        self.assertEqual(self.rollup(), {(self.doctors[0].id, day): (2, Decimal('150.00'))})
+
+        late.total = Decimal('70.00')
+        late.save()
+        self.assertEqual(self.rollup(), {(self.doctors[0].id, day): (2, Decimal('170.00'))})
+
+        late.doctor = self.doctors[1]
+        late.scheduled_at = datetime(2030, 1, 8, 15, tzinfo=self.TZ)
+        late.save()
+        self.assertEqual(self.rollup(), {
+            (self.doctors[0].id, day): (1, Decimal('100.00')),
+            (self.doctors[1].id, date(2030, 1, 8)): (1, Decimal('70.00')),
+        })
+
+        early.delete()
+        self.assertEqual(self.rollup(), {(self.doctors[1].id, date(2030, 1, 8)): (1, Decimal('70.00'))})
+
+    def test_bulk_endpoints_keep_rollup_in_sync(self):
+        start = datetime(2030, 1, 7, 9, tzinfo=self.TZ)
+        items = [
+            {
+                'patient': self.patient.id, 'doctor': self.doctors[0].id,
+                'scheduled_at': (start + timedelta(hours=i)).isoformat(), 'total': '10.00',
+            }
+            for i in range(3)
+        ]
+        response = self.client.post(reverse('booking-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ids = [row['id'] for row in response.data]
+        response = self.client.patch(reverse('booking-bulk'), [
+            {'id': ids[0], 'total': '25.00'},
+            {'id': ids[1], 'doctor': self.doctors[1].id},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.rollup(), {
+            (self.doctors[0].id, date(2030, 1, 7)): (2, Decimal('35.00')),
+            (self.doctors[1].id, date(2030, 1, 7)): (1, Decimal('10.00')),
+        })
+        response = self.client.delete(reverse('booking-bulk'), ids, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.rollup(), {})
+
+    def test_rebuild_command(self):
+        self.book(0, datetime(2030, 1, 7, 9, tzinfo=self.TZ), '100.00')
+        self.book(1, datetime(2030, 1, 7, 10, tzinfo=self.TZ), '40.00')
+        expected = self.rollup()
+        DoctorDailyRevenue.objects.all().delete()
+        DoctorDailyRevenue.objects.create(doctor=self.doctors[0], day=date(2000, 1, 1), bookings_count=9)
+
+        out = StringIO()
+        call_command('rebuild_revenue_rollup', stdout=out)
+        self.assertEqual(self.rollup(), expected)
+        self.assertIn('Rebuilt 2', out.getvalue())
+
+    def test_rebuild_command_can_enqueue(self):
+        self.book(0, datetime(2030, 1, 7, 9, tzinfo=self.TZ), '100.00')
+        expected = self.rollup()
+        DoctorDailyRevenue.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_revenue_rollup', '--enqueue', stdout=out)
+        call_command('rebuild_revenue_rollup', '--enqueue', stdout=out)
+        self.assertIn('already queued', out.getvalue())
+        self.assertEqual(self.rollup(), {})
+        self.assertEqual(Job.objects.filter(name='bookings.rebuild_revenue_rollup').count(), 1)
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(self.rollup(), expected)
+
+    def test_report_by_month(self):
+        self.book(0, datetime(2030, 1, 7, 9, tzinfo=self.TZ), '100.00')
+        self.book(0, datetime(2030, 1, 20, 9, tzinfo=self.TZ), '20.00')
+        self.book(0, datetime(2030, 2, 3, 9, tzinfo=self.TZ), '5.00')
+        self.book(1, datetime(2030, 2, 3, 9, tzinfo=self.TZ), '7.00')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('revenue_report'), {
+                'start': '2029-03-01', 'end': '2030-02-28',
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('bookings_booking' in q['sql'] for q in queries.captured_queries))
+        rows = [(r['doctor'], r['period'], r['bookings'], r['revenue']) for r in response.data['results']]
+        self.assertEqual(rows, [
+            (self.doctors[0].id, '2030-01-01', 2, '120.00'),
+            (self.doctors[0].id, '2030-02-01', 1, '5.00'),
+            (self.doctors[1].id, '2030-02-01', 1, '7.00'),
+        ])
+
+        response = self.client.get(reverse('revenue_report'), {
+            'start': '2030-01-01', 'end': '2030-12-31', 'period': 'year', 'doctor': self.doctors[0].id,
+        })
+        self.assertEqual(
+            [(r['period'], r['bookings'], r['revenue']) for r in response.data['results']],
+            [('2030-01-01', 3, '125.00')]
+        )
+
+    def test_report_defaults_to_last_twelve_months(self):
+        response = self.client.get(reverse('revenue_report'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        start, end = date.fromisoformat(response.data['start']), date.fromisoformat(response.data['end'])
+        self.assertEqual(start.day, 1)
+        self.assertEqual((end.year - start.year) * 12 + end.month - start.month, 11)
+
+    def test_doctor_sees_only_own_revenue(self):
+        self.book(0, datetime(2030, 1, 7, 9, tzinfo=self.TZ), '100.00')
+        self.book(1, datetime(2030, 1, 7, 9, tzinfo=self.TZ), '40.00')
+        self.client.force_authenticate(user=self.doctors[1].user)
+        response = self.client.get(reverse('revenue_report'), {
+            'start': '2030-01-01', 'end': '2030-01-31', 'doctor': self.doctors[0].id,
+        })
+        self.assertEqual(
+            [r['doctor'] for r in response.data['results']], [self.doctors[1].id]
+        )
+
+
+
+
+@override_settings(CLINIC_TIME_ZONE='Asia/Tashkent', APPOINTMENT_SLOT_MINUTES=30)
+class AvailabilityTest(APITestCase):
+    # 2030-01-07 is a Monday
+    MONDAY = date(2030, 1, 7)
+    TZ = ZoneInfo('Asia/Tashkent')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        TimetableEntry.objects.create(
+            doctor=self.doctor, day_of_week=TimetableEntry.WeekDay.MONDAY,
+            start_time=time(9, 0), end_time=time(11, 0)
+        )
+        TimetableEntry.objects.create(
+            doctor=self.doctor, day_of_week=TimetableEntry.WeekDay.WEDNESDAY,
+            start_time=time(14, 0), end_time=time(15, 15)
+        )
+        TimetableEntry.objects.create(
+            doctor=self.doctor, day_of_week=TimetableEntry.WeekDay.FRIDAY,
+            start_time=time(9, 0), end_time=time(12, 0), is_active=False
+        )
+
+    def local(self, day, hour, minute=0):
+        return datetime.combine(day, time(hour, minute), tzinfo=self.TZ)
+
+    def test_merge_and_subtract(self):
+        busy = merge_intervals([(5, 7), (1, 3), (2, 4), (7, 8)])
+        self.assertEqual(busy, [[1, 4], [5, 8]])
+        slots = [(0, 1), (1, 2), (4, 5), (6, 7), (8, 9)]
+        self.assertEqual(list(subtract_busy(slots, busy)), [(0, 1), (4, 5), (8, 9)])
+
+    def test_expands_active_entries_in_clinic_timezone(self):
+        slots = doctor_availability(self.doctor.pk, self.MONDAY, self.MONDAY + timedelta(days=6))
+        starts = [start for start, _ in slots]
+        self.assertEqual(starts[0], self.local(self.MONDAY, 9))
+        # 4 Monday slots, 2 whole Wednesday slots, nothing on the inactive Friday
+        self.assertEqual(len(slots), 6)
+        self.assertEqual(starts[-1], self.local(self.MONDAY + timedelta(days=2), 14, 30))
+        self.assertEqual(starts[0].astimezone(ZoneInfo('UTC')).hour, 4)
+
+    def test_bookings_are_subtracted(self):
+        Booking.objects.create(
+            patient=self.patient, doctor=self.doctor,
+            scheduled_at=self.local(self.MONDAY, 9, 30)
+        )
+        # Off-grid booking blocks both slots it overlaps
+        Booking.objects.create(
+            patient=self.patient, doctor=self.doctor,
+            scheduled_at=self.local(self.MONDAY + timedelta(days=2), 14, 15)
+        )
+        slots = doctor_availability(self.doctor.pk, self.MONDAY, self.MONDAY + timedelta(days=2))
+        starts = [start for start, _ in slots]
+        self.assertEqual(starts, [
+            self.local(self.MONDAY, 9),
+            self.local(self.MONDAY, 10),
+            self.local(self.MONDAY, 10, 30),
+        ])
+
+    def test_past_slots_are_dropped(self):
+        now = self.local(self.MONDAY, 10)
+        slots = doctor_availability(self.doctor.pk, self.MONDAY, self.MONDAY, now=now)
+        self.assertEqual([start for start, _ in slots], [now, self.local(self.MONDAY, 10, 30)])
+
+    def test_month_costs_three_queries(self):
+        # timetable, bookings, live holds
+        with self.assertNumQueries(3):
+            slots = doctor_availability(self.doctor.pk, self.MONDAY, self.MONDAY + timedelta(days=30))
+        self.assertEqual(len(slots), 5 * 4 + 5 * 2)
+
+    def test_endpoint(self):
+        url = reverse('doctor_availability', kwargs={'doctor_id': self.doctor.pk})
+        response = self.client.get(url, {
+            'start': self.MONDAY.isoformat(),
+            'end': (self.MONDAY + timedelta(days=2)).isoformat(),
+            'tz': 'UTC',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['slot_minutes'], 30)
+        self.assertEqual(len(response.data['days']), 2)
+        monday = response.data['days'][0]
+        self.assertEqual(monday['date'], '2030-01-07')
+        self.assertEqual(monday['slots'][0]['start'], '2030-01-07T04:00:00+00:00')
+
+    def test_endpoint_validation(self):
+        url = reverse('doctor_availability', kwargs={'doctor_id': self.doctor.pk})
+        response = self.client.get(url, {'start': '2030-01-07', 'end': '2030-06-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'start': '2030-01-07', 'end': '2030-01-08', 'tz': 'Mars/Base'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.doctor.is_active = False
+        self.doctor.save()
+        response = self.client.get(url, {'start': '2030-01-07', 'end': '2030-01-08'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_endpoint_matches_sync(self):
+        Booking.objects.create(
+            patient=self.patient, doctor=self.doctor,
+            scheduled_at=self.local(self.MONDAY, 9, 30)
+        )
+        params = {
+            'start': self.MONDAY.isoformat(),
+            'end': (self.MONDAY + timedelta(days=6)).isoformat(),
+            'tz': 'UTC',
+        }
+        sync = self.client.get(reverse('doctor_availability', kwargs={'doctor_id': self.doctor.pk}), params)
+        url = reverse('doctor_availability_async', kwargs={'doctor_id': self.doctor.pk})
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), sync.json())
+
+        response = self.client.get(url, {'start': '2030-01-07', 'end': '2030-06-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('end', response.json())
+        response = self.client.get(reverse('doctor_availability_async', kwargs={'doctor_id': 999}), params)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+
+class NextAvailableTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('next_available')
+        self.cardiology = Specialty.objects.create(name='Cardiology')
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice = self.make_doctor('alice', 'Cardiology', rating=5)
+            self.bob = self.make_doctor('bob', 'Surgery', rating=3)
+            self.bob.other_specialties.add(self.cardiology)
+            self.carl = self.make_doctor('carl', 'Neurology', rating=4)
+        self.run_jobs()
+
+    def make_doctor(self, username, specialty, rating):
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username=username, password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty=specialty
+        )
+        doctor.reviews.create(rating=rating)
+        # Around-the-clock timetable so everyone is free from the next slot on
+        for day in TimetableEntry.WeekDay.values:
+            TimetableEntry.objects.create(
+                doctor=doctor, day_of_week=day, start_time=time(0, 0), end_time=time(23, 30)
+            )
+        return doctor
+
+    def names(self, response):
+        return [row['user'] for row in response.data]
+
+    def run_jobs(self):
+        call_command('run_jobs', '--once', stdout=StringIO())
+
+    def test_index_maintained_by_signals(self):
+        slot = DoctorNextSlot.objects.get(doctor=self.alice).starts_at
+        self.assertIsNotNone(slot)
+        self.assertGreaterEqual(slot, timezone.now())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(patient=self.patient, doctor=self.alice, scheduled_at=slot)
+        # Refreshed by the background job, not by the write itself
+        self.assertEqual(DoctorNextSlot.objects.get(doctor=self.alice).starts_at, slot)
+        self.run_jobs()
+        later = DoctorNextSlot.objects.get(doctor=self.alice).starts_at
+        self.assertGreater(later, slot)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.filter(doctor=self.alice).delete()
+        self.run_jobs()
+        self.assertEqual(DoctorNextSlot.objects.get(doctor=self.alice).starts_at, slot)
+
+    def test_only_schedule_changes_queue_a_refresh(self):
+        slot = DoctorNextSlot.objects.get(doctor=self.alice).starts_at
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(patient=self.patient, doctor=self.alice, scheduled_at=slot)
+        self.run_jobs()
+        queued = Job.objects.filter(status=Job.QUEUED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.notes = 'Bring the ECG'
+            booking.total = Decimal('80.00')
+            booking.save()
+        self.assertFalse(queued.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.duration_minutes = 60
+            booking.save()
+        self.assertEqual(list(queued.values_list('payload', flat=True)), [{'doctor_id': self.alice.pk}])
+        self.run_jobs()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.doctor = self.bob
+            booking.save()
+        self.assertEqual(
+            sorted(payload['doctor_id'] for payload in queued.values_list('payload', flat=True)),
+            sorted([self.alice.pk, self.bob.pk]),
+        )
+
+    def test_refreshes_are_queued_once_per_doctor(self):
+        slot = DoctorNextSlot.objects.get(doctor=self.alice).starts_at
+        with self.captureOnCommitCallbacks(execute=True):
+            for minutes in (0, 30, 60):
+                Booking.objects.create(
+                    patient=self.patient, doctor=self.alice, scheduled_at=slot + timedelta(minutes=minutes)
+                )
+        jobs = Job.objects.filter(status=Job.QUEUED)
+        self.assertEqual(list(jobs.values_list('name', 'unique_key')), [
+            ('bookings.refresh_next_slot', f'next-slot:{self.alice.pk}'),
+        ])
+        # Nothing is queued for a write that rolls back
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Booking.objects.create(
+                        patient=self.patient, doctor=self.bob, scheduled_at=slot + timedelta(hours=3)
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(jobs.count(), 1)
+
+    def test_orders_by_slot_then_rating(self):
+        response = self.client.get(self.url, {'specialty': 'cardiology'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Same next slot for both: higher rating first; neurologist excluded
+        self.assertEqual(self.names(response), ['alice', 'bob'])
+
+        slot = DoctorNextSlot.objects.get(doctor=self.alice).starts_at
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(patient=self.patient, doctor=self.alice, scheduled_at=slot)
+        self.run_jobs()
+        response = self.client.get(self.url, {'specialty': 'Cardiology'})
+        self.assertEqual(self.names(response), ['bob', 'alice'])
+        self.assertEqual(response.data[0]['next_available_at'], slot.isoformat().replace('+00:00', 'Z'))
+
+    def test_query_is_a_single_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'specialty': 'Cardiology', 'limit': 1})
+        self.assertEqual(self.names(response), ['alice'])
+
+    def test_tiebreak_validation(self):
+        response = self.client.get(self.url, {'specialty': 'Cardiology', 'tiebreak': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_command(self):
+        DoctorNextSlot.objects.update(starts_at=timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command('refresh_next_slots', stdout=out)
+        self.assertIn('3 doctor', out.getvalue())
+        self.assertFalse(DoctorNextSlot.objects.filter(starts_at__lt=timezone.now()).exists())
+
+    def test_refresh_command_rechecks_empty_slots_daily(self):
+        DoctorNextSlot.objects.filter(doctor=self.alice).update(
+            starts_at=None, computed_at=timezone.now() - timedelta(days=2)
+        )
+        DoctorNextSlot.objects.filter(doctor=self.bob).update(starts_at=None, computed_at=timezone.now())
+        out = StringIO()
+        call_command('refresh_next_slots', stdout=out)
+        self.assertIn('1 doctor', out.getvalue())
+        self.assertIsNotNone(DoctorNextSlot.objects.get(doctor=self.alice).starts_at)
+        # Checked today already; the horizon has not moved since
+        self.assertIsNone(DoctorNextSlot.objects.get(doctor=self.bob).starts_at)
+
+    def test_deleting_doctor_cascades_cleanly(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                patient=self.patient, doctor=self.carl,
+                scheduled_at=timezone.now() + timedelta(days=1)
+            )
+        self.carl.user.delete()
+        self.assertFalse(DoctorNextSlot.objects.filter(doctor_id=self.carl.pk).exists())
+        # The refresh queued before the delete finds no doctor and does nothing
+        self.run_jobs()
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+        self.assertFalse(DoctorNextSlot.objects.filter(doctor_id=self.carl.pk).exists())
+
+
+
+class DoubleBookingTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.receptionist = User.objects.create_user(
+            username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST
+        )
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        self.other_doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor2', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Neurology'
+        )
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.start = datetime(2030, 1, 7, 9, 0, tzinfo=ZoneInfo('UTC'))
+
+    def book(self, doctor, start, minutes=30):
+        return Booking.objects.create(
+            patient=self.patient, doctor=doctor, scheduled_at=start, duration_minutes=minutes
+        )
+
+    def test_ends_at_and_slot_keys(self):
+        booking = self.book(self.doctor, self.start + timedelta(minutes=2), minutes=20)
+        self.assertEqual(booking.ends_at, self.start + timedelta(minutes=22))
+        # 09:00, 09:05, 09:10, 09:15, 09:20 cells are claimed
+        self.assertEqual(booking.slots.count(), 5)
+        self.assertEqual(slot_cells(self.start, self.start + timedelta(minutes=10)),
+                         [self.start, self.start + timedelta(minutes=5)])
+
+    def test_overlap_rejected(self):
+        self.book(self.doctor, self.start, minutes=60)
+        with self.assertRaises(SlotUnavailable):
+            self.book(self.doctor, self.start + timedelta(minutes=30))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_adjacent_and_other_doctor_allowed(self):
+        self.book(self.doctor, self.start)
+        self.book(self.doctor, self.start + timedelta(minutes=30))
+        self.book(self.other_doctor, self.start)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_reschedule_frees_old_slot(self):
+        booking = self.book(self.doctor, self.start)
+        booking.scheduled_at = self.start + timedelta(hours=2)
+        booking.save()
+        self.book(self.doctor, self.start)
+        self.assertEqual(BookingSlot.objects.filter(booking=booking).first().starts_at,
+                         self.start + timedelta(hours=2))
+
+    def test_non_schedule_edits_keep_slot_keys(self):
+        booking = self.book(self.doctor, self.start)
+        keys = set(BookingSlot.objects.filter(booking=booking).values_list('pk', flat=True))
+        booking.notes = 'Bring the ECG'
+        booking.total = Decimal('80.00')
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+        self.assertFalse(any('bookings_bookingslot' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(set(BookingSlot.objects.filter(booking=booking).values_list('pk', flat=True)), keys)
+
+    def test_legacy_overlap_can_still_be_edited(self):
+        # Overlapping rows written before slot keys existed
+        first = self.book(self.doctor, self.start)
+        second = self.book(self.doctor, self.start + timedelta(hours=1))
+        BookingSlot.objects.filter(booking=second).delete()
+        Booking.objects.filter(pk=second.pk).update(
+            scheduled_at=self.start + timedelta(minutes=15), ends_at=self.start + timedelta(minutes=45)
+        )
+        second.refresh_from_db()
+        second.notes = 'Moved from paper'
+        second.save()
+        self.assertEqual(Booking.objects.get(pk=second.pk).notes, 'Moved from paper')
+        # Moving it still has to find free cells
+        second.scheduled_at = first.scheduled_at
+        with self.assertRaises(SlotUnavailable):
+            second.save()
+
+    def test_delete_frees_slot(self):
+        self.book(self.doctor, self.start).delete()
+        self.book(self.doctor, self.start)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_api_returns_conflict(self):
+        self.book(self.doctor, self.start)
+        self.client.force_authenticate(user=self.receptionist)
+        response = self.client.post(reverse('booking-list'), {
+            'patient': self.patient.id,
+            'doctor': self.doctor.id,
+            'scheduled_at': (self.start + timedelta(minutes=15)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_public_conflict_does_not_leave_patient(self):
+        self.book(self.doctor, self.start)
+        response = self.client.post(reverse('public_booking_create'), {
+            'doctor': self.doctor.id,
+            'scheduled_at': self.start.isoformat(),
+            'patient': {
+                'first_name': 'Alice', 'last_name': 'Johnson',
+                'email': 'alice@example.com', 'date_of_birth': '1990-05-15'
+            }
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Patient.objects.filter(email='alice@example.com').exists())
+
+
+
+@override_settings(APPOINTMENT_SLOT_MINUTES=30, SLOT_HOLD_MINUTES=5)
+class SlotHoldTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        self.start = (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        self.patient_data = {
+            'first_name': 'Alice', 'last_name': 'Johnson',
+            'email': 'alice@example.com', 'date_of_birth': '1990-05-15'
+        }
+
+    def claim(self, start=None):
+        return self.client.post(reverse('slot_hold_create'), {
+            'doctor': self.doctor.id,
+            'starts_at': (start or self.start).isoformat(),
+        }, format='json')
+
+    def confirm(self, token, email='alice@example.com'):
+        return self.client.post(
+            reverse('slot_hold_confirm', kwargs={'token': token}),
+            {'patient': dict(self.patient_data, email=email), 'notes': 'via hold'},
+            format='json'
+        )
+
+    def test_claim_and_confirm(self):
+        response = self.claim()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        token = response.data['token']
+
+        response = self.confirm(token)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.scheduled_at, self.start)
+        self.assertEqual(booking.duration_minutes, 30)
+        self.assertEqual(booking.notes, 'via hold')
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_second_claim_conflicts(self):
+        self.assertEqual(self.claim().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.claim().status_code, status.HTTP_409_CONFLICT)
+
+    def test_overlapping_claim_conflicts(self):
+        self.assertEqual(self.claim().status_code, status.HTTP_201_CREATED)
+        response = self.claim(self.start + timedelta(minutes=15))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(SlotHold.objects.count(), 1)
+        # A hold right after the first one does not overlap
+        self.assertEqual(self.claim(self.start + timedelta(minutes=30)).status_code, status.HTTP_201_CREATED)
+
+    def test_held_slot_blocks_public_booking(self):
+        self.claim()
+        response = self.client.post(reverse('public_booking_create'), {
+            'doctor': self.doctor.id,
+            'scheduled_at': self.start.isoformat(),
+            'patient': dict(self.patient_data, email='bob@example.com'),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_booked_slot_cannot_be_held(self):
+        token = self.claim().data['token']
+        self.confirm(token)
+        self.assertEqual(self.claim().status_code, status.HTTP_409_CONFLICT)
+
+    def test_expired_hold(self):
+        token = self.claim().data['token']
+        SlotHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        # Expired hold is reclaimed by the next claimant
+        new = self.claim()
+        self.assertEqual(new.status_code, status.HTTP_201_CREATED)
+        response = self.confirm(token)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        SlotHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.confirm(new.data['token'])
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_release_and_sweep(self):
+        token = self.claim().data['token']
+        response = self.client.delete(reverse('slot_hold_release', kwargs={'token': token}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.claim()
+        self.claim(self.start + timedelta(hours=1))
+        SlotHold.objects.filter(starts_at=self.start).update(expires_at=timezone.now())
+        out = StringIO()
+        call_command('sweep_slot_holds', stdout=out)
+        self.assertIn('Removed 1 expired', out.getvalue())
+        self.assertEqual(SlotHold.objects.count(), 1)
+
+    def test_held_slot_hidden_from_availability(self):
+        TimetableEntry.objects.create(
+            doctor=self.doctor, day_of_week=self.start.weekday(),
+            start_time=time(0, 0), end_time=time(23, 30)
+        )
+        day = self.start.date()
+        with self.settings(CLINIC_TIME_ZONE='UTC'):
+            before = doctor_availability(self.doctor.pk, day, day)
+            self.claim()
+            after = doctor_availability(self.doctor.pk, day, day)
+        self.assertIn(self.start, [start for start, _ in before])
+        self.assertNotIn(self.start, [start for start, _ in after])
+
+
+
+class IdempotentPublicBookingTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('public_booking_create')
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        self.data = {
+            'doctor': self.doctor.id,
+            'scheduled_at': (timezone.now() + timedelta(days=1)).replace(microsecond=0).isoformat(),
+            'patient': {
+                'first_name': 'Alice', 'last_name': 'Johnson',
+                'email': 'alice@example.com', 'date_of_birth': '1990-05-15'
+            }
+        }
+
+    def post(self, data=None, key='key-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(self.url, data or self.data, format='json', **headers)
+
+    def test_retry_replays_original_response(self):
+        first = self.post()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        # Replays are answered from the key table alone
+        with self.assertNumQueries(1):
+            second = self.post()
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['id'], first.data['id'])
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(Patient.objects.count(), 1)
+
+    def test_different_body_with_same_key(self):
+        self.post()
+        data = dict(self.data, notes='changed')
+        response = self.post(data)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_without_key_behaves_as_before(self):
+        self.assertEqual(self.post(key=None).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post(key=None).status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_failures_are_not_stored(self):
+        response = self.post({'doctor': self.doctor.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post().status_code, status.HTTP_201_CREATED)
+
+    def test_expired_keys_are_reused_and_purged(self):
+        self.post()
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Removed 1 expired', out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(REMINDER_OFFSETS_HOURS=[24, 2], CLINIC_TIME_ZONE='UTC')
+class BookingReminderTest(TestCase):
+    def setUp(self):
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR,
+                first_name='Greg', last_name='House'
+            ),
+            main_specialty='Cardiology'
+        )
+        self.now = datetime(2030, 1, 7, 8, tzinfo=ZoneInfo('UTC'))
+        self.count = 0
+
+    def book(self, hours_ahead, email=None):
+        self.count += 1
+        patient = Patient.objects.create(
+            first_name=f'John{self.count}', last_name='Doe', date_of_birth='1990-01-01',
+            email=f'john{self.count}@example.com' if email is None else email
+        )
+        return Booking.objects.create(
+            patient=patient, doctor=self.doctor, scheduled_at=self.now + timedelta(hours=hours_ahead)
+        )
+
+    def test_windows_and_no_double_send(self):
+        soon = self.book(1)
+        tomorrow = self.book(20)
+        self.book(50)
+        self.book(-1)
+
+        stats = send_due_reminders(now=self.now)
+        self.assertEqual(stats[2]['sent'], 1)
+        self.assertEqual(stats[24]['sent'], 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['john1@example.com', 'john2@example.com'])
+        self.assertIn('Dr. Greg House', mail.outbox[0].body)
+        self.assertIn('07.01.2030 at 09:00', mail.outbox[0].subject)
+        self.assertEqual(
+            set(BookingReminder.objects.values_list('booking_id', 'offset_hours', 'status')),
+            {(soon.pk, 2, BookingReminder.SENT), (tomorrow.pk, 24, BookingReminder.SENT)},
+        )
+
+        # A second run sends nothing
+        send_due_reminders(now=self.now)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # Later the 24h booking enters the 2h window and gets its second reminder
+        send_due_reminders(now=self.now + timedelta(hours=18, minutes=30))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[2].to, ['john2@example.com'])
+
+    def test_rescheduled_booking_is_reminded_again(self):
+        booking = self.book(1)
+        send_due_reminders(now=self.now)
+        booking.scheduled_at = self.now + timedelta(hours=1, minutes=30)
+        booking.save()
+        send_due_reminders(now=self.now)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('09:30', mail.outbox[1].subject)
+
+    def test_patient_without_email_is_skipped(self):
+        self.book(1, email='')
+        stats = send_due_reminders(now=self.now)
+        self.assertEqual(stats[2], {'sent': 0, 'skipped': 1, 'failed': 0})
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(BookingReminder.objects.get().status, BookingReminder.SKIPPED)
+
+    def test_batches_use_constant_queries(self):
+        for i in range(12):
+            self.book(3 + i / 2)
+        # Per batch: select, claim insert, claimed select, mark-sent update;
+        # plus one empty select closing each window
+        with self.assertNumQueries(3 * 4 + 2):
+            stats = send_due_reminders(now=self.now, batch_size=5)
+        self.assertEqual(stats[24]['sent'], 12)
+        self.assertEqual(len(mail.outbox), 12)
+
+    def test_failed_delivery_is_retried(self):
+        self.book(1)
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SMTPException('down')
+        ):
+            with self.assertLogs('bookings.reminders', 'ERROR'):
+                stats = send_due_reminders(now=self.now)
+        self.assertEqual(stats[2]['failed'], 1)
+        self.assertFalse(BookingReminder.objects.exists())
+
+        send_due_reminders(now=self.now)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_command(self):
+        self.book(1)
+        out = StringIO()
+        with mock.patch('bookings.reminders.timezone.now', return_value=self.now):
+            call_command('send_reminders', stdout=out)
+        self.assertIn('2h: 1 sent', out.getvalue())
+        self.assertIn('Sent 1 reminder(s)', out.getvalue())
+
+        self.book(1.5)
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=SMTPException('down')
+        ), mock.patch('bookings.reminders.timezone.now', return_value=self.now):
+            with self.assertLogs('bookings.reminders', 'ERROR'), self.assertRaises(CommandError):
+                call_command('send_reminders', stdout=StringIO())
+
+    def test_command_can_enqueue(self):
+        out = StringIO()
+        call_command('send_reminders', '--enqueue', '--offset', '2', stdout=out)
+        self.assertIn('Queued the reminder run', out.getvalue())
+        job = Job.objects.get(name='bookings.send_reminders')
+        self.assertEqual(job.payload, {'batch_size': 500, 'offsets': [2]})
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@override_settings(
+    CLINIC_TIME_ZONE='UTC', BOOKING_EVENTS_BACKEND='local', BOOKING_EVENTS_BUFFER=5,
+    BOOKING_EVENTS_HEARTBEAT_SECONDS=0.05, BOOKING_EVENTS_STREAM_SECONDS=0.3,
+)
+class BookingEventFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        events.reset_log()
+        self.addCleanup(events.reset_log)
+        self.receptionist = User.objects.create_user(
+            username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST
+        )
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.start = datetime(2030, 1, 7, 9, tzinfo=ZoneInfo('UTC'))
+
+    def book(self, doctor, at):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(patient=self.patient, doctor=doctor, scheduled_at=at)
+
+    def published(self):
+        return [event for _, event in async_to_sync(events.get_log().since)(0)[0]]
+
+    def auth(self, user, **headers):
+        return {'headers': {'Authorization': f'Bearer {AccessToken.for_user(user)}', **headers}}
+
+    def test_signals_publish_on_commit(self):
+        booking = self.book(self.doctors[0], self.start)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.scheduled_at = self.start + timedelta(days=1)
+            booking.doctor = self.doctors[1]
+            booking.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        created, updated, deleted = self.published()
+        self.assertEqual(created['type'], 'created')
+        self.assertEqual(created['days'], ['2030-01-07'])
+        self.assertEqual(updated['type'], 'updated')
+        self.assertEqual(updated['doctor'], self.doctors[1].pk)
+        self.assertEqual(updated['previous_doctor'], self.doctors[0].pk)
+        self.assertEqual(updated['days'], ['2030-01-08', '2030-01-07'])
+        self.assertEqual(deleted['type'], 'deleted')
+
+        self.assertTrue(events.matches(updated, doctor_id=self.doctors[0].pk))
+        self.assertTrue(events.matches(updated, day=date(2030, 1, 7)))
+        self.assertFalse(events.matches(created, doctor_id=self.doctors[1].pk))
+
+    def test_rolled_back_writes_are_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Booking.objects.create(patient=self.patient, doctor=self.doctors[0], scheduled_at=self.start)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.published(), [])
+
+    def test_bulk_writes_publish(self):
+        client = APIClient()
+        client.force_authenticate(self.receptionist)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('booking-bulk'), [
+                {'patient': self.patient.pk, 'doctor': self.doctors[0].pk, 'scheduled_at': self.start.isoformat()},
+                {'patient': self.patient.pk, 'doctor': self.doctors[1].pk, 'scheduled_at': self.start.isoformat()},
+            ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([event['type'] for event in self.published()], ['created', 'created'])
+
+    def test_log_gaps(self):
+        log = events.get_log()
+        log.publish([{'type': 'created', 'n': n} for n in range(7)])
+        # Buffer of 5: events 1 and 2 are gone
+        self.assertEqual(async_to_sync(log.since)(0), ([], True))
+        found, gap = async_to_sync(log.since)(2)
+        self.assertFalse(gap)
+        self.assertEqual([seq for seq, _ in found], [3, 4, 5, 6, 7])
+        self.assertEqual(async_to_sync(log.since)(9), ([], True))
+        self.assertIsNone(log.parse_id('other:3'))
+        self.assertEqual(log.parse_id(log.format_id(3)), 3)
+
+    def test_cache_log(self):
+        log = events.CacheEventLog(size=5, poll_seconds=0.01)
+        log.publish([{'type': 'created', 'n': n} for n in range(3)])
+        found, gap = async_to_sync(log.since)(1)
+        self.assertFalse(gap)
+        self.assertEqual([event['n'] for _, event in found], [1, 2])
+        # Another process sharing the cache sees the same events
+        other = events.CacheEventLog(size=5, poll_seconds=0.01)
+        self.assertEqual(other.epoch, log.epoch)
+        self.assertEqual(async_to_sync(other.since)(0)[0], async_to_sync(log.since)(0)[0])
+        cache.delete(events.CacheEventLog.EVENT_KEY.format(1))
+        self.assertEqual(async_to_sync(log.since)(0), ([], True))
+
+    async def read_stream(self, **extra):
+        response = await AsyncClient().get(reverse('booking_events'), **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        messages = []
+        for block in body.split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                messages.append((fields['event'], json.loads(fields['data'])))
+        return body, messages
+
+    async def test_stream_replays_and_filters(self):
+        log = events.get_log()
+        log.publish([
+            {'type': 'created', 'id': 1, 'doctor': self.doctors[0].pk, 'days': ['2030-01-07']},
+            {'type': 'created', 'id': 2, 'doctor': self.doctors[1].pk, 'days': ['2030-01-07']},
+            {'type': 'deleted', 'id': 3, 'doctor': self.doctors[0].pk, 'days': ['2030-01-08']},
+        ])
+        body, messages = await self.read_stream(
+            data={'doctor': self.doctors[0].pk, 'date': '2030-01-07'},
+            **self.auth(self.receptionist, **{'Last-Event-ID': log.format_id(0)}),
+        )
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn(': keep-alive', body)
+        self.assertEqual(messages, [('created', {'type': 'created', 'id': 1, 'doctor': self.doctors[0].pk,
+                                                'days': ['2030-01-07']})])
+        self.assertIn(f'id: {log.format_id(1)}', body)
+
+    async def test_stream_delivers_live_events(self):
+        log = events.get_log()
+        response = await AsyncClient().get(reverse('booking_events'), **self.auth(self.receptionist))
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry: '))
+        log.publish([{'type': 'created', 'id': 9, 'doctor': 1, 'days': []}])
+        self.assertIn(b'event: created', await anext(chunks))
+
+    async def test_doctors_only_see_their_own(self):
+        events.get_log().publish([
+            {'type': 'created', 'id': 1, 'doctor': self.doctors[1].pk, 'days': []},
+        ])
+        _, messages = await self.read_stream(
+            data={'doctor': self.doctors[1].pk, 'last_event_id': events.get_log().format_id(0)},
+            **self.auth(self.doctors[0].user),
+        )
+        self.assertEqual(messages, [])
+
+    async def test_unknown_event_id_resets(self):
+        _, messages = await self.read_stream(**self.auth(self.receptionist, **{'Last-Event-ID': 'stale:4'}))
+        self.assertEqual(messages[0][0], 'reset')
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get(reverse('booking_events'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = await AsyncClient().get(reverse('booking_events'), {'date': 'nope'}, **self.auth(self.receptionist))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookingArchiveTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        events.reset_log()
+        self.addCleanup(events.reset_log)
+        self.receptionist = User.objects.create_user(
+            username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST
+        )
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.cutoff = datetime(2025, 1, 1, tzinfo=ZoneInfo('UTC'))
+        self.old = [
+            Booking.objects.create(
+                patient=self.patient, doctor=self.doctors[i % 2],
+                scheduled_at=self.cutoff - timedelta(days=10 - i), total=Decimal('10.00'),
+            )
+            for i in range(5)
+        ]
+        self.recent = Booking.objects.create(
+            patient=self.patient, doctor=self.doctors[0],
+            scheduled_at=self.cutoff + timedelta(days=1), total=Decimal('20.00'),
+        )
+
+    def rollup(self):
+        return {
+            (row.doctor_id, row.day): (row.bookings_count, row.revenue)
+            for row in DoctorDailyRevenue.objects.all()
+            if row.bookings_count
+        }
+
+    def test_moves_old_bookings_keeping_ids_and_revenue(self):
+        rollup = self.rollup()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_bookings(self.cutoff, chunk_size=2), 5)
+
+        self.assertEqual(list(Booking.objects.values_list('pk', flat=True)), [self.recent.pk])
+        archived = ArchivedBooking.objects.get(pk=self.old[0].pk)
+        self.assertEqual(archived.scheduled_at, self.old[0].scheduled_at)
+        self.assertEqual(archived.total, Decimal('10.00'))
+        self.assertEqual(archived.created_at, self.old[0].created_at)
+        self.assertEqual(ArchivedBooking.objects.count(), 5)
+        # Slot keys are freed, revenue is kept and nothing is announced
+        self.assertFalse(BookingSlot.objects.filter(booking_id__in=[b.pk for b in self.old]).exists())
+        self.assertEqual(self.rollup(), rollup)
+        self.assertEqual(async_to_sync(events.get_log().since)(0)[0], [])
+
+        # A rebuild counts archived bookings too
+        DoctorDailyRevenue.objects.all().delete()
+        revenue.rebuild()
+        self.assertEqual(self.rollup(), rollup)
+
+        # Nothing left to do
+        self.assertEqual(archive_bookings(self.cutoff), 0)
+
+    def test_chunks_have_constant_query_count(self):
+        # Each chunk costs the same queries whatever its size
+        with CaptureQueriesContext(connection) as one_chunk:
+            archive_bookings(self.cutoff, chunk_size=5, limit=2)
+        with CaptureQueriesContext(connection) as two_chunks:
+            archive_bookings(self.cutoff, chunk_size=1, limit=2)
+        self.assertEqual(len(two_chunks), 2 * len(one_chunk))
+        self.assertEqual(ArchivedBooking.objects.count(), 4)
+
+    def test_merge_moves_archived_bookings(self):
+        duplicate = Patient.objects.create(
+            first_name='Jon', last_name='Doe', date_of_birth='1990-01-01', email='jon@example.com'
+        )
+        Booking.objects.filter(pk=self.old[0].pk).update(patient=duplicate)
+        archive_bookings(self.cutoff)
+        merge_patients(self.patient.pk, [duplicate.pk])
+        self.assertEqual(ArchivedBooking.objects.get(pk=self.old[0].pk).patient_id, self.patient.pk)
+
+    def test_archive_endpoint(self):
+        archive_bookings(self.cutoff)
+        url = reverse('archivedbooking-list')
+        self.client.force_authenticate(user=self.receptionist)
+        response = self.client.get(url, {'doctor': self.doctors[0].pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.old[4].pk, self.old[2].pk, self.old[0].pk])
+        self.assertIn('archived_at', response.data['results'][0])
+        self.assertEqual(self.client.delete(reverse('archivedbooking-detail', args=[self.old[0].pk])).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        # Doctors only see their own archived bookings
+        self.client.force_authenticate(user=self.doctors[1].user)
+        response = self.client.get(url)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.old[3].pk, self.old[1].pk])
+        response = self.client.get(reverse('archivedbooking-detail', args=[self.old[0].pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_command(self):
+        days = (timezone.now() - self.cutoff).days
+        out = StringIO()
+        call_command('archive_bookings', '--older-than-days', str(days), '--dry-run', stdout=out)
+        self.assertIn('5 booking(s)', out.getvalue())
+        self.assertEqual(ArchivedBooking.objects.count(), 0)
+        call_command('archive_bookings', '--older-than-days', str(days), '--limit', '3', stdout=out)
+        self.assertIn('Archived 3 booking(s)', out.getvalue())
+        self.assertEqual(ArchivedBooking.objects.count(), 3)
+
+    def test_command_can_enqueue(self):
+        days = (timezone.now() - self.cutoff).days
+        out = StringIO()
+        call_command('archive_bookings', '--older-than-days', str(days), '--enqueue', stdout=out)
+        self.assertIn('Queued the archive run', out.getvalue())
+        self.assertEqual(ArchivedBooking.objects.count(), 0)
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(ArchivedBooking.objects.count(), 5)
+
+
+class AuditTrailTest(APITransactionTestCase):
+    """Runs real commits: entries are only handed over when a transaction commits."""
+
+    def setUp(self):
+        self.receptionist = User.objects.create_user(
+            username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST,
+            first_name='Pam', last_name='Beesly'
+        )
+        self.doctors = [
+            DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology'
+            )
+            for i in range(2)
+        ]
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe',
+            date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.start = datetime(2030, 1, 7, 9, tzinfo=ZoneInfo('UTC'))
+        AuditEntry.objects.all().delete()
+        self.client.force_authenticate(user=self.receptionist)
+
+    def audit_inserts(self, queries):
+        return [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "bookings_auditentry"')]
+
+    def test_booking_lifecycle_with_diffs_and_actor(self):
+        response = self.client.post(reverse('booking-list'), {
+            'patient': self.patient.pk, 'doctor': self.doctors[0].pk,
+            'scheduled_at': self.start.isoformat(), 'notes': 'First visit', 'total': '100.00',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = reverse('booking-detail', args=[response.data['id']])
+        self.client.patch(url, {'notes': 'Follow-up', 'total': '120.00'}, format='json')
+        # Saving without changes leaves no entry
+        self.client.patch(url, {'notes': 'Follow-up'}, format='json')
+        self.client.delete(url)
+
+        deleted, updated, created = AuditEntry.objects.filter(object_id=response.data['id'], model='booking')
+        self.assertEqual(created.action, AuditEntry.CREATED)
+        self.assertEqual(created.changes['notes'], [None, 'First visit'])
+        self.assertEqual(created.changes['doctor'], [None, self.doctors[0].pk])
+        self.assertEqual(updated.action, AuditEntry.UPDATED)
+        self.assertEqual(updated.changes, {'notes': ['First visit', 'Follow-up'], 'total': ['100.00', '120.00']})
+        self.assertEqual(deleted.action, AuditEntry.DELETED)
+        self.assertEqual(deleted.changes['notes'], ['Follow-up', None])
+        self.assertEqual({created.actor_id, updated.actor_id, deleted.actor_id}, {self.receptionist.pk})
+
+    def test_one_insert_per_request(self):
+        items = [
+            {'patient': self.patient.pk, 'doctor': self.doctors[0].pk,
+             'scheduled_at': (self.start + timedelta(hours=i)).isoformat()}
+            for i in range(3)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('booking-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self.audit_inserts(queries)), 1)
+        self.assertEqual(AuditEntry.objects.filter(action=AuditEntry.CREATED, model='booking').count(), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(reverse('booking-bulk'), [
+                {'id': row['id'], 'notes': 'moved'} for row in response.data
+            ], format='json')
+        self.assertEqual(len(self.audit_inserts(queries)), 1)
+        self.assertEqual(
+            list(AuditEntry.objects.filter(action=AuditEntry.UPDATED).values_list('changes', flat=True)),
+            [{'notes': ['', 'moved']}] * 3,
+        )
+
+    def test_asgi_requests_are_buffered_too(self):
+        response = async_to_sync(AsyncClient().patch)(
+            reverse('patient-detail', args=[self.patient.pk]), {'last_name': 'Roe'},
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.receptionist)}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        entry = AuditEntry.objects.get()
+        self.assertEqual(entry.changes, {'last_name': ['Doe', 'Roe']})
+        self.assertEqual(entry.actor_id, self.receptionist.pk)
+
+    def test_rolled_back_writes_are_not_recorded(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.patient.first_name = 'Jon'
+            self.patient.save()
+            raise RuntimeError
+        self.assertFalse(AuditEntry.objects.exists())
+        self.patient.refresh_from_db()
+        self.patient.first_name = 'Johnny'
+        self.patient.save()
+        entry = AuditEntry.objects.get()
+        self.assertEqual(entry.changes, {'first_name': ['John', 'Johnny']})
+        # Outside a request there is no actor
+        self.assertIsNone(entry.actor_id)
+
+    def test_failed_insert_is_retried_by_a_job(self):
+        with mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=DatabaseError('disk I/O error')), \
+                self.assertLogs('bookings.audit', 'WARNING'):
+            response = self.client.patch(
+                reverse('patient-detail', args=[self.patient.pk]), {'last_name': 'Roe'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(AuditEntry.objects.exists())
+        queued = Job.objects.get(name='bookings.write_audit_entries', status=Job.QUEUED)
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.DONE)
+        entry = AuditEntry.objects.get()
+        self.assertEqual((entry.model, entry.object_id, entry.action), ('patient', self.patient.pk, AuditEntry.UPDATED))
+        self.assertEqual(entry.changes, {'last_name': ['Doe', 'Roe']})
+        self.assertEqual(entry.actor_id, self.receptionist.pk)
+
+    def test_merge_records_moved_bookings(self):
+        duplicate = Patient.objects.create(
+            first_name='Jon', last_name='Doe', date_of_birth='1990-01-01', email='jon@example.com'
+        )
+        booking = Booking.objects.create(patient=duplicate, doctor=self.doctors[0], scheduled_at=self.start)
+        AuditEntry.objects.all().delete()
+        merge_patients(self.patient.pk, [duplicate.pk])
+        moved = AuditEntry.objects.get(model='booking', object_id=booking.pk)
+        self.assertEqual(moved.changes, {'patient': [duplicate.pk, self.patient.pk]})
+        self.assertTrue(AuditEntry.objects.filter(
+            model='patient', object_id=duplicate.pk, action=AuditEntry.DELETED
+        ).exists())
+
+    def test_trail_endpoint(self):
+        booking = Booking.objects.create(patient=self.patient, doctor=self.doctors[0], scheduled_at=self.start)
+        for notes in ('a', 'b', 'c'):
+            booking.notes = notes
+            booking.save()
+        url = reverse('booking-audit', args=[booking.pk])
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['changes'].get('notes') for row in response.data['results']], [['b', 'c'], ['a', 'b']])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['action'] for row in response.data['results']], ['updated', 'created'])
+
+        self.client.patch(reverse('patient-detail', args=[self.patient.pk]), {'email': 'jd@example.com'}, format='json')
+        response = self.client.get(reverse('patient-audit', args=[self.patient.pk]))
+        row, = response.data['results']
+        self.assertEqual(row['changes'], {'email': ['john@example.com', 'jd@example.com']})
+        self.assertEqual(row['actor_name'], 'Pam Beesly')
+
+        # Doctors only see the trail of their own bookings
+        self.client.force_authenticate(user=self.doctors[1].user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookingConcurrencyTest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(user=User.objects.create_user(
+            username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST
+        ))
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doctor1', password='testpass123', role=User.ROLE_DOCTOR),
+            main_specialty='Cardiology'
+        )
+        self.patient = Patient.objects.create(
+            first_name='John', last_name='Doe', date_of_birth='1990-01-01', email='john@example.com'
+        )
+        self.booking = Booking.objects.create(
+            patient=self.patient, doctor=self.doctor, scheduled_at=datetime(2030, 1, 7, 9, tzinfo=ZoneInfo('UTC'))
+        )
+        self.url = reverse('booking-detail', args=[self.booking.pk])
+
+    def test_stale_instance_cannot_overwrite(self):
+        first = Booking.objects.get(pk=self.booking.pk)
+        second = Booking.objects.get(pk=self.booking.pk)
+        first.notes = 'first'
+        first.save()
+        self.assertEqual(first.version, 2)
+        second.notes = 'second'
+        with self.assertRaises(VersionConflict):
+            second.save()
+        self.assertEqual(second.version, 1)
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).notes, 'first')
+
+    def test_update_is_one_conditional_statement(self):
+        self.booking.notes = 'checked'
+        with CaptureQueriesContext(connection) as queries:
+            self.booking.save(update_fields=['notes'])
+        update, = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "bookings_booking"')]
+        self.assertIn('"version" = 2', update)
+        self.assertIn('"bookings_booking"."version" = 1', update)
+
+    def test_if_match(self):
+        response = self.client.get(self.url)
+        tag = response['ETag']
+        self.assertEqual(tag, '"1"')
+        self.assertEqual(response.data['version'], 1)
+
+        response = self.client.patch(self.url, {'notes': 'a'}, format='json', HTTP_IF_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+
+        response = self.client.patch(self.url, {'notes': 'b'}, format='json', HTTP_IF_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response.data['detail'].code, 'precondition_failed')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.notes, 'a')
+
+        # "*" and lists of tags are understood; weak tags never match
+        for header, expected in (('*', 200), ('W/"3"', 412), ('"7", "3"', 200)):
+            response = self.client.patch(self.url, {'notes': header}, format='json', HTTP_IF_MATCH=header)
+            self.assertEqual(response.status_code, expected, header)
+
+    def test_race_between_read_and_write_is_412(self):
+        original = Booking.save
+
+        def concurrent_write(booking, *args, **kwargs):
+            # Another request commits first
+            Booking.objects.filter(pk=booking.pk).update(notes='theirs', version=F('version') + 1)
+            return original(booking, *args, **kwargs)
+
+        with mock.patch.object(Booking, 'save', concurrent_write):
+            response = self.client.patch(self.url, {'notes': 'mine', 'duration_minutes': 60}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        # Nothing of ours was written (the simulated writer shares our
+        # transaction here, so it is rolled back too)
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.notes, self.booking.version), ('', 1))
+        self.assertEqual(self.booking.duration_minutes, 30)
+        # The slot keys were rolled back with the failed write
+        self.assertEqual(BookingSlot.objects.filter(booking=self.booking).count(), 6)
+
+    def test_bulk_update_bumps_version(self):
+        response = self.client.patch(reverse('booking-bulk'), [{'id': self.booking.pk, 'notes': 'x'}], format='json')
+        self.assertEqual(response.data[0]['version'], 2)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.version, 2)
+
+    def test_bulk_update_checks_versions(self):
+        other = Booking.objects.create(
+            patient=self.patient, doctor=self.doctor, scheduled_at=datetime(2030, 1, 7, 11, tzinfo=ZoneInfo('UTC'))
+        )
+        url = reverse('booking-bulk')
+        response = self.client.patch(url, [
+            {'id': self.booking.pk, 'notes': 'x', 'version': 1},
+            {'id': other.pk, 'notes': 'y', 'version': 3},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('version', response.data[1])
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.notes, self.booking.version), ('', 1))
+
+        response = self.client.patch(url, [{'id': other.pk, 'version': 'abc'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('version', response.data[0])
+
+        response = self.client.patch(url, [{'id': other.pk, 'notes': 'y', 'version': '1'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['version'], 2)
+
+    def test_bulk_update_race_is_412(self):
+        original = BookingViewSet.validate_batch
+
+        def concurrent_write(viewset, valid):
+            # Another request commits between our read and our write
+            Booking.objects.filter(pk=self.booking.pk).update(notes='theirs', version=F('version') + 1)
+            return original(viewset, valid)
+
+        with mock.patch.object(BookingViewSet, 'validate_batch', concurrent_write):
+            response = self.client.patch(
+                reverse('booking-bulk'), [{'id': self.booking.pk, 'notes': 'mine'}], format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        # The batch was rolled back (with the simulated writer, which shares our transaction)
+        self.booking.refresh_from_db()
+        self.assertEqual((self.booking.notes, self.booking.version), ('', 1))
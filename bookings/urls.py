@@ -1,11 +1,29 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
-from .views import BookingViewSet, PatientViewSet, PublicBookingCreateAPIView
+from .views import (
+    BookingViewSet, ArchivedBookingViewSet, PatientViewSet, PublicBookingCreateAPIView, DoctorAvailabilityView,
+    NextAvailableView, SlotHoldCreateAPIView, SlotHoldReleaseAPIView, SlotHoldConfirmAPIView,
+    RevenueReportView,
+)
+from .async_views import AsyncDoctorAvailabilityView, BookingEventStreamView
 
 router = DefaultRouter()
 router.register(r'patients', PatientViewSet)
 router.register(r'bookings', BookingViewSet)
+router.register(r'archived-bookings', ArchivedBookingViewSet)
 
-urlpatterns = router.urls + [
+urlpatterns = [
+    # Before the router so "events" is not taken for a booking id
+    path('bookings/events/', BookingEventStreamView.as_view(), name='booking_events'),
+] + router.urls + [
     path('public-create/', PublicBookingCreateAPIView.as_view(), name='public_booking_create'),
+    path('availability/<int:doctor_id>/', DoctorAvailabilityView.as_view(), name='doctor_availability'),
+    path('next-available/', NextAvailableView.as_view(), name='next_available'),
+    path('holds/', SlotHoldCreateAPIView.as_view(), name='slot_hold_create'),
+    path('holds/<uuid:token>/', SlotHoldReleaseAPIView.as_view(), name='slot_hold_release'),
+    path('holds/<uuid:token>/confirm/', SlotHoldConfirmAPIView.as_view(), name='slot_hold_confirm'),
+    path('reports/revenue/', RevenueReportView.as_view(), name='revenue_report'),
+    # Native async variant for ASGI deployments
+    path('async/availability/<int:doctor_id>/', AsyncDoctorAvailabilityView.as_view(),
+         name='doctor_availability_async'),
 ]
\ No newline at end of file
@@ -1,32 +1,498 @@
-from rest_framework import viewsets, permissions,generics,serializers
-from .models import Patient, Booking
-from .serializers import PatientSerializer, BookingSerializer, PublicBookingSerializer
+from rest_framework import viewsets, permissions,generics,serializers,status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.views import APIView
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
-class PatientViewSet(viewsets.ModelViewSet):
+from core.concurrency import OptimisticConcurrencyMixin
+from profiles.models import DoctorProfile, Specialty
+from .models import Patient, Booking, ArchivedBooking, AuditEntry, BookingSlot, SlotHold, default_duration
+from .serializers import (
+    SlotConflict,
+    PatientSerializer,
+    PatientBulkSerializer,
+    PatientLookupSerializer,
+    PatientSearchQuerySerializer,
+    PatientMergeSerializer,
+    PatientHistoryBookingSerializer,
+    BookingSerializer,
+    ArchivedBookingSerializer,
+    PublicBookingSerializer,
+    AvailabilityQuerySerializer,
+    NextAvailableQuerySerializer,
+    NextAvailableDoctorSerializer,
+    SlotHoldSerializer,
+    BookingCalendarSerializer,
+    CalendarQuerySerializer,
+    ExportQuerySerializer,
+    RevenueReportQuerySerializer,
+    RevenueRowSerializer,
+)
+from .export import streaming_export_response
+from .filters import ArchivedBookingFilter, BookingFilter
+from .availability import doctor_availability, queue_next_slot_refresh
+from .bulk import BulkWriteMixin, to_pk
+from .revenue import RevenueDelta, revenue_report
+from .search import typeahead
+from .dedupe import merge_patients
+from . import audit
+from . import cache as history_cache
+from . import events as booking_events
+from .audit import AuditTrailMixin
+from .idempotency import IdempotentCreateMixin
+from .pagination import BookingPagination, PatientPagination
+from .signals import bulk_deleting
+
+class PatientViewSet(AuditTrailMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """
-    CRUD API for Patients.
+    CRUD API for Patients, plus batch writes at /api/patients/bulk/ and the
+    audit trail at /api/patients/<id>/audit/.
     """
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
+    bulk_serializer_class = PatientBulkSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PatientPagination
+
+    def validate_batch(self, valid):
+        # One query for every email in the batch instead of one per item
+        claimed = {}
+        errors = {}
+        for index, (instance, data) in valid.items():
+            email = data.get('email', instance.email if instance else None)
+            if email in claimed:
+                errors[index] = {'email': ['Duplicate email in batch.']}
+            claimed.setdefault(email, index)
+        batch_ids = [instance.pk for instance, _ in valid.values() if instance]
+        taken = Patient.objects.filter(email__in=claimed).exclude(pk__in=batch_ids)
+        for email in taken.values_list('email', flat=True):
+            errors.setdefault(claimed[email], {'email': ['patient with this email already exists.']})
+        return errors
+
+    def perform_bulk_create(self, validated):
+        patients = [Patient(**data) for data in validated]
+        for patient in patients:
+            patient.update_search_keys()
+        Patient.objects.bulk_create(patients)
+        for patient in patients:
+            audit.record(AuditEntry.CREATED, patient, after=audit.snapshot(patient))
+        return patients
+
+    def apply_update(self, instance, validated_data):
+        fields = super().apply_update(instance, validated_data)
+        instance.update_search_keys()
+        return fields | set(Patient.SEARCH_KEY_FIELDS)
+
+    def perform_bulk_update(self, valid):
+        before = {instance.pk: audit.snapshot(instance) for instance, _ in valid}
+        instances = super().perform_bulk_update(valid)
+        history_cache.invalidate(*(instance.pk for instance in instances))
+        for instance in instances:
+            audit.record(AuditEntry.UPDATED, instance, before[instance.pk], audit.snapshot(instance))
+        return instances
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        GET /api/patients/search/?q=doe jo[&limit=10]
+        Typeahead by name prefix (either order), email prefix or date of birth.
+        """
+        params = PatientSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        patients = typeahead(
+            params.validated_data['q'], params.validated_data['limit'], self.get_queryset()
+        )
+        return Response(PatientLookupSerializer(patients, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """
+        GET /api/patients/<id>/history/
+        The patient plus a keyset-paginated page of their bookings, newest
+        first, with doctor details. Two queries on a cache miss; doctors
+        only see their own bookings.
+        """
+        # Canonical id, so "05" and "5" share the version that writes bump
+        patient_id = to_pk(Patient, pk)
+        if patient_id is None:
+            raise NotFound()
+        doctor_id = DoctorProfile.objects.filter(user=request.user).values_list('pk', flat=True).first()
+        key = history_cache.cache_key(request, patient_id, doctor_id or 'all')
+        data = history_cache.get_page(key)
+        if data is None:
+            patient = self.get_object()
+            bookings = patient.bookings.select_related('doctor__user')
+            if doctor_id is not None:
+                bookings = bookings.filter(doctor_id=doctor_id)
+            paginator = BookingPagination()
+            page = paginator.paginate_queryset(bookings, request, view=self)
+            data = {
+                'patient': PatientSerializer(patient).data,
+                **paginator.get_paginated_response(
+                    PatientHistoryBookingSerializer(page, many=True).data
+                ).data,
+            }
+            history_cache.store_page(key, data)
+        return Response(data)
+
+    @action(detail=True, methods=['post'])
+    def merge(self, request, pk=None):
+        """
+        POST /api/patients/<id>/merge/  {"duplicates": [ids]}
+        Moves the duplicates' bookings to this patient and deletes them.
+        """
+        survivor = self.get_object()
+        params = PatientMergeSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        ids = set(params.validated_data['duplicates']) - {survivor.pk}
+        if not ids:
+            raise serializers.ValidationError({'duplicates': ['Nothing to merge.']})
+        missing = ids - set(self.get_queryset().filter(pk__in=ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError({
+                'duplicates': [f'Unknown patient id(s): {sorted(missing)}.']
+            })
+        moved = merge_patients(survivor.pk, sorted(ids))
+        survivor.refresh_from_db()
+        return Response({
+            'patient': PatientSerializer(survivor).data,
+            'merged': sorted(ids),
+            'moved_bookings': moved,
+        })
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(OptimisticConcurrencyMixin, AuditTrailMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """
-    CRUD API for Booking.
+    CRUD API for Booking, plus batch writes at /api/bookings/bulk/ and the
+    audit trail at /api/bookings/<id>/audit/. Single-booking responses carry
+    an ETag; send it back in If-Match on PUT/PATCH to get a 412 instead of
+    overwriting a concurrent change.
+    List filters: ?doctor=, ?patient=, ?from=, ?to= (ISO datetimes).
     """
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = BookingPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = BookingFilter
+    bulk_conflict_exception = SlotConflict
 
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
         # If doctor, only their bookings
-        if hasattr(user, 'doctor_profile'):
-            return self.queryset.filter(doctor__user=user)
+        if hasattr(user, 'doctorprofiles'):
+            return queryset.filter(doctor__user=user)
         # If receptionist or superuser, see all bookings
-        return self.queryset
+        return queryset
+
+    def validate_batch(self, valid):
+        """
+        Reject items that overlap an existing booking or another item of the
+        batch, reading the doctors' slot keys for the whole span in one query.
+        """
+        claims = {}
+        errors = {}
+        for index, (instance, data) in valid.items():
+            # Updates fall back to the stored values for fields they leave out
+            booking = Booking(
+                doctor_id=data['doctor'].pk if 'doctor' in data else instance.doctor_id,
+                scheduled_at=data.get('scheduled_at') or instance.scheduled_at,
+                duration_minutes=data.get('duration_minutes') or (
+                    instance.duration_minutes if instance else default_duration()
+                ),
+            )
+            booking.update_ends_at()
+            for key in booking.slot_keys():
+                owner = claims.setdefault((key.doctor_id, key.starts_at), index)
+                if owner != index:
+                    errors[index] = {'non_field_errors': [SlotConflict.default_detail]}
+        if not claims:
+            return errors
+
+        batch_ids = [instance.pk for instance, _ in valid.values() if instance]
+        cells = [cell for _, cell in claims]
+        taken = BookingSlot.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in claims},
+            starts_at__gte=min(cells),
+            starts_at__lte=max(cells),
+        ).exclude(booking_id__in=batch_ids).values_list('doctor_id', 'starts_at')
+        for claim in taken:
+            if claim in claims:
+                errors.setdefault(claims[claim], {'non_field_errors': [SlotConflict.default_detail]})
+        return errors
+
+    def perform_bulk_create(self, validated):
+        bookings = [Booking(**data) for data in validated]
+        for booking in bookings:
+            booking.update_ends_at()
+        Booking.objects.bulk_create(bookings)
+        BookingSlot.objects.bulk_create([key for booking in bookings for key in booking.slot_keys()])
+        revenue = RevenueDelta()
+        for booking in bookings:
+            revenue.add(booking.doctor_id, booking.scheduled_at, booking.total)
+        revenue.apply()
+        history_cache.invalidate(*{booking.patient_id for booking in bookings})
+        for doctor_id in {booking.doctor_id for booking in bookings}:
+            queue_next_slot_refresh(doctor_id)
+        booking_events.publish(*(booking_events.booking_event(booking_events.CREATED, b) for b in bookings))
+        for booking in bookings:
+            audit.record(AuditEntry.CREATED, booking, after=audit.snapshot(booking))
+        return bookings
+
+    def apply_update(self, instance, validated_data):
+        fields = super().apply_update(instance, validated_data)
+        instance.update_ends_at()
+        return fields | {'ends_at'}
+
+    def perform_bulk_update(self, valid):
+        moved = []
+        revenue = RevenueDelta()
+        repriced = []
+        for instance, data in valid:
+            if data.keys() & {'doctor', 'scheduled_at', 'duration_minutes'}:
+                queue_next_slot_refresh(instance.doctor_id)
+                moved.append(instance)
+            if data.keys() & {'doctor', 'scheduled_at', 'total'}:
+                revenue.remove(instance.doctor_id, instance.scheduled_at, instance.total)
+                repriced.append(instance)
+        patient_ids = {instance.patient_id for instance, _ in valid}
+        previous = {instance.pk: (instance.doctor_id, instance.scheduled_at) for instance, _ in valid}
+        before = {instance.pk: audit.snapshot(instance) for instance, _ in valid}
+        instances = super().perform_bulk_update(valid)
+        for instance in instances:
+            audit.record(AuditEntry.UPDATED, instance, before[instance.pk], audit.snapshot(instance))
+        booking_events.publish(*(
+            booking_events.booking_event(booking_events.UPDATED, instance, previous[instance.pk])
+            for instance in instances
+        ))
+        history_cache.invalidate(*patient_ids, *(instance.patient_id for instance in instances))
+        for instance in repriced:
+            revenue.add(instance.doctor_id, instance.scheduled_at, instance.total)
+        revenue.apply()
+        if moved:
+            # Slot keys of moved bookings are replaced wholesale
+            BookingSlot.objects.filter(booking__in=moved).delete()
+            BookingSlot.objects.bulk_create([key for booking in moved for key in booking.slot_keys()])
+            for doctor_id in {booking.doctor_id for booking in moved}:
+                queue_next_slot_refresh(doctor_id)
+        return instances
+
+    def perform_bulk_destroy(self, queryset):
+        bookings = list(queryset)
+        revenue = RevenueDelta()
+        for booking in bookings:
+            revenue.remove(booking.doctor_id, booking.scheduled_at, booking.total)
+            audit.record(AuditEntry.DELETED, booking, audit.snapshot(booking))
+        booking_events.publish(*(booking_events.booking_event(booking_events.DELETED, b) for b in bookings))
+        # The per-row delete receivers would each write the rollup on their own
+        with bulk_deleting():
+            Booking.objects.filter(pk__in=[booking.pk for booking in bookings]).delete()
+        revenue.apply()
+        history_cache.invalidate(*{booking.patient_id for booking in bookings})
+        for doctor_id in {booking.doctor_id for booking in bookings}:
+            queue_next_slot_refresh(doctor_id)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        GET /api/bookings/calendar/?from=&to=[&doctor=]
+        Compact, unpaginated rows for a week/month view, oldest first.
+        """
+        params = CalendarQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        bookings = (
+            self.filter_queryset(self.get_queryset())
+            .select_related('patient')
+            .only(
+                'id', 'doctor_id', 'scheduled_at', 'ends_at',
+                'patient__id', 'patient__first_name', 'patient__last_name',
+            )
+            .order_by('scheduled_at', 'id')
+        )
+        return Response(BookingCalendarSerializer(bookings, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        GET /api/bookings/export/?type=csv|ndjson[&from=&to=&doctor=&patient=]
+        Streams every matching booking, oldest first, without pagination.
+        """
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return streaming_export_response(
+            self.filter_queryset(self.get_queryset()), params.validated_data['type'],
+            asynchronous=isinstance(request._request, ASGIRequest),
+        )
     
-class PublicBookingCreateAPIView(generics.CreateAPIView):
+class ArchivedBookingViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only API over bookings moved to the archive by archive_bookings.
+    Same filters and pagination as /api/bookings/.
+    """
+    queryset = ArchivedBooking.objects.all()
+    serializer_class = ArchivedBookingSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = BookingPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ArchivedBookingFilter
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = super().get_queryset()
+        # Doctors only see their own bookings
+        if hasattr(user, 'doctorprofiles'):
+            return queryset.filter(doctor__user=user)
+        return queryset
+
+
+class PublicBookingCreateAPIView(IdempotentCreateMixin, generics.CreateAPIView):
+    """
+    Public booking form. Send an ``Idempotency-Key`` header so retried
+    submits return the original booking instead of creating another one.
+    """
+    idempotency_scope = 'public_booking'
     queryset = Booking.objects.all()
     serializer_class = PublicBookingSerializer
-    permission_classes = [permissions.AllowAny]  # Anyone can create
\ No newline at end of file
+    permission_classes = [permissions.AllowAny]  # Anyone can create
+
+
+class HoldExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The slot hold has expired.'
+    default_code = 'hold_expired'
+
+
+class SlotHoldCreateAPIView(generics.CreateAPIView):
+    """
+    POST /api/holds/  {doctor, starts_at}  →  {token, ..., expires_at}
+    """
+    queryset = SlotHold.objects.all()
+    serializer_class = SlotHoldSerializer
+    permission_classes = [permissions.AllowAny]
+
+
+class SlotHoldReleaseAPIView(generics.DestroyAPIView):
+    """
+    DELETE /api/holds/<token>/  releases a hold early.
+    """
+    queryset = SlotHold.objects.all()
+    serializer_class = SlotHoldSerializer
+    permission_classes = [permissions.AllowAny]
+    lookup_field = 'token'
+
+
+class SlotHoldConfirmAPIView(APIView):
+    """
+    POST /api/holds/<token>/confirm/  {patient, notes, total}
+    Turns a live hold into a booking for the held doctor and time.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, token):
+        hold = get_object_or_404(SlotHold, token=token)
+        if hold.is_expired:
+            hold.delete()
+            raise HoldExpired()
+        data = {
+            key: request.data[key] for key in ('patient', 'notes', 'total') if key in request.data
+        }
+        data.update({'doctor': hold.doctor_id, 'scheduled_at': hold.starts_at})
+        serializer = PublicBookingSerializer(data=data, context={'request': request, 'hold': hold})
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+            hold.delete()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class DoctorAvailabilityView(APIView):
+    """
+    GET /api/availability/<doctor_id>/?start=YYYY-MM-DD&end=YYYY-MM-DD[&tz=Area/City]
+    Free appointment slots of an active doctor, grouped by day.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, doctor_id):
+        doctor = get_object_or_404(DoctorProfile.objects.only('id'), pk=doctor_id, is_active=True)
+        params = AvailabilityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start, end = params.validated_data['start'], params.validated_data['end']
+        tz = params.validated_data.get('tz')
+
+        slots = doctor_availability(doctor.pk, start, end)
+        return Response(self.build_payload(doctor.pk, start, end, tz, slots))
+
+    @staticmethod
+    def build_payload(doctor_id, start, end, tz, slots):
+        days = {}
+        for slot_start, slot_end in slots:
+            if tz is not None:
+                slot_start, slot_end = slot_start.astimezone(tz), slot_end.astimezone(tz)
+            days.setdefault(slot_start.date().isoformat(), []).append({
+                'start': slot_start.isoformat(),
+                'end': slot_end.isoformat(),
+            })
+        return {
+            'doctor': doctor_id,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'slot_minutes': settings.APPOINTMENT_SLOT_MINUTES,
+            'days': [{'date': day, 'slots': day_slots} for day, day_slots in days.items()],
+        }
+
+
+class NextAvailableView(APIView):
+    """
+    GET /api/next-available/?specialty=Cardiology[&tiebreak=rating,experience][&limit=10]
+    Doctors of a specialty ordered by their earliest free slot, read from the
+    precomputed DoctorNextSlot index.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = NextAvailableQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        specialty = params.validated_data['specialty']
+
+        has_specialty = Exists(Specialty.objects.filter(
+            doctors=OuterRef('pk'), name__iexact=specialty
+        ))
+        doctors = (
+            DoctorProfile.objects.filter(is_active=True, next_slot__starts_at__gte=timezone.now())
+            .filter(Q(main_specialty__iexact=specialty) | has_specialty)
+            .select_related('user', 'next_slot')
+            .order_by('next_slot__starts_at', *params.validated_data['tiebreak'], 'id')
+        )[:params.validated_data['limit']]
+        return Response(NextAvailableDoctorSerializer(doctors, many=True).data)
+
+
+class RevenueReportView(APIView):
+    """
+    GET /api/reports/revenue/?period=day|month|year[&start=YYYY-MM-DD&end=YYYY-MM-DD][&doctor=]
+    Bookings and revenue per doctor per period, answered from the
+    DoctorDailyRevenue rollup. Doctors only see their own figures.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = RevenueReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        doctor_id = data.get('doctor')
+        profile = DoctorProfile.objects.filter(user=request.user).only('id').first()
+        if profile is not None:
+            doctor_id = profile.pk
+        rows = revenue_report(data['start'], data['end'], data['period'], doctor_id)
+        return Response({
+            'period': data['period'],
+            'start': data['start'].isoformat(),
+            'end': data['end'].isoformat(),
+            'results': RevenueRowSerializer(rows, many=True).data,
+        })
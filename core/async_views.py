@@ -0,0 +1,69 @@
+"""
+Async counterpart of DRF's APIView for public read endpoints.
+
+DRF views are synchronous: under ASGI every request to one occupies a
+worker thread from start to finish, including the time spent waiting on
+a slow client. Views built on AsyncAPIView are native Django async views
+that run on the event loop and fetch data with the async ORM, while still
+using DRF for everything that does not touch the database: the request is
+wrapped in a DRF ``Request`` (``query_params``, filter backends,
+paginators), serializers validate input and shape output, and errors are
+rendered like DRF's.
+
+Only read-only endpoints belong here. Views are anonymous unless
+``authentication_required`` is set, in which case the default DRF
+authentication classes run (in a thread, they may query the database) and
+unauthenticated requests get a 401; no permission or throttle classes are
+run.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+class AsyncAPIView(View):
+    http_method_names = ['get', 'head', 'options']
+    renderer_class = JSONRenderer
+    authentication_required = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        authenticators = (
+            [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            if self.authentication_required else []
+        )
+        self.request = Request(request, authenticators=authenticators)
+        try:
+            if self.authentication_required:
+                await sync_to_async(self.check_authentication)()
+            return await super().dispatch(self.request, *args, **kwargs)
+        except Http404:
+            return self.render({'detail': exceptions.NotFound.default_detail}, status.HTTP_404_NOT_FOUND)
+        except exceptions.APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            headers = None
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)) and authenticators:
+                headers = {'WWW-Authenticate': authenticators[0].authenticate_header(self.request)}
+            return self.render(data, exc.status_code, headers=headers)
+
+    def check_authentication(self):
+        if not self.request.user or not self.request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+
+    def validate_query(self, serializer_class):
+        """Validate ``query_params`` with a DRF serializer; returns ``validated_data``."""
+        params = serializer_class(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def render(self, data, status_code=status.HTTP_200_OK, headers=None):
+        renderer = self.renderer_class()
+        return HttpResponse(
+            renderer.render(data),
+            status=status_code,
+            content_type=renderer.media_type,
+            headers=headers,
+        )
@@ -0,0 +1,71 @@
+"""
+``ETag`` / ``If-Match`` support for views over VersionedModel objects.
+
+The object's ``version`` is its entity tag. Clients send the tag they last
+read back in ``If-Match`` when they write: a tag that is no longer current
+is rejected with 412 before anything is validated or written. A writer
+that commits between our read and our write is caught by the conditional
+UPDATE of VersionedModel.save(), which also ends in 412. Either way the
+client reloads and reapplies its change instead of silently overwriting
+someone else's. Requests without ``If-Match`` are still protected against
+the second case.
+"""
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import VersionConflict
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource was changed by someone else; reload it and retry.'
+    default_code = 'precondition_failed'
+
+
+def etag(instance):
+    return f'"{instance.version}"'
+
+
+def check_if_match(request, instance):
+    """Raise PreconditionFailed unless ``If-Match`` is absent, ``*`` or lists the current tag."""
+    header = request.headers.get('If-Match')
+    if header is None:
+        return
+    tags = parse_etags(header)
+    if '*' not in tags and etag(instance) not in tags:
+        raise PreconditionFailed()
+
+
+class OptimisticConcurrencyMixin:
+    """
+    For retrieve/update views: responses carry the object's ``ETag`` and
+    PUT/PATCH honour ``If-Match``. ``get_object()`` must return a
+    VersionedModel.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag(instance)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        check_if_match(request, instance)
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        try:
+            # Related writes of the serializer roll back with a lost race
+            with transaction.atomic():
+                self.perform_update(serializer)
+        except VersionConflict:
+            raise PreconditionFailed()
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
+        response = Response(serializer.data)
+        response['ETag'] = etag(serializer.instance)
+        return response
@@ -0,0 +1,164 @@
+"""
+Database-backed background job queue.
+
+Producers call ``enqueue()`` inside their own transaction, so a job exists
+exactly when the write that asked for it commits. Workers (``manage.py
+run_jobs``) claim due jobs in batches:
+
+* candidates are read with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+  backend supports it, so workers never wait on each other;
+* the claim itself is a compare-and-set UPDATE stamped with a per-batch
+  token. That is what keeps SQLite (no row locks) safe as well: two
+  workers may read the same candidates, but each row is only updated by
+  the first of them.
+
+A job still running after JOB_LEASE_SECONDS is assumed to belong to a dead
+worker and becomes claimable again. Failed jobs are retried with
+exponential backoff until ``max_attempts`` is reached.
+
+Job functions are registered with ``@job('app.name')`` in an ``jobs``
+module imported from the app's ``ready()``; they receive the payload as
+keyword arguments and run inside a transaction.
+"""
+import logging
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def job(name):
+    """Register the decorated function as the job called ``name``."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, run_at=None, unique_key='', max_attempts=None):
+    """
+    Queue a job; returns it, or None when ``unique_key`` matches a job that
+    is still waiting to run (that job will see the caller's writes anyway).
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown job {name!r}")
+    if unique_key and Job.objects.filter(unique_key=unique_key, status=Job.QUEUED).exists():
+        return None
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=run_at or timezone.now(),
+        unique_key=unique_key,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempt):
+    """Backoff before retry number ``attempt`` (1-based): base * 2^(attempt-1), capped."""
+    delay = settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+    return timedelta(seconds=min(delay, settings.JOB_RETRY_MAX_SECONDS))
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+
+
+def claim(batch_size, names=None):
+    """Claim up to ``batch_size`` due jobs for this worker, oldest first."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    claimable = _claimable(now)
+    with transaction.atomic():
+        candidates = Job.objects.filter(claimable)
+        if names:
+            candidates = candidates.filter(name__in=names)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.order_by('run_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        # Re-checking the claimable condition makes this a compare-and-set
+        Job.objects.filter(claimable, pk__in=ids).update(
+            status=Job.RUNNING,
+            lock_token=token,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(lock_token=token, status=Job.RUNNING).order_by('run_at', 'id'))
+
+
+def run_job(claimed):
+    """
+    Run one claimed job and record the outcome. Returns ``(succeeded,
+    seconds)``. Outcomes are only written while this worker still holds the
+    job's lease.
+    """
+    started = time.perf_counter()
+    try:
+        func = _registry[claimed.name]
+        with transaction.atomic():
+            func(**claimed.payload)
+    except Exception:
+        elapsed = time.perf_counter() - started
+        now = timezone.now()
+        exhausted = claimed.attempts >= claimed.max_attempts
+        logger.warning("Job %s #%s failed (attempt %s/%s)", claimed.name, claimed.pk,
+                       claimed.attempts, claimed.max_attempts, exc_info=True)
+        Job.objects.filter(pk=claimed.pk, lock_token=claimed.lock_token).update(
+            status=Job.FAILED if exhausted else Job.QUEUED,
+            run_at=now if exhausted else now + retry_delay(claimed.attempts),
+            finished_at=now if exhausted else None,
+            last_error=traceback.format_exc()[-5000:],
+            duration_ms=int(elapsed * 1000),
+            lock_token='',
+            locked_at=None,
+        )
+        return False, elapsed
+
+    elapsed = time.perf_counter() - started
+    Job.objects.filter(pk=claimed.pk, lock_token=claimed.lock_token).update(
+        status=Job.DONE,
+        finished_at=timezone.now(),
+        last_error='',
+        duration_ms=int(elapsed * 1000),
+        lock_token='',
+        locked_at=None,
+    )
+    return True, elapsed
+
+
+class JobStats:
+    """Per-job-name counters and timings collected by a worker run."""
+
+    def __init__(self):
+        self.by_name = {}
+
+    @property
+    def total(self):
+        return sum(entry['done'] + entry['failed'] for entry in self.by_name.values())
+
+    def record(self, name, succeeded, seconds):
+        entry = self.by_name.setdefault(name, {'done': 0, 'failed': 0, 'seconds': 0.0, 'max': 0.0})
+        entry['done' if succeeded else 'failed'] += 1
+        entry['seconds'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+
+    def lines(self):
+        for name, entry in sorted(self.by_name.items()):
+            runs = entry['done'] + entry['failed']
+            yield (
+                f"{name}: {entry['done']} done, {entry['failed']} failed, "
+                f"avg {entry['seconds'] / runs * 1000:.1f} ms, max {entry['max'] * 1000:.1f} ms"
+            )
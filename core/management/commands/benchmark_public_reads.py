@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.utils import timezone
+
+from profiles.models import DoctorProfile
+
+ENDPOINTS = ('doctors', 'specialties', 'availability')
+
+
+class Command(BaseCommand):
+    help = (
+        "Model the concurrent throughput of the public read endpoints: the "
+        "synchronous DRF views served by a fixed number of WSGI worker "
+        "threads against their native async variants on a single event loop "
+        "(one ASGI worker). Both modes are driven in-process by the same "
+        "--concurrency clients, each waiting --client-latency seconds of "
+        "simulated network time outside the server before its request. This "
+        "is a model, not a measurement of a deployment: no real server, "
+        "socket or proxy is involved. Run it against a database with some "
+        "doctors and timetables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and mode (default: 200).")
+        parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients (default: 50).")
+        parser.add_argument('--workers', type=int, default=4, help="WSGI worker threads (default: 4).")
+        parser.add_argument('--client-latency', type=float, default=0.05,
+                            help="Seconds of simulated client I/O per request (default: 0.05).")
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=ENDPOINTS,
+                            help="Endpoint to benchmark (repeatable; default: all).")
+        parser.add_argument('--host', default='localhost', help="Host header sent with every request.")
+
+    def handle(self, *args, **options):
+        paths = self.paths()
+        for name in options['endpoints'] or ENDPOINTS:
+            sync_path, async_path = paths[name]
+            wsgi = self.run_wsgi(sync_path, options)
+            asgi = asyncio.run(self.run_asgi(async_path, options))
+            ratio = asgi[0] / wsgi[0] if wsgi[0] else 0
+            self.stdout.write(
+                f"{name}: WSGI ({options['workers']} workers) {wsgi[0]:.1f} req/s, "
+                f"ASGI (1 worker) {asgi[0]:.1f} req/s, x{ratio:.1f}; "
+                f"errors {wsgi[1]}/{asgi[1]}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Modelled {len(options['endpoints'] or ENDPOINTS)} endpoint(s), "
+            f"{options['requests']} requests each, {options['concurrency']} concurrent clients "
+            f"with {options['client_latency']}s latency in both modes."
+        ))
+
+    def paths(self):
+        doctor_id = (
+            DoctorProfile.objects.filter(is_active=True).order_by('id').values_list('id', flat=True).first()
+        )
+        today = timezone.localdate()
+        query = f"?start={today}&end={today + timedelta(days=6)}"
+        availability = (
+            (f'/api/availability/{doctor_id}/{query}', f'/api/async/availability/{doctor_id}/{query}')
+            if doctor_id is not None else None
+        )
+        return {
+            'doctors': ('/api/profiles/doctors/', '/api/profiles/async/doctors/'),
+            'specialties': ('/api/profiles/specialties/', '/api/profiles/async/specialties/'),
+            'availability': availability,
+        }
+
+    def run_wsgi(self, path, options):
+        if path is None:
+            raise CommandError("Availability needs at least one active doctor.")
+        latency = options['client_latency']
+        workers = threading.BoundedSemaphore(max(1, options['workers']))
+
+        def request(_):
+            time.sleep(latency)
+            # Only --workers requests are served at a time
+            with workers:
+                return Client(HTTP_HOST=options['host']).get(path).status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as clients:
+            statuses = list(clients.map(request, range(options['requests'])))
+        return self.summarize(statuses, time.perf_counter() - started)
+
+    async def run_asgi(self, path, options):
+        client = AsyncClient(HTTP_HOST=options['host'])
+        clients = asyncio.Semaphore(max(1, options['concurrency']))
+
+        async def request():
+            async with clients:
+                await asyncio.sleep(options['client_latency'])
+                # Served on this one event loop
+                response = await client.get(path)
+                return response.status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return self.summarize(statuses, time.perf_counter() - started)
+
+    @staticmethod
+    def summarize(statuses, elapsed):
+        errors = sum(1 for code in statuses if code >= 400)
+        return len(statuses) / elapsed if elapsed else 0.0, errors
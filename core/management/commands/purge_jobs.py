@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Job
+
+
+class Command(BaseCommand):
+    help = "Delete finished background jobs older than --hours (failed ones only with --failed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="Keep jobs finished within this many hours.")
+        parser.add_argument('--failed', action='store_true', help="Also delete failed jobs.")
+
+    def handle(self, *args, **options):
+        statuses = [Job.DONE, Job.FAILED] if options['failed'] else [Job.DONE]
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        deleted, _ = Job.objects.filter(status__in=statuses, finished_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} finished job(s)."))
@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.jobs import JobStats, claim, run_job
+
+
+def _run_in_thread(claimed):
+    # Worker threads get their own connection; release it after each job
+    try:
+        return run_job(claimed)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued background jobs. Claims due jobs in batches, runs "
+        "them (optionally on several threads), retries failures with "
+        "backoff and prints per-job timing stats on exit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help="Jobs claimed per round (default: 10).")
+        parser.add_argument('--concurrency', type=int, default=1, help="Worker threads (default: 1).")
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due instead of polling.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds between polls of an empty queue.")
+        parser.add_argument('--max-jobs', type=int, help="Exit after running this many jobs.")
+        parser.add_argument('--name', action='append', dest='names', help="Only run jobs with this name (repeatable).")
+
+    def handle(self, *args, **options):
+        stats = JobStats()
+        concurrency = max(1, options['concurrency'])
+        pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        started = time.perf_counter()
+        try:
+            while True:
+                jobs = claim(options['batch_size'], options['names'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                results = pool.map(_run_in_thread, jobs) if pool else map(run_job, jobs)
+                for claimed, (succeeded, seconds) in zip(jobs, results):
+                    stats.record(claimed.name, succeeded, seconds)
+                if options['max_jobs'] and stats.total >= options['max_jobs']:
+                    break
+        except KeyboardInterrupt:
+            self.stderr.write("Interrupted; finishing.")
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+
+        for line in stats.lines():
+            self.stdout.write(line)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Ran {stats.total} job(s) in {elapsed:.2f}s."))
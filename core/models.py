@@ -0,0 +1,96 @@
+from django.db import models
+from django.utils import timezone
+
+
+
+class VersionConflict(Exception):
+    """The row was changed or deleted since the instance was loaded."""
+
+
+class VersionedModel(models.Model):
+    """
+    Abstract base for optimistic concurrency control. Saving an existing
+    row is a single ``UPDATE ... WHERE id = %s AND version = %s`` that also
+    bumps ``version``; if another writer got there first it matches no row
+    and VersionConflict is raised instead of overwriting their change. No
+    row locks are taken. Queryset ``update()`` bypasses the check; bump
+    the version there with ``F('version') + 1`` when clients' copies should
+    go stale.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'version'}
+        expected = self.version
+        self.version = expected + 1
+        self._expected_version = expected
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = expected
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        updated = super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update
+        )
+        if not updated:
+            raise VersionConflict(f"{self._meta.label} {pk_val} is no longer at version {expected}.")
+        return updated
+
+class Job(models.Model):
+    """
+    A unit of deferred work, run by the run_jobs worker (see core.jobs).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100, help_text="Registered job function")
+    payload = models.JSONField(default=dict, blank=True)
+    unique_key = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="While a job with this key is queued, enqueueing another is a no-op"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    lock_token = models.CharField(max_length=32, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Duration of the last run")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            # Claim scan: due queued jobs, oldest first
+            models.Index(fields=['status', 'run_at', 'id']),
+            models.Index(fields=['unique_key', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,178 @@
+"""
+Keyset ("seek") pagination shared by the list endpoints.
+
+DRF's CursorPagination only keys on the first ordering field and falls
+back to an OFFSET inside runs of equal values, which degrades on columns
+with many ties (ratings, last names). This paginator stores the values of
+every ordering field in the cursor and turns them into a lexicographic
+WHERE clause, so every page is a single indexed range scan with no
+OFFSET and no COUNT(*).
+
+The ordering must end in a unique field (normally ``id``) and the
+ordering columns must not be nullable. Cursor values are converted with the
+ordering fields' ``to_python()``, so a tampered cursor is a 404 instead of a
+database error.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # Subclasses set this; the last field must be unique
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = data['p'], bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_position(self, queryset, ordering, position):
+        """Convert the cursor values to the Python types of the ordering fields."""
+        cleaned = []
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            try:
+                model_field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Annotations such as the search rank
+                model_field = queryset.query.annotations[name].output_field
+            if value is None or isinstance(value, (dict, list)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(model_field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, instance, reverse):
+        position = [_encode_value(getattr(instance, field.lstrip('-'))) for field in self.ordering]
+        data = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def keyset_filter(self, ordering, position):
+        """
+        Build ``(a, b, c) > (va, vb, vc)`` for the given ordering, expanded
+        into OR'd prefixes so it works on every backend.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def invert(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset, reverse, has_cursor = self.page_queryset(queryset, request, view)
+        return self.set_page(list(page_queryset), reverse, has_cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` for async views, fetching through the async ORM."""
+        page_queryset, reverse, has_cursor = self.page_queryset(queryset, request, view)
+        return self.set_page([obj async for obj in page_queryset], reverse, has_cursor)
+
+    def page_queryset(self, queryset, request, view=None):
+        """Return the (lazy) queryset of the requested page plus its direction."""
+        self.request = request
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        self.ordering = self.get_ordering(request, queryset, view)
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = bool(cursor and cursor[1])
+        ordering = self.invert(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            position = self.clean_position(queryset, ordering, cursor[0])
+            queryset = queryset.filter(self.keyset_filter(ordering, position))
+
+        # One extra row tells us whether there is another page in this direction
+        return queryset[:page_size + 1], reverse, cursor is not None
+
+    def set_page(self, results, reverse, has_cursor):
+        page_size = self.get_page_size(self.request)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else has_cursor
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
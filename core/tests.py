@@ -0,0 +1,161 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
+from datetime import timedelta
+
+from .jobs import job, enqueue, claim, run_job, retry_delay
+from .models import Job
+
+calls = []
+
+
+@job('tests.record')
+def record(value=None):
+    calls.append(value)
+
+
+@job('tests.fail')
+def fail():
+    raise RuntimeError("boom")
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_BASE_SECONDS=10, JOB_RETRY_MAX_SECONDS=30, JOB_LEASE_SECONDS=60)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_unknown_job(self):
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
+
+    def test_unique_key_deduplicates_queued_jobs(self):
+        first = enqueue('tests.record', {'value': 1}, unique_key='k')
+        self.assertIsNotNone(first)
+        self.assertIsNone(enqueue('tests.record', {'value': 2}, unique_key='k'))
+        self.assertEqual(Job.objects.count(), 1)
+        # Once it has run, the key is free again
+        run_job(claim(10)[0])
+        self.assertIsNotNone(enqueue('tests.record', {'value': 3}, unique_key='k'))
+
+    def test_claim_is_exclusive_and_ordered(self):
+        now = timezone.now()
+        later = enqueue('tests.record', {'value': 'later'}, run_at=now - timedelta(seconds=1))
+        earlier = enqueue('tests.record', {'value': 'earlier'}, run_at=now - timedelta(seconds=5))
+        enqueue('tests.record', {'value': 'future'}, run_at=now + timedelta(hours=1))
+
+        claimed = claim(10)
+        self.assertEqual([j.pk for j in claimed], [earlier.pk, later.pk])
+        self.assertTrue(all(j.status == Job.RUNNING and j.attempts == 1 for j in claimed))
+        self.assertEqual(len({j.lock_token for j in claimed}), 1)
+        # A second worker finds nothing left to claim
+        self.assertEqual(claim(10), [])
+
+    def test_claim_filters_by_name(self):
+        enqueue('tests.record')
+        enqueue('tests.fail')
+        self.assertEqual([j.name for j in claim(10, ['tests.fail'])], ['tests.fail'])
+
+    def test_run_job_success(self):
+        enqueue('tests.record', {'value': 42})
+        succeeded, _ = run_job(claim(1)[0])
+        self.assertTrue(succeeded)
+        self.assertEqual(calls, [42])
+        done = Job.objects.get()
+        self.assertEqual(done.status, Job.DONE)
+        self.assertIsNotNone(done.finished_at)
+        self.assertIsNotNone(done.duration_ms)
+        self.assertEqual(done.lock_token, '')
+
+    def test_failure_retries_with_backoff_then_fails(self):
+        enqueue('tests.fail')
+        self.assertEqual(retry_delay(1), timedelta(seconds=10))
+        self.assertEqual(retry_delay(2), timedelta(seconds=20))
+        self.assertEqual(retry_delay(5), timedelta(seconds=30))
+
+        before = timezone.now()
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertFalse(run_job(claim(1)[0])[0])
+        failed = Job.objects.get()
+        self.assertEqual(failed.status, Job.QUEUED)
+        self.assertGreaterEqual(failed.run_at, before + timedelta(seconds=10))
+        self.assertIn('boom', failed.last_error)
+        # Not due yet
+        self.assertEqual(claim(1), [])
+
+        for _ in range(2):
+            Job.objects.update(run_at=timezone.now())
+            with self.assertLogs('core.jobs', 'WARNING'):
+                self.assertFalse(run_job(claim(1)[0])[0])
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, Job.FAILED)
+        self.assertEqual(failed.attempts, 3)
+        self.assertIsNotNone(failed.finished_at)
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(claim(1), [])
+
+    def test_stale_lease_is_reclaimed(self):
+        enqueue('tests.record', {'value': 'x'})
+        stuck = claim(1)[0]
+        self.assertEqual(claim(1), [])
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=61))
+        reclaimed = claim(1)[0]
+        self.assertEqual(reclaimed.pk, stuck.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+        # The dead worker's late outcome no longer applies
+        run_job(stuck)
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.status, Job.RUNNING)
+        self.assertTrue(run_job(reclaimed)[0])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_run_jobs_command(self):
+        for value in range(3):
+            enqueue('tests.record', {'value': value})
+        enqueue('tests.fail')
+        out = StringIO()
+        with self.assertLogs('core.jobs', 'WARNING'):
+            call_command('run_jobs', '--once', '--batch-size', '2', stdout=out)
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        output = out.getvalue()
+        self.assertIn('tests.record: 3 done, 0 failed', output)
+        self.assertIn('tests.fail: 0 done, 1 failed', output)
+        self.assertIn('Ran 4 job(s)', output)
+
+    def test_purge_jobs_command(self):
+        old = timezone.now() - timedelta(hours=48)
+        done = Job.objects.create(name='tests.record', status=Job.DONE, finished_at=old)
+        failed = Job.objects.create(name='tests.fail', status=Job.FAILED, finished_at=old)
+        recent = Job.objects.create(name='tests.record', status=Job.DONE, finished_at=timezone.now())
+
+        call_command('purge_jobs', stdout=StringIO())
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {failed.pk, recent.pk})
+        call_command('purge_jobs', '--failed', stdout=StringIO())
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertFalse(Job.objects.filter(pk=done.pk).exists())
+
+
+class AppJobsTest(TestCase):
+    def test_app_jobs_are_registered(self):
+        from .jobs import _registry
+        for name in ('bookings.refresh_next_slot', 'bookings.rebuild_revenue_rollup',
+                     'profiles.reindex_doctors', 'profiles.rebuild_search_index'):
+            self.assertIn(name, _registry)
+
+    def test_rebuild_revenue_rollup_job(self):
+        enqueue('bookings.rebuild_revenue_rollup')
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+
+class BenchmarkPublicReadsTest(TestCase):
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'benchmark_public_reads', '--endpoint', 'specialties', '--requests', '4',
+            '--workers', '2', '--client-latency', '0', stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn('specialties: WSGI (2 workers)', output)
+        self.assertIn('errors 0/0', output)
+        self.assertIn('Modelled 1 endpoint(s), 4 requests each, 50 concurrent clients', output)
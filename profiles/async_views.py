@@ -0,0 +1,59 @@
+"""
+Async variants of the public profile reads, for ASGI deployments (see
+core.async_views). They return the same payloads as their synchronous
+counterparts in profiles.views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from core.async_views import AsyncAPIView
+from . import cache as directory_cache
+from .models import Specialty
+from .serializers import SpecialtySerializer
+from .views import DoctorProfileListView
+
+
+class AsyncDoctorProfileListView(AsyncAPIView):
+    """
+    GET /api/profiles/async/doctors/ – DoctorProfileListView on the event
+    loop: same filters, ordering, keyset pages, response cache and ETags.
+    """
+    list_view_class = DoctorProfileListView
+
+    async def get(self, request):
+        key = await directory_cache.acache_key(request)
+        cached = await directory_cache.aget_page(key)
+        if cached is None:
+            data = await self.build_page(request)
+            etag = directory_cache.make_etag(JSONRenderer().render(data))
+            await directory_cache.astore_page(key, etag, data)
+        else:
+            etag, data = cached
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        return self.render(data, headers={'ETag': etag})
+
+    async def build_page(self, request):
+        # The sync view supplies queryset, filter backends, paginator and serializer
+        view = self.list_view_class(request=request, args=(), kwargs={}, format_kwarg=None)
+        paginator = view.paginator
+        queryset = view.get_queryset()
+        if set(request.query_params) - {paginator.cursor_query_param, paginator.page_size_query_param}:
+            # Search and filterset validation query the database synchronously
+            queryset = await sync_to_async(view.filter_queryset)(queryset)
+        page = await paginator.apaginate_queryset(queryset, request, view=view)
+        return paginator.get_paginated_response(view.get_serializer(page, many=True).data).data
+
+
+class AsyncSpecialtyListView(AsyncAPIView):
+    """GET /api/profiles/async/specialties/ – every specialty, by name."""
+
+    async def get(self, request):
+        specialties = [specialty async for specialty in Specialty.objects.order_by('name')]
+        return self.render(SpecialtySerializer(specialties, many=True).data)
@@ -0,0 +1,93 @@
+"""
+Response cache for the public doctor directory.
+
+Entries are keyed by a global directory version plus the normalized query
+string. Any write that can change a directory page bumps the version (see
+profiles.signals), which orphans every cached page at once; stale entries
+simply expire. Use a shared cache backend (CACHE_URL) when running more
+than one process so the version is shared too.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'doctor-directory:version'
+KEY_PREFIX = 'doctor-directory:page'
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(VERSION_KEY, version, timeout=None)
+    return version
+
+
+async def aget_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = 1
+        await cache.aadd(VERSION_KEY, version, timeout=None)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key missing (first write or evicted): any new value invalidates
+        cache.set(VERSION_KEY, get_version() + 1, timeout=None)
+
+
+def invalidate():
+    """
+    Invalidate now and again once the surrounding transaction commits, so a
+    page rendered from pre-commit data in between cannot stay cached.
+    """
+    bump_version()
+    transaction.on_commit(bump_version)
+
+
+def cache_key(request):
+    return _page_key(get_version(), request)
+
+
+async def acache_key(request):
+    return _page_key(await aget_version(), request)
+
+
+def _page_key(version, request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    # Host and path are part of the key because pagination links are absolute URLs
+    raw = json.dumps([request.get_host(), request.path, params], separators=(',', ':'))
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:{version}:{digest}'
+
+
+def make_etag(content):
+    return '"%s"' % hashlib.sha1(content).hexdigest()
+
+
+def get_page(key):
+    """Return the cached ``(etag, data)`` pair for ``key`` or None."""
+    return cache.get(key)
+
+
+async def aget_page(key):
+    return await cache.aget(key)
+
+
+def store_page(key, etag, data):
+    cache.set(key, (etag, data), timeout=settings.DOCTOR_DIRECTORY_CACHE_TIMEOUT)
+
+
+async def astore_page(key, etag, data):
+    await cache.aset(key, (etag, data), timeout=settings.DOCTOR_DIRECTORY_CACHE_TIMEOUT)
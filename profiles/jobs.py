@@ -0,0 +1,20 @@
+"""Background jobs of the profiles app (run by ``manage.py run_jobs``)."""
+from django.db import transaction
+
+from core.jobs import job
+
+from . import search
+from . import cache as directory_cache
+
+
+@job('profiles.reindex_doctors')
+def reindex_doctors(doctor_ids):
+    search.index_doctors(doctor_ids)
+    directory_cache.invalidate()
+
+
+@job('profiles.rebuild_search_index')
+def rebuild_search_index(batch_size=1000):
+    with transaction.atomic():
+        search.rebuild(batch_size=batch_size)
+        directory_cache.invalidate()
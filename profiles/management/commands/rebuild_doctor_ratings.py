@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from profiles import cache as directory_cache
+from profiles.models import DoctorProfile, DoctorReview
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating aggregates of every doctor from DoctorReview."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of profiles written per bulk_update (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # One grouped aggregate over the reviews table instead of one per doctor
+        totals = {
+            row['doctor_id']: (row['count'], row['total'])
+            for row in DoctorReview.objects.order_by()
+            .values('doctor_id')
+            .annotate(count=Count('id'), total=Sum('rating'))
+        }
+
+        updated = 0
+        batch = []
+        profiles = DoctorProfile.objects.only(
+            'id', 'rating_count', 'rating_sum', 'rating_average'
+        ).order_by('pk')
+        with transaction.atomic():
+            for profile in profiles.iterator(chunk_size=batch_size):
+                count, total = totals.get(profile.pk, (0, 0))
+                average = total / count if count else 0
+                if (profile.rating_count, profile.rating_sum, profile.rating_average) == (count, total, average):
+                    continue
+                profile.rating_count = count
+                profile.rating_sum = total
+                profile.rating_average = average
+                batch.append(profile)
+                if len(batch) >= batch_size:
+                    DoctorProfile.objects.bulk_update(
+                        batch, ['rating_count', 'rating_sum', 'rating_average']
+                    )
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                DoctorProfile.objects.bulk_update(
+                    batch, ['rating_count', 'rating_sum', 'rating_average']
+                )
+                updated += len(batch)
+            directory_cache.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {updated} doctor profile(s)."))
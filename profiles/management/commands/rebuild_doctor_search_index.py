@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.jobs import enqueue
+from profiles import search
+from profiles import cache as directory_cache
+
+
+class Command(BaseCommand):
+    help = "Repopulate the full-text doctor search index from DoctorProfile."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of profiles indexed per batch (default: 1000).",
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help="Queue the profiles.rebuild_search_index job for run_jobs instead of rebuilding here.",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            self.stdout.write(self.style.WARNING(
+                "Full-text search index is only available on SQLite; nothing to do."
+            ))
+            return
+        if options['enqueue']:
+            queued = enqueue(
+                'profiles.rebuild_search_index',
+                {'batch_size': options['batch_size']},
+                unique_key='profiles.rebuild_search_index',
+            )
+            self.stdout.write(self.style.SUCCESS(
+                "Queued the search index rebuild." if queued else "A search index rebuild is already queued."
+            ))
+            return
+        with transaction.atomic():
+            total = search.rebuild(batch_size=options['batch_size'])
+            directory_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} doctor profile(s)."))
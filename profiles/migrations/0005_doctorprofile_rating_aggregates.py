@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 07:12
+
+from django.db import migrations, models
+
+
+def backfill_ratings(apps, schema_editor):
+    DoctorProfile = apps.get_model('profiles', 'DoctorProfile')
+    DoctorReview = apps.get_model('profiles', 'DoctorReview')
+    totals = (
+        DoctorReview.objects.order_by()
+        .values('doctor_id')
+        .annotate(count=models.Count('id'), total=models.Sum('rating'))
+    )
+    for row in totals:
+        DoctorProfile.objects.filter(pk=row['doctor_id']).update(
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            rating_average=row['total'] / row['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_alter_doctorprofile_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_average',
+            field=models.FloatField(default=0, editable=False, help_text='Average review rating (rating_sum / rating_count)'),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of reviews left for the doctor'),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Sum of all review ratings'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
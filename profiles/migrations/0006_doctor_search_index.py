@@ -0,0 +1,56 @@
+from django.db import migrations
+
+CREATE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS profiles_doctorsearch USING fts5(
+    name,
+    specialties,
+    qualifications,
+    achievements,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other backends use the icontains fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    DoctorProfile = apps.get_model('profiles', 'DoctorProfile')
+    for profile in DoctorProfile.objects.select_related('user').prefetch_related(
+        'other_specialties', 'achievements'
+    ):
+        user = profile.user
+        specialties = [profile.main_specialty] + [s.name for s in profile.other_specialties.all()]
+        achievements = []
+        for achievement in profile.achievements.all():
+            achievements.extend([achievement.name, achievement.institution])
+        schema_editor.execute(
+            'INSERT INTO profiles_doctorsearch (rowid, name, specialties, qualifications, achievements) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            (
+                profile.pk,
+                ' '.join(filter(None, [user.first_name, user.last_name, user.username])),
+                ' '.join(filter(None, specialties)),
+                profile.qualifications,
+                ' '.join(filter(None, achievements)),
+            ),
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS profiles_doctorsearch')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0005_doctorprofile_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 07:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_doctor_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(fields=['is_active', 'rating_average', 'id'], name='profiles_do_is_acti_c1ba8a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(fields=['is_active', 'years_of_experience', 'id'], name='profiles_do_is_acti_e808f3_idx'),
+        ),
+    ]
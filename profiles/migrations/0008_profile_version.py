@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0007_doctorprofile_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='receptionistprofile',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from django.db import models
+from django.db.models.functions import Cast
 from django.conf import settings
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
+from core.models import VersionedModel
 
-class BaseProfile(models.Model):
+
+class BaseProfile(VersionedModel):
     """
     Abstract base for common profile attributes and metadata.
     """
@@ -89,6 +92,22 @@ class DoctorProfile(BaseProfile):
         default=True,
         help_text=_("Toggle if the doctor is currently active")
     )
+    # Denormalized review aggregates, kept in sync by profiles.signals
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text=_("Number of reviews left for the doctor")
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text=_("Sum of all review ratings")
+    )
+    rating_average = models.FloatField(
+        default=0,
+        editable=False,
+        help_text=_("Average review rating (rating_sum / rating_count)")
+    )
 
     class Meta:
         verbose_name = _("Doctor Profile")
@@ -96,12 +115,36 @@ class DoctorProfile(BaseProfile):
         indexes = [
             models.Index(fields=['main_specialty']),
             models.Index(fields=['license_number']),
+            # Directory keyset pagination (scanned in either direction)
+            models.Index(fields=['is_active', 'rating_average', 'id']),
+            models.Index(fields=['is_active', 'years_of_experience', 'id']),
         ]
 
     @property
     def average_rating(self):
-        """Compute average rating from associated reviews."""
-        return self.reviews.aggregate(models.Avg('rating'))['rating__avg'] or 0
+        """Average rating from the stored aggregates (no extra query)."""
+        return self.rating_average
+
+    @classmethod
+    def adjust_rating(cls, doctor_id, count_delta, sum_delta):
+        """
+        Apply a review delta to the stored aggregates in a single UPDATE.
+        F() expressions keep concurrent review writes from clobbering each other.
+        """
+        new_count = models.F('rating_count') + count_delta
+        new_sum = models.F('rating_sum') + sum_delta
+        cls.objects.filter(pk=doctor_id).update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_average=models.Case(
+                models.When(
+                    rating_count__gt=-count_delta,
+                    then=Cast(new_sum, models.FloatField()) / new_count,
+                ),
+                default=models.Value(0.0),
+                output_field=models.FloatField(),
+            ),
+        )
 
     def __str__(self):
         name = self.user.get_full_name() or self.user.username
@@ -0,0 +1,27 @@
+from rest_framework.filters import OrderingFilter
+
+from core.pagination import KeysetPagination
+
+
+class DoctorPagination(KeysetPagination):
+    """
+    Keyset pagination for the doctor directory.
+
+    Defaults to best rated first. ``?ordering=`` (validated by the view's
+    OrderingFilter) picks another field, and an active ``?search=``
+    without explicit ordering pages through results by relevance.
+    """
+    ordering = ('-rating_average', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        fields = None
+        if request.query_params.get(OrderingFilter.ordering_param):
+            fields = OrderingFilter().get_ordering(request, queryset, view)
+        if fields:
+            # Tie-break on id in the same direction as the primary field, so a
+            # single (field, id) index serves both ascending and descending scans
+            primary = fields[0]
+            return (primary, '-id' if primary.startswith('-') else 'id')
+        if 'search_rank' in queryset.query.annotations:
+            return ('search_rank', 'id')
+        return self.ordering
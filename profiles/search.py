@@ -0,0 +1,175 @@
+"""
+Full-text search index for the public doctor directory.
+
+On SQLite the index is an FTS5 virtual table with one row per doctor.
+The receivers in profiles.signals queue the affected doctors as a
+``profiles.reindex_doctors`` job in the writing transaction, so saves do
+not pay for re-reading and re-indexing profiles; ``run_jobs`` applies it.
+Other database backends fall back to DRF's plain ``icontains``
+SearchFilter.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from core.jobs import enqueue
+
+TABLE = 'profiles_doctorsearch'
+
+# bm25() column weights: name, specialties, qualifications, achievements
+COLUMN_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# The doctor id is stored as the FTS rowid, so per-doctor deletes are index lookups
+_INSERT_SQL = (
+    f'INSERT INTO {TABLE} (rowid, name, specialties, qualifications, achievements) '
+    'VALUES (%s, %s, %s, %s, %s)'
+)
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """
+    Turn free user input into an FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, so "car smi" matches
+    "Cardiology" and "Smith" and no user input can inject FTS syntax.
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _document(profile):
+    user = profile.user
+    specialties = [profile.main_specialty] + [s.name for s in profile.other_specialties.all()]
+    achievements = []
+    for achievement in profile.achievements.all():
+        achievements.extend([achievement.name, achievement.institution])
+    return (
+        profile.pk,
+        ' '.join(filter(None, [user.first_name, user.last_name, user.username])),
+        ' '.join(filter(None, specialties)),
+        profile.qualifications,
+        ' '.join(filter(None, achievements)),
+    )
+
+
+def _profiles(doctor_ids=None):
+    from .models import DoctorProfile
+
+    queryset = DoctorProfile.objects.select_related('user').prefetch_related(
+        'other_specialties', 'achievements'
+    )
+    if doctor_ids is not None:
+        queryset = queryset.filter(pk__in=doctor_ids)
+    return queryset
+
+
+def remove_doctors(doctor_ids):
+    doctor_ids = list(doctor_ids)
+    if not is_enabled() or not doctor_ids:
+        return
+    placeholders = ','.join(['%s'] * len(doctor_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', doctor_ids)
+
+
+def index_doctors(doctor_ids):
+    """(Re)index the given doctors; ids that no longer exist are dropped."""
+    doctor_ids = list(doctor_ids)
+    if not is_enabled() or not doctor_ids:
+        return
+    rows = [_document(profile) for profile in _profiles(doctor_ids)]
+    remove_doctors(doctor_ids)
+    with connection.cursor() as cursor:
+        cursor.executemany(_INSERT_SQL, rows)
+
+
+def queue_reindex(doctor_ids):
+    """Queue a background reindex of the given doctors; committed or rolled back with the caller."""
+    doctor_ids = sorted(set(doctor_ids))
+    if not is_enabled() or not doctor_ids:
+        return
+    # A single doctor's reindex still waiting for a worker covers this change too
+    unique_key = f'search-index:{doctor_ids[0]}' if len(doctor_ids) == 1 else ''
+    enqueue('profiles.reindex_doctors', {'doctor_ids': doctor_ids}, unique_key=unique_key)
+
+
+def rebuild(batch_size=1000):
+    """Drop and repopulate the whole index. Returns the number of doctors indexed."""
+    if not is_enabled():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        batch = []
+        for profile in _profiles().order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(_document(profile))
+            if len(batch) >= batch_size:
+                cursor.executemany(_INSERT_SQL, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(_INSERT_SQL, batch)
+            total += len(batch)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _bm25():
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    return f'bm25({TABLE}, {weights})'
+
+
+def search(text):
+    """Return doctor ids matching ``text``, best match first."""
+    match = build_match_query(text)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY {_bm25()}, rowid',
+            [match],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked(queryset, text):
+    """
+    Narrow a DoctorProfile queryset to the doctors matching ``text``,
+    annotated with their ``search_rank`` (bm25, lower is better). The FTS
+    rows are joined into the query rather than fetched first, so the
+    other filters and the pagination see every match.
+    """
+    match = build_match_query(text)
+    qn = connection.ops.quote_name
+    outer_pk = f'{qn(queryset.model._meta.db_table)}.{qn(queryset.model._meta.pk.column)}'
+    rank = RawSQL(
+        f'SELECT {_bm25()} FROM {TABLE} WHERE {TABLE} MATCH %s AND {TABLE}.rowid = {outer_pk}',
+        [match],
+        output_field=FloatField(),
+    )
+    matches = RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [match])
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+class DoctorSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that answers ``?search=`` from the FTS index, ordered by
+    relevance. Falls back to the regular icontains lookups off SQLite.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_enabled():
+            return super().filter_queryset(request, queryset, view)
+        text = ' '.join(self.get_search_terms(request))
+        if not build_match_query(text):
+            return queryset
+        # Exposed as an annotation so DoctorPagination can page by relevance
+        return ranked(queryset, text).order_by('search_rank', 'pk')
@@ -68,6 +68,33 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
                 Achievement.objects.create(doctor=instance, **ach_data)
         return instance
 
+class DoctorProfileSummarySerializer(serializers.ModelSerializer):
+    """Compact doctor profile for the login response; no related queries."""
+    type = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DoctorProfile
+        fields = [
+            'id', 'type', 'main_specialty', 'years_of_experience', 'is_active',
+            'average_rating', 'avatar', 'version',
+        ]
+
+    def get_type(self, obj):
+        return 'doctor'
+
+
+class ReceptionistProfileSummarySerializer(serializers.ModelSerializer):
+    """Compact receptionist profile for the login response."""
+    type = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReceptionistProfile
+        fields = ['id', 'type', 'phone_extension', 'shift_start', 'shift_end', 'avatar', 'version']
+
+    def get_type(self, obj):
+        return 'receptionist'
+
 class ReceptionistProfileCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReceptionistProfile
@@ -132,6 +159,8 @@ class DoctorProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = DoctorProfile
         exclude = ['user', 'created_at', 'updated_at']
+        # Maintained by staff and by the review aggregates, not by the doctor
+        read_only_fields = ['is_active', 'rating_count', 'rating_sum', 'rating_average']
 
     def update(self, instance, validated_data):
         specialties = validated_data.pop('other_specialties', None)
@@ -154,28 +183,40 @@ class ProfileUpdateSerializer(serializers.Serializer):
     user = UserUpdateSerializer(required=False)
     profile = serializers.DictField(required=False)
 
+    def validate_profile(self, value):
+        # Validated by the serializer of the instance's profile type, so only
+        # its writable fields, converted to their types, reach the model
+        serializer = self._profile_serializer(self.instance, data=value, partial=self.partial)
+        serializer.is_valid(raise_exception=True)
+        return dict(serializer.validated_data)
+
     def update(self, instance, validated_data):
         user_data = validated_data.get('user')
-        profile_data = validated_data.get('profile')
+        profile_data = dict(validated_data.get('profile') or {})
+        changed = bool(user_data or profile_data)
+        specialties = profile_data.pop('other_specialties', None)
+        achievements_data = profile_data.pop('achievements', None)
+
+        if changed:
+            # Saved even for user-only changes: its conditional UPDATE bumps
+            # the version that ETag / If-Match compare, before anything else
+            # is written
+            for attr, value in profile_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
         if user_data:
             for attr, value in user_data.items():
                 setattr(instance.user, attr, value)
             instance.user.save()
 
-        if profile_data:
-            # Handle nested specialties and achievements if present
-            specialties = profile_data.pop('other_specialties_ids', None)
-            achievements_data = profile_data.pop('achievements', None)
-            for attr, value in profile_data.items():
-                setattr(instance, attr, value)
-            instance.save()
-            if specialties is not None:
-                instance.other_specialties.set(specialties)
-            if achievements_data is not None:
-                instance.achievements.all().delete()
-                for ach_data in achievements_data:
-                    Achievement.objects.create(doctor=instance, **ach_data)
+        # Handle nested specialties and achievements if present
+        if specialties is not None:
+            instance.other_specialties.set(specialties)
+        if achievements_data is not None:
+            instance.achievements.all().delete()
+            for ach_data in achievements_data:
+                Achievement.objects.create(doctor=instance, **ach_data)
         return instance
 
     def to_representation(self, instance):
@@ -184,10 +225,10 @@ class ProfileUpdateSerializer(serializers.Serializer):
         data.update(self._profile_serializer(instance).data)
         return data
 
-    def _profile_serializer(self, profile):
+    def _profile_serializer(self, profile, **kwargs):
         if isinstance(profile, DoctorProfile):
-            return DoctorProfileUpdateSerializer(profile)
+            return DoctorProfileUpdateSerializer(profile, **kwargs)
         elif isinstance(profile, ReceptionistProfile):
-            return ReceptionistProfileUpdateSerializer(profile)
+            return ReceptionistProfileUpdateSerializer(profile, **kwargs)
         else:
             raise Exception("Unknown profile type")
\ No newline at end of file
@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import search
+from . import cache as directory_cache
+from . import snapshot as login_snapshot
+from .models import DoctorProfile, DoctorReview, ReceptionistProfile, Specialty, Achievement
+
+
+@receiver(pre_save, sender=DoctorReview)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Snapshot the stored doctor/rating so post_save can apply a delta."""
+    instance._previous_rating = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_rating = (
+            sender.objects.filter(pk=instance.pk).values_list('doctor_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=DoctorReview)
+def apply_review_rating(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous:
+        old_doctor_id, old_rating = previous
+        if old_doctor_id == instance.doctor_id:
+            if old_rating != instance.rating:
+                DoctorProfile.adjust_rating(instance.doctor_id, 0, instance.rating - old_rating)
+            return
+        # Review was moved to another doctor
+        DoctorProfile.adjust_rating(old_doctor_id, -1, -old_rating)
+    DoctorProfile.adjust_rating(instance.doctor_id, 1, instance.rating)
+
+
+@receiver(post_delete, sender=DoctorReview)
+def revert_review_rating(sender, instance, **kwargs):
+    DoctorProfile.adjust_rating(instance.doctor_id, -1, -instance.rating)
+
+
+# Full-text search index (applied by the profiles.reindex_doctors job)
+
+@receiver(post_save, sender=DoctorProfile)
+def index_doctor(sender, instance, **kwargs):
+    search.queue_reindex([instance.pk])
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def unindex_doctor(sender, instance, **kwargs):
+    search.queue_reindex([instance.pk])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_user_doctor(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, which is not indexed
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    search.queue_reindex(
+        DoctorProfile.objects.filter(user_id=instance.pk).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def reindex_achievement_doctor(sender, instance, **kwargs):
+    search.queue_reindex([instance.doctor_id])
+
+
+@receiver(post_save, sender=Specialty)
+def reindex_specialty_doctors(sender, instance, created, **kwargs):
+    if created:
+        return
+    search.queue_reindex(instance.doctors.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Specialty)
+def remember_specialty_doctors(sender, instance, **kwargs):
+    # The through rows are gone by post_delete, so collect the doctors now
+    instance._doctor_ids = list(instance.doctors.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Specialty)
+def reindex_deleted_specialty_doctors(sender, instance, **kwargs):
+    search.queue_reindex(getattr(instance, '_doctor_ids', []))
+
+
+@receiver(m2m_changed, sender=DoctorProfile.other_specialties.through)
+def reindex_doctor_specialties(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.queue_reindex([instance.pk])
+    elif action == 'pre_clear':
+        # specialty.doctors.clear(): pk_set is empty, so remember who is affected
+        instance._doctor_ids = list(instance.doctors.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.queue_reindex(getattr(instance, '_doctor_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        search.queue_reindex(pk_set or [])
+
+
+# Doctor directory response cache
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+@receiver(post_save, sender=Specialty)
+@receiver(post_delete, sender=Specialty)
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+@receiver(post_save, sender=DoctorReview)
+@receiver(post_delete, sender=DoctorReview)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_directory_cache(sender, **kwargs):
+    directory_cache.invalidate()
+
+
+@receiver(m2m_changed, sender=DoctorProfile.other_specialties.through)
+def invalidate_directory_cache_m2m(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        directory_cache.invalidate()
+
+
+# Login profile snapshot
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+@receiver(post_save, sender=ReceptionistProfile)
+@receiver(post_delete, sender=ReceptionistProfile)
+def invalidate_login_snapshot(sender, instance, **kwargs):
+    login_snapshot.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=DoctorReview)
+@receiver(post_delete, sender=DoctorReview)
+def invalidate_reviewed_doctor_login_snapshot(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    login_snapshot.invalidate_doctors(instance.doctor_id, previous[0] if previous else None)
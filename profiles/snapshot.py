@@ -0,0 +1,67 @@
+"""
+Per-user profile snapshot for the login response.
+
+Logging in used to serialize the whole doctor profile (specialties,
+achievements) on every request. The response now carries a compact
+summary of the user's profile, cached per user for
+LOGIN_PROFILE_CACHE_TIMEOUT seconds, so a repeat login only pays for the
+password check; clients load the full profile from /api/profiles/me/ when
+they need it. profiles.signals drops a user's snapshot whenever their
+profile is saved or deleted or a review changes their rating.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DoctorProfile, ReceptionistProfile
+from .serializers import DoctorProfileSummarySerializer, ReceptionistProfileSummarySerializer
+
+KEY_PREFIX = 'login-profile'
+
+# (model, serializer) per profile type, in lookup order
+PROFILE_TYPES = [
+    (DoctorProfile, DoctorProfileSummarySerializer),
+    (ReceptionistProfile, ReceptionistProfileSummarySerializer),
+]
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def build(user):
+    """Summary of ``user``'s profile, or None if they have none (one query per profile type tried)."""
+    for model, serializer_class in PROFILE_TYPES:
+        profile = model.objects.filter(user_id=user.pk).first()
+        if profile is not None:
+            return serializer_class(profile).data
+    return None
+
+
+def get_snapshot(user):
+    cached = cache.get(_key(user.pk))
+    if cached is None:
+        # Wrapped so that "no profile" is cached too
+        cached = {'profile': build(user)}
+        cache.set(_key(user.pk), cached, timeout=settings.LOGIN_PROFILE_CACHE_TIMEOUT)
+    return cached['profile']
+
+
+def _drop(user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids])
+
+
+def invalidate(*user_ids):
+    """
+    Drop now and again once the surrounding transaction commits, so a
+    snapshot built from pre-commit data in between cannot stay cached.
+    """
+    user_ids = {pk for pk in user_ids if pk is not None}
+    if not user_ids:
+        return
+    _drop(user_ids)
+    transaction.on_commit(lambda: _drop(user_ids))
+
+
+def invalidate_doctors(*doctor_ids):
+    invalidate(*DoctorProfile.objects.filter(pk__in=doctor_ids).values_list('user_id', flat=True))
@@ -1,3 +1,570 @@
+import json
+from base64 import urlsafe_b64encode
+from io import StringIO
+
 from django.test import TestCase
+from django.db import connection, transaction
+from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+
+from core.models import Job
+
+from . import search
+from .models import DoctorProfile, DoctorReview, ReceptionistProfile, Specialty, Achievement
+
+User = get_user_model()
+
+
+def run_jobs():
+    # Search index updates are applied by the profiles.reindex_doctors job
+    call_command('run_jobs', '--once', stdout=StringIO())
+
+
+class DoctorRatingAggregateTest(TestCase):
+    def setUp(self):
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1',
+                password='testpass123',
+                role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        self.other_doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor2',
+                password='testpass123',
+                role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Neurology'
+        )
+
+    def assertRating(self, doctor, count, total, average):
+        doctor.refresh_from_db()
+        self.assertEqual(doctor.rating_count, count)
+        self.assertEqual(doctor.rating_sum, total)
+        self.assertAlmostEqual(doctor.average_rating, average)
+
+    def test_new_doctor_has_no_rating(self):
+        self.assertRating(self.doctor, 0, 0, 0)
+
+    def test_review_create_updates_aggregates(self):
+        DoctorReview.objects.create(doctor=self.doctor, rating=5)
+        DoctorReview.objects.create(doctor=self.doctor, rating=2)
+        self.assertRating(self.doctor, 2, 7, 3.5)
+
+    def test_review_update_applies_delta(self):
+        review = DoctorReview.objects.create(doctor=self.doctor, rating=5)
+        review.rating = 1
+        review.save()
+        self.assertRating(self.doctor, 1, 1, 1.0)
+
+    def test_review_moved_to_other_doctor(self):
+        review = DoctorReview.objects.create(doctor=self.doctor, rating=4)
+        review.doctor = self.other_doctor
+        review.save()
+        self.assertRating(self.doctor, 0, 0, 0)
+        self.assertRating(self.other_doctor, 1, 4, 4.0)
+
+    def test_review_delete_reverts_aggregates(self):
+        review = DoctorReview.objects.create(doctor=self.doctor, rating=4)
+        DoctorReview.objects.create(doctor=self.doctor, rating=2)
+        review.delete()
+        self.assertRating(self.doctor, 1, 2, 2.0)
+        DoctorReview.objects.all().delete()
+        self.assertRating(self.doctor, 0, 0, 0)
+
+    def test_average_rating_does_not_query(self):
+        DoctorReview.objects.create(doctor=self.doctor, rating=3)
+        doctor = DoctorProfile.objects.get(pk=self.doctor.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(doctor.average_rating, 3.0)
+
+    def test_rebuild_command(self):
+        DoctorReview.objects.create(doctor=self.doctor, rating=5)
+        DoctorReview.objects.create(doctor=self.doctor, rating=4)
+        # Simulate drift, e.g. from a queryset.update() that bypasses signals
+        DoctorProfile.objects.update(rating_count=0, rating_sum=0, rating_average=0)
+        DoctorProfile.objects.filter(pk=self.other_doctor.pk).update(
+            rating_count=3, rating_sum=9, rating_average=3
+        )
+
+        out = StringIO()
+        call_command('rebuild_doctor_ratings', stdout=out)
+        self.assertIn('2 doctor profile', out.getvalue())
+        self.assertRating(self.doctor, 2, 9, 4.5)
+        self.assertRating(self.other_doctor, 0, 0, 0)
+
+
+class DoctorProfileListAPITest(APITestCase):
+    # main query + other_specialties prefetch + achievements prefetch
+    LIST_QUERY_BUDGET = 3
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cardiology = Specialty.objects.create(name='Cardiology')
+        self.surgery = Specialty.objects.create(name='Cardiac Surgery')
+
+    def make_doctors(self, count, offset=0):
+        for i in range(offset, offset + count):
+            doctor = DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}',
+                    first_name='Doc',
+                    last_name=f'Number{i}',
+                    password='testpass123',
+                    role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology',
+                years_of_experience=i
+            )
+            doctor.other_specialties.set([self.cardiology, self.surgery])
+            Achievement.objects.create(
+                doctor=doctor, type=Achievement.EDUCATION, name='MD', institution='TMA'
+            )
+            DoctorReview.objects.create(doctor=doctor, rating=4)
+        run_jobs()
+
+    def test_list_is_public(self):
+        self.make_doctors(1)
+        response = self.client.get(reverse('doctor-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['average_rating'], 4.0)
+        self.assertEqual(len(response.data['results'][0]['other_specialties']), 2)
+        self.assertEqual(len(response.data['results'][0]['achievements']), 1)
+
+    def test_inactive_doctors_hidden(self):
+        self.make_doctors(2)
+        DoctorProfile.objects.filter(user__username='doctor0').update(is_active=False)
+        response = self.client.get(reverse('doctor-list'))
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_list_query_budget_independent_of_size(self):
+        url = reverse('doctor-list')
+        self.make_doctors(2)
+        with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+            self.client.get(url)
+        self.make_doctors(20, offset=2)
+        with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 22)
+
+    def test_search_query_budget(self):
+        self.make_doctors(10)
+        # The full-text match is part of the list query
+        with self.assertNumQueries(self.LIST_QUERY_BUDGET):
+            response = self.client.get(reverse('doctor-list'), {'search': 'cardi'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_search_across_m2m_has_no_duplicates(self):
+        self.make_doctors(3)
+        # Both specialties match "cardi", which would double rows on a plain join
+        response = self.client.get(reverse('doctor-list'), {'search': 'cardi'})
+        ids = [row['id'] for row in response.data['results']]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(set(ids)), 3)
+
+
+class DoctorSearchIndexTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        self.smith = self.make_doctor('asmith', 'Anna', 'Smith', 'Cardiology')
+        self.smithson = self.make_doctor('bsmithson', 'Bob', 'Smithson', 'Dermatology')
+        self.jones = self.make_doctor('cjones', 'Carl', 'Jones', 'Neurology', qualifications='MD, Smith Fellowship')
+        run_jobs()
+
+    def make_doctor(self, username, first_name, last_name, specialty, **extra):
+        return DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username=username,
+                first_name=first_name,
+                last_name=last_name,
+                password='testpass123',
+                role=User.ROLE_DOCTOR
+            ),
+            main_specialty=specialty,
+            **extra
+        )
+
+    def search(self, text):
+        run_jobs()
+        response = self.client.get(self.url, {'search': text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_build_match_query_quotes_tokens(self):
+        self.assertEqual(search.build_match_query('car "smi'), '"car"* "smi"*')
+        self.assertEqual(search.build_match_query(' - '), '')
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('derm'), [self.smithson.pk])
+        self.assertEqual(self.search('anna card'), [self.smith.pk])
+
+    def test_name_match_ranks_above_qualifications(self):
+        results = self.search('smith')
+        self.assertEqual(set(results), {self.smith.pk, self.smithson.pk, self.jones.pk})
+        self.assertEqual(results[-1], self.jones.pk)
+
+    def test_punctuation_only_search_returns_everything(self):
+        self.assertEqual(len(self.search('!!')), 3)
+
+    def test_user_rename_reindexes(self):
+        user = self.jones.user
+        user.last_name = 'Kowalski'
+        user.save()
+        self.assertEqual(self.search('kowal'), [self.jones.pk])
+
+    def test_specialty_and_achievement_changes_reindex(self):
+        specialty = Specialty.objects.create(name='Pediatrics')
+        self.jones.other_specialties.add(specialty)
+        self.assertEqual(self.search('pediat'), [self.jones.pk])
+
+        specialty.name = 'Oncology'
+        specialty.save()
+        self.assertEqual(self.search('pediat'), [])
+        self.assertEqual(self.search('onco'), [self.jones.pk])
+
+        specialty.delete()
+        self.assertEqual(self.search('onco'), [])
+
+        achievement = Achievement.objects.create(
+            doctor=self.smith, type=Achievement.INTERNSHIP, name='Residency', institution='Charite'
+        )
+        self.assertEqual(self.search('charit'), [self.smith.pk])
+        achievement.delete()
+        self.assertEqual(self.search('charit'), [])
+
+    def test_deleted_doctor_is_unindexed(self):
+        self.smith.delete()
+        run_jobs()
+        self.assertEqual(search.search('anna'), [])
+
+    def test_changes_are_indexed_by_a_job(self):
+        user = self.jones.user
+        user.last_name = 'Kowalski'
+        user.save()
+        self.jones.qualifications = 'PhD'
+        self.jones.save()
+        self.assertEqual(search.search('kowal'), [])
+        # Both writes touch one doctor, so they share one queued reindex
+        job = Job.objects.get(name='profiles.reindex_doctors', status=Job.QUEUED)
+        self.assertEqual(job.payload, {'doctor_ids': [self.jones.pk]})
+
+        run_jobs()
+        self.assertEqual(search.search('kowal'), [self.jones.pk])
+
+    def test_rolled_back_change_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.smith.save()
+            raise RuntimeError
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+
+    def test_login_does_not_reindex(self):
+        self.assertTrue(self.client.login(username='asmith', password='testpass123'))
+        self.assertFalse(Job.objects.filter(name='profiles.reindex_doctors', status=Job.QUEUED).exists())
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.search('smith'), [])
+
+        out = StringIO()
+        call_command('rebuild_doctor_search_index', stdout=out)
+        self.assertIn('Indexed 3 doctor profile', out.getvalue())
+        self.assertEqual(len(self.search('smith')), 3)
+
+    def test_rebuild_command_can_enqueue(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        out = StringIO()
+        call_command('rebuild_doctor_search_index', '--enqueue', stdout=out)
+        self.assertIn('Queued the search index rebuild', out.getvalue())
+        self.assertEqual(search.search('smith'), [])
+        self.assertEqual(len(self.search('smith')), 3)
+
+
+class DoctorPaginationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        self.doctors = []
+        for i, rating in enumerate([5, 3, 3, 3, 1]):
+            doctor = DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology',
+                years_of_experience=10 - i
+            )
+            DoctorReview.objects.create(doctor=doctor, rating=rating)
+            self.doctors.append(doctor)
+        run_jobs()
+
+    def collect(self, params):
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_default_orders_by_rating(self):
+        ids = self.collect({'page_size': 2})
+        d = [doctor.pk for doctor in self.doctors]
+        # Ties on rating are broken by id in the same direction
+        self.assertEqual(ids, [d[0], d[3], d[2], d[1], d[4]])
+
+    def test_ordering_param(self):
+        ids = self.collect({'page_size': 2, 'ordering': 'years_of_experience'})
+        self.assertEqual(ids, [doctor.pk for doctor in reversed(self.doctors)])
+
+    def test_search_pages_by_relevance(self):
+        response = self.client.get(self.url, {'search': 'doctor1', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['id'], self.doctors[1].pk)
+        self.assertIsNone(response.data['next'])
+
+    def test_search_pages_through_every_match(self):
+        users = User.objects.bulk_create([
+            User(username=f'smith{i}', last_name='Smith', role=User.ROLE_DOCTOR) for i in range(520)
+        ])
+        DoctorProfile.objects.bulk_create([
+            DoctorProfile(user=user, main_specialty='Cardiology', is_active=i >= 20)
+            for i, user in enumerate(users)
+        ])
+        search.rebuild()
+        ids = self.collect({'search': 'smith', 'page_size': 100})
+        self.assertEqual(len(ids), 500)
+        self.assertEqual(len(set(ids)), 500)
+        self.assertFalse(DoctorProfile.objects.filter(pk__in=ids, is_active=False).exists())
+
+    def test_tampered_cursor(self):
+        for position in [['abc', 1], [{'a': 1}, 1], [[1], 1], [None, 1], [1.0, 'abc']]:
+            cursor = urlsafe_b64encode(json.dumps({'p': position, 'r': 0}).encode()).decode()
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+            self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+
+class DoctorDirectoryCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        self.specialty = Specialty.objects.create(name='Cardiology')
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(
+                username='doctor1', password='testpass123', role=User.ROLE_DOCTOR
+            ),
+            main_specialty='Cardiology'
+        )
+        self.doctor.other_specialties.add(self.specialty)
+
+    def test_repeat_load_skips_database(self):
+        first = self.client.get(self.url, {'page_size': 5, 'ordering': 'years_of_experience'})
+        with self.assertNumQueries(0):
+            # Same parameters in a different order hit the same entry
+            second = self.client.get(self.url, {'ordering': 'years_of_experience', 'page_size': 5})
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_review_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        DoctorReview.objects.create(doctor=self.doctor, rating=5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['average_rating'], 5.0)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_specialty_and_user_changes_invalidate(self):
+        self.client.get(self.url)
+        self.specialty.name = 'Heart'
+        self.specialty.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['other_specialties'][0]['name'], 'Heart')
+
+        self.doctor.other_specialties.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['other_specialties'], [])
+
+        user = self.doctor.user
+        user.username = 'renamed'
+        user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['user'], 'renamed')
+
+
+class AsyncPublicReadsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.cardiology = Specialty.objects.create(name='Cardiology')
+        Specialty.objects.create(name='Anatomy')
+        self.doctors = []
+        for i, rating in enumerate([5, 3, 4]):
+            doctor = DoctorProfile.objects.create(
+                user=User.objects.create_user(
+                    username=f'doctor{i}', password='testpass123', role=User.ROLE_DOCTOR
+                ),
+                main_specialty='Cardiology' if i else 'Surgery'
+            )
+            DoctorReview.objects.create(doctor=doctor, rating=rating)
+            Achievement.objects.create(doctor=doctor, type='education', name='MD', institution='TMA', year=2010)
+            self.doctors.append(doctor)
+        self.doctors[0].other_specialties.add(self.cardiology)
+        run_jobs()
+
+    def test_directory_matches_sync_view(self):
+        params = {'page_size': 2}
+        sync = self.client.get(reverse('doctor-list'), params)
+        response = self.client.get(reverse('doctor-list-async'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual(data['results'], sync.json()['results'])
+        self.assertIn('/api/profiles/async/doctors/', data['next'])
+
+        following = self.client.get(data['next']).json()
+        self.assertEqual(
+            [row['id'] for row in data['results'] + following['results']],
+            [self.doctors[0].pk, self.doctors[2].pk, self.doctors[1].pk],
+        )
+
+    def test_directory_filters_and_search(self):
+        url = reverse('doctor-list-async')
+        data = self.client.get(url, {'main_specialty': 'Surgery'}).json()
+        self.assertEqual([row['id'] for row in data['results']], [self.doctors[0].pk])
+        data = self.client.get(url, {'search': 'doctor2'}).json()
+        self.assertEqual([row['id'] for row in data['results']], [self.doctors[2].pk])
+        data = self.client.get(url, {'ordering': 'main_specialty'}).json()
+        self.assertEqual(data['results'][-1]['id'], self.doctors[0].pk)
+        response = self.client.get(url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+    def test_directory_cache_and_etag(self):
+        url = reverse('doctor-list-async')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        DoctorReview.objects.create(doctor=self.doctors[1], rating=5)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_specialties(self):
+        sync = self.client.get(reverse('specialty-list'))
+        response = self.client.get(reverse('specialty-list-async'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual([row['name'] for row in response.json()], ['Anatomy', 'Cardiology'])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('specialty-list-async'), {'name': 'Heart'})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ProfileMeTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='doctor1', password='testpass123', role=User.ROLE_DOCTOR, first_name='Greg'
+        )
+        self.profile = DoctorProfile.objects.create(user=self.user, main_specialty='Cardiology')
+        self.url = reverse('profile-me')
+        self.client.force_authenticate(user=self.user)
+
+    def test_etag_and_if_match(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['main_specialty'], 'Cardiology')
+        tag = response['ETag']
+
+        response = self.client.patch(
+            self.url, {'profile': {'bio': 'Diagnostician'}}, format='json', HTTP_IF_MATCH=tag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bio'], 'Diagnostician')
+        self.assertNotEqual(response['ETag'], tag)
+
+        # A second editor still holding the old tag is turned away
+        response = self.client.patch(
+            self.url, {'user': {'first_name': 'Gregory'}}, format='json', HTTP_IF_MATCH=tag
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Greg')
+
+        # User-only changes move the tag too
+        tag = self.client.get(self.url)['ETag']
+        response = self.client.patch(
+            self.url, {'user': {'first_name': 'Gregory'}}, format='json', HTTP_IF_MATCH=tag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], tag)
+
+    def test_profile_fields_are_validated(self):
+        response = self.client.patch(self.url, {'profile': {'years_of_experience': 'abc'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('years_of_experience', response.data['profile'])
+
+        other = User.objects.create_user(username='doctor2', password='testpass123', role=User.ROLE_DOCTOR)
+        response = self.client.patch(self.url, {'profile': {
+            'user_id': other.pk, 'id': 999, 'is_active': False, 'rating_average': 5.0,
+            'version': 7, 'bio': 'Diagnostician',
+        }}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.user_id, self.user.pk)
+        self.assertTrue(self.profile.is_active)
+        self.assertEqual(self.profile.rating_average, 0)
+        self.assertEqual(self.profile.version, 2)
+        self.assertEqual(self.profile.bio, 'Diagnostician')
+        self.assertFalse(DoctorProfile.objects.filter(pk=999).exists())
+
+    def test_nested_profile_collections(self):
+        specialty = Specialty.objects.create(name='Nephrology')
+        response = self.client.patch(self.url, {'profile': {
+            'other_specialties_ids': [specialty.pk],
+            'achievements': [{'type': Achievement.CERTIFICATION, 'name': 'ACLS'}],
+        }}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.profile.other_specialties.all()), [specialty])
+        self.assertEqual(self.profile.achievements.get().name, 'ACLS')
+        self.assertEqual(response.data['version'], 2)
+
+        response = self.client.patch(self.url, {'profile': {'other_specialties_ids': [12345]}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_receptionist_profile(self):
+        user = User.objects.create_user(username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST)
+        ReceptionistProfile.objects.create(user=user, phone_extension='12')
+        self.client.force_authenticate(user=user)
+        response = self.client.patch(self.url, {'profile': {'phone_extension': '34'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['phone_extension'], '34')
+        self.assertEqual(response.data['version'], 2)
 
-# Create your tests here.
+    def test_no_profile(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='nobody', password='testpass123'))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
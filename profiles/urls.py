@@ -1,8 +1,13 @@
 from django.urls import path
-from .views import RegisterUserWithProfileView, ProfileMeUpdateView, DoctorProfileListView
+from .views import RegisterUserWithProfileView, ProfileMeUpdateView, DoctorProfileListView, SpecialtyListView
+from .async_views import AsyncDoctorProfileListView, AsyncSpecialtyListView
 
 urlpatterns = [
     path('register/', RegisterUserWithProfileView.as_view(), name='register'),
     path('me/', ProfileMeUpdateView.as_view(), name='profile-me'),
     path('doctors/', DoctorProfileListView.as_view(), name='doctor-list'),
-]
\ No newline at end of file
+    path('specialties/', SpecialtyListView.as_view(), name='specialty-list'),
+    # Native async variants for ASGI deployments
+    path('async/doctors/', AsyncDoctorProfileListView.as_view(), name='doctor-list-async'),
+    path('async/specialties/', AsyncSpecialtyListView.as_view(), name='specialty-list-async'),
+]
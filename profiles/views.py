@@ -1,13 +1,21 @@
 from rest_framework import generics, permissions, status, filters
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import DoctorProfile
+from core.concurrency import OptimisticConcurrencyMixin
+
+from .models import DoctorProfile, Specialty
+from .search import DoctorSearchFilter
+from .pagination import DoctorPagination
+from . import cache as directory_cache
 from .serializers import (
     UserWithProfileCreateSerializer,
     ProfileUpdateSerializer,
     DoctorProfileSerializer,
+    SpecialtySerializer,
 )
 
 # Register new user with profile
@@ -16,17 +24,18 @@ class RegisterUserWithProfileView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
 # Authenticated user: get or update their profile
-class ProfileMeUpdateView(generics.RetrieveUpdateAPIView):
+# (ETag / If-Match: concurrent edits fail with 412 instead of overwriting)
+class ProfileMeUpdateView(OptimisticConcurrencyMixin, generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ProfileUpdateSerializer
 
     def get_object(self):
         user = self.request.user
-        # Make sure related_name is 'doctor_profile' and 'receptionist_profile'
-        if hasattr(user, 'doctor_profile'):
-            return user.doctor_profile
-        elif hasattr(user, 'receptionist_profile'):
-            return user.receptionist_profile
+        # related_name="%(class)ss" on BaseProfile.user
+        if hasattr(user, 'doctorprofiles'):
+            return user.doctorprofiles
+        elif hasattr(user, 'receptionistprofiles'):
+            return user.receptionistprofiles
         # Add logic for other profile types if needed
         else:
             raise NotFound("Profile not found.")
@@ -36,12 +45,20 @@ class ProfileMeUpdateView(generics.RetrieveUpdateAPIView):
 
 # Public view: list all doctor profiles (with filters)
 class DoctorProfileListView(generics.ListAPIView):
-    queryset = DoctorProfile.objects.filter(is_active=True)
+    # Join the user and prefetch the nested collections so a page costs
+    # the same handful of queries regardless of how many doctors it holds
+    queryset = (
+        DoctorProfile.objects.filter(is_active=True)
+        .select_related('user')
+        .prefetch_related('other_specialties', 'achievements')
+    )
     serializer_class = DoctorProfileSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = DoctorPagination
 
-    # Optional: add search/filtering by specialty, name, etc.
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    # ?search= is served by the FTS index (ranked, prefix matching); these
+    # fields are only used by the icontains fallback on non-SQLite backends
+    filter_backends = [DoctorSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     search_fields = [
         'user__first_name',
         'user__last_name',
@@ -49,5 +66,32 @@ class DoctorProfileListView(generics.ListAPIView):
         'other_specialties__name',
         'qualifications',
     ]
-    ordering_fields = ['years_of_experience', 'main_specialty']
-    filterset_fields = ['main_specialty', 'is_active', 'other_specialties']
\ No newline at end of file
+    ordering_fields = ['years_of_experience', 'main_specialty', 'rating_average']
+    filterset_fields = ['main_specialty', 'is_active', 'other_specialties']
+
+    def list(self, request, *args, **kwargs):
+        # Repeat loads are answered from the cache without touching the ORM;
+        # profiles.signals bumps the cache version on every relevant write
+        key = directory_cache.cache_key(request)
+        cached = directory_cache.get_page(key)
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            etag = directory_cache.make_etag(JSONRenderer().render(response.data))
+            directory_cache.store_page(key, etag, response.data)
+        else:
+            etag, data = cached
+            response = Response(data)
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+
+# Public view: every specialty, for directory filters
+class SpecialtyListView(generics.ListAPIView):
+    queryset = Specialty.objects.order_by('name')
+    serializer_class = SpecialtySerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
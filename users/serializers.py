@@ -20,6 +20,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return user
     
 class UserUpdateSerializer(serializers.ModelSerializer):
+    # avatar, phone number, address and bio live on the profile
     class Meta:
         model = get_user_model()
-        fields = ('email', 'avatar', 'phone_number', 'address', 'bio')
\ No newline at end of file
+        fields = ('email', 'first_name', 'last_name')
\ No newline at end of file
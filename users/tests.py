@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
 
-# Create your tests here.
+from profiles.models import DoctorProfile, DoctorReview, ReceptionistProfile, Achievement
+
+User = get_user_model()
+
+
+class LoginPayloadTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('token_obtain_pair')
+        self.user = User.objects.create_user(
+            username='doctor1', password='testpass123', role=User.ROLE_DOCTOR, email='house@example.com'
+        )
+        self.doctor = DoctorProfile.objects.create(user=self.user, main_specialty='Cardiology', years_of_experience=7)
+        Achievement.objects.create(doctor=self.doctor, type=Achievement.CERTIFICATION, name='ACLS', institution='AHA', year=2020)
+
+    def login(self, username='doctor1'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'username': username, 'password': 'testpass123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile_queries = [q for q in queries.captured_queries if '"profiles_' in q['sql']]
+        return response.data, profile_queries
+
+    def test_compact_cached_profile(self):
+        data, profile_queries = self.login()
+        self.assertIn('access', data)
+        self.assertEqual(data['user']['email'], 'house@example.com')
+        self.assertEqual(data['user']['profile_url'], reverse('profile-me'))
+        profile = data['user']['profile']
+        self.assertEqual(profile['type'], 'doctor')
+        self.assertEqual(profile['main_specialty'], 'Cardiology')
+        self.assertEqual(profile['average_rating'], 0)
+        self.assertNotIn('achievements', profile)
+        self.assertEqual(len(profile_queries), 1)
+
+        # A repeat login does not touch the profile tables
+        data, profile_queries = self.login()
+        self.assertEqual(data['user']['profile'], profile)
+        self.assertEqual(profile_queries, [])
+
+    def test_profile_and_review_changes_invalidate(self):
+        self.login()
+        self.doctor.years_of_experience = 8
+        self.doctor.save()
+        data, _ = self.login()
+        self.assertEqual(data['user']['profile']['years_of_experience'], 8)
+
+        DoctorReview.objects.create(doctor=self.doctor, rating=4)
+        data, _ = self.login()
+        self.assertEqual(data['user']['profile']['average_rating'], 4.0)
+
+    def test_receptionist_and_no_profile(self):
+        user = User.objects.create_user(username='receptionist1', password='testpass123', role=User.ROLE_RECEPTIONIST)
+        ReceptionistProfile.objects.create(user=user, phone_extension='12')
+        data, _ = self.login('receptionist1')
+        self.assertEqual(data['user']['profile']['type'], 'receptionist')
+        self.assertEqual(data['user']['profile']['phone_extension'], '12')
+
+        User.objects.create_user(username='admin1', password='testpass123')
+        data, _ = self.login('admin1')
+        self.assertIsNone(data['user']['profile'])
+        _, profile_queries = self.login('admin1')
+        self.assertEqual(profile_queries, [])
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from rest_framework import viewsets, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -29,29 +30,22 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
     def validate(self, attrs):
         data = super().validate(attrs)
-        
-        # Get user profile based on role
-        profile_data = None
-        if hasattr(self.user, 'doctorprofiles'):
-            from profiles.serializers import DoctorProfileSerializer
-            profile_data = DoctorProfileSerializer(self.user.doctorprofiles).data
-        elif hasattr(self.user, 'receptionistprofiles'):
-            from profiles.serializers import ReceptionistProfileUpdateSerializer
-            profile_data = ReceptionistProfileUpdateSerializer(self.user.receptionistprofiles).data
-        
+        # Compact, cached profile summary; the full profile is at profile_url
+        from profiles.snapshot import get_snapshot
         data['user'] = {
             'id': self.user.id,
             'username': self.user.username,
             'email': self.user.email,
             'role': getattr(self.user, 'role', ''),
-            'profile': profile_data
+            'profile': get_snapshot(self.user),
+            'profile_url': reverse('profile-me'),
         }
         return data
 
 
 class LoginView(TokenObtainPairView):
     """
-    POST /api/login/  →  { access, refresh, user: { … } }
+    POST /api/login/  →  { access, refresh, user: { …, profile, profile_url } }
     """
     serializer_class = CustomTokenObtainPairSerializer
 